@@ -0,0 +1,43 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, Sequence, Tuple
+
+
+def load_results(path: str) -> Dict[Tuple[str, int], Dict[str, Any]]:
+    with open(path) as f:
+        report = json.load(f)
+    return {(result['name'], result['size']): result for result in report['results']}
+
+
+def main(argv: Sequence[str]) -> int:
+    parser = argparse.ArgumentParser(description='Compare two benchmark reports produced by benchmarks/run.py')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument(
+        '-t', '--threshold', type=float, default=0.1,
+        help='relative slowdown of median that is reported as regression',
+    )
+    args = parser.parse_args(argv)
+
+    baseline = load_results(args.baseline)
+    current = load_results(args.current)
+    regressions = 0
+    for key in sorted(baseline.keys() & current.keys()):
+        old = baseline[key]['median_us']
+        new = current[key]['median_us']
+        ratio = new / old if old else float('inf')
+        mark = ''
+        if ratio > 1 + args.threshold:
+            mark = '  REGRESSION'
+            regressions += 1
+        name, size = key
+        print(f'{name:<28} size={size:<6} {old:10.1f}us -> {new:10.1f}us  x{ratio:.2f}{mark}')
+
+    for key in sorted(baseline.keys() ^ current.keys()):
+        print(f'{key[0]:<28} size={key[1]:<6} is present only in one report')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+import aiogram
+from aiogram import Bot, Dispatcher, F
+from aiogram.methods import EditMessageText, SendMessage, SendPhoto
+from aiogram.types import (
+    BufferedInputFile,
+    CallbackQuery,
+    Chat,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    KeyboardButton,
+    Message,
+    ReplyKeyboardMarkup,
+    Update,
+    User,
+)
+
+from aiogram_mock.facade_factory import create_private_chat
+from aiogram_mock.message_factory import MessageFactory
+from aiogram_mock.mocked_session import MockedSession
+from aiogram_mock.tg_control import PrivateChatTgControl, TgControl
+from aiogram_mock.tg_state import TgState
+
+BOT_USER = User(id=738453453, first_name='Test', username='test_bot', is_bot=True)
+KEYBOARD = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [InlineKeyboardButton(text=f'button {row}-{col}', callback_data=f'{row}-{col}') for col in range(4)]
+        for row in range(4)
+    ],
+)
+
+# benchmark receives a size parameter and returns (number of measured operations, elapsed seconds)
+Benchmark = Callable[[int], Awaitable[Tuple[int, float]]]
+
+
+async def on_message(message: Message) -> None:
+    await message.answer(message.text or '', reply_markup=KEYBOARD)
+
+
+async def on_callback_query(query: CallbackQuery) -> None:
+    await query.answer(text=query.data)
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_message)
+    dispatcher.callback_query.register(on_callback_query)
+    return bot, dispatcher
+
+
+def create_users(count: int) -> List[User]:
+    return [User(id=1000 + i, first_name=f'user {i}', is_bot=False) for i in range(count)]
+
+
+def create_environment(users: Sequence[User]) -> Tuple[TgControl, MockedSession]:
+    bot, dispatcher = create_bot_and_dispatcher()
+    tg_state = TgState([create_private_chat(user) for user in users])
+    session = MockedSession(tg_state, BOT_USER)
+    bot.session = session
+    return TgControl(dispatcher=dispatcher, bot=bot, tg_state=tg_state), session
+
+
+def fill_history(tg_state: TgState, chat: Chat, size: int) -> None:
+    for _ in range(size):
+        tg_state.add_message(
+            Message(
+                message_id=tg_state.allocate_message_id(chat.id),
+                date=datetime.utcnow(),
+                chat=chat,
+                from_user=BOT_USER,
+                text='filler',
+                reply_markup=KEYBOARD,
+            ),
+        )
+
+
+def private_control(users: Sequence[User], history_size: int) -> Tuple[PrivateChatTgControl, MockedSession]:
+    tg_control, session = create_environment(users)
+    chat = tg_control.tg_state.chats[users[0].id]
+    fill_history(tg_control.tg_state, chat, history_size)
+    return PrivateChatTgControl(tg_control=tg_control, chat=chat, user=users[0]), session
+
+
+OPERATIONS = 500
+
+
+async def bench_message_construction(size: int) -> Tuple[int, float]:
+    chat = create_private_chat(create_users(1)[0])
+    started_at = time.perf_counter()
+    for i in range(size):
+        Message(message_id=i, date=datetime.utcnow(), chat=chat, from_user=BOT_USER, text='x', reply_markup=KEYBOARD)
+    return size, time.perf_counter() - started_at
+
+
+async def bench_trusted_message_construction(size: int) -> Tuple[int, float]:
+    chat = create_private_chat(create_users(1)[0])
+    message_factory = MessageFactory(trusted=True)
+    started_at = time.perf_counter()
+    for i in range(size):
+        message_factory.create(
+            message_id=i,
+            date=datetime.utcnow(),
+            chat=chat,
+            from_user=BOT_USER,
+            text='x',
+            reply_markup=KEYBOARD,
+        )
+    return size, time.perf_counter() - started_at
+
+
+async def bench_add_message(size: int) -> Tuple[int, float]:
+    users = create_users(1)
+    tg_control, _ = create_environment(users)
+    chat = tg_control.tg_state.chats[users[0].id]
+    fill_history(tg_control.tg_state, chat, size)
+    messages = [
+        Message(message_id=size + i, date=datetime.utcnow(), chat=chat, text='x', reply_markup=KEYBOARD)
+        for i in range(OPERATIONS)
+    ]
+    started_at = time.perf_counter()
+    for message in messages:
+        tg_control.tg_state.add_message(message)
+    return OPERATIONS, time.perf_counter() - started_at
+
+
+async def bench_make_request(size: int) -> Tuple[int, float]:
+    users = create_users(1)
+    control, session = private_control(users, size)
+    started_at = time.perf_counter()
+    for _ in range(OPERATIONS):
+        await session.make_request(control.bot, SendMessage(chat_id=control.chat.id, text='x', reply_markup=KEYBOARD))
+    return OPERATIONS, time.perf_counter() - started_at
+
+
+async def bench_feed_update(size: int) -> Tuple[int, float]:
+    users = create_users(1)
+    control, _ = private_control(users, size)
+    dispatcher = Dispatcher()
+    dispatcher.message.register(lambda message: None)
+    updates = [
+        Update(
+            update_id=i,
+            message=Message(message_id=size + i, date=datetime.utcnow(), chat=control.chat, text='x'),
+        )
+        for i in range(OPERATIONS)
+    ]
+    started_at = time.perf_counter()
+    for update in updates:
+        await dispatcher.feed_update(control.bot, update)
+    return OPERATIONS, time.perf_counter() - started_at
+
+
+async def bench_send(size: int) -> Tuple[int, float]:
+    control, _ = private_control(create_users(1), size)
+    started_at = time.perf_counter()
+    for _ in range(OPERATIONS):
+        await control.send('hello')
+        control.last_message
+    return OPERATIONS, time.perf_counter() - started_at
+
+
+async def bench_send_many_chats(size: int) -> Tuple[int, float]:
+    users = create_users(size)
+    tg_control, _ = create_environment(users)
+    chats = [tg_control.tg_state.chats[user.id] for user in users]
+    started_at = time.perf_counter()
+    for i in range(OPERATIONS):
+        user = users[i % size]
+        await tg_control.send(from_user=user, chat=chats[i % size], text='hello')
+    return OPERATIONS, time.perf_counter() - started_at
+
+
+async def bench_click(size: int) -> Tuple[int, float]:
+    control, _ = private_control(create_users(1), size)
+    await control.send('hello')
+    started_at = time.perf_counter()
+    for _ in range(OPERATIONS):
+        await control.click(F.callback_data == '3-3')
+    return OPERATIONS, time.perf_counter() - started_at
+
+
+async def bench_edit(size: int) -> Tuple[int, float]:
+    control, session = private_control(create_users(1), size)
+    message = control.last_message
+    started_at = time.perf_counter()
+    for i in range(OPERATIONS):
+        await session.make_request(
+            control.bot,
+            EditMessageText(chat_id=control.chat.id, message_id=message.message_id, text=str(i), reply_markup=KEYBOARD),
+        )
+    return OPERATIONS, time.perf_counter() - started_at
+
+
+async def bench_photo_upload(size: int) -> Tuple[int, float]:
+    control, session = private_control(create_users(1), 0)
+    uploads = 20
+    payloads = [bytes([i]) * (size * 1024) for i in range(uploads)]
+    started_at = time.perf_counter()
+    for payload in payloads:
+        await session.make_request(
+            control.bot,
+            SendPhoto(chat_id=control.chat.id, photo=BufferedInputFile(payload, filename='photo.jpg')),
+        )
+    return uploads, time.perf_counter() - started_at
+
+
+async def bench_selective_user_state(size: int) -> Tuple[int, float]:
+    users = create_users(1)
+    tg_control, _ = create_environment(users)
+    tg_state = tg_control.tg_state
+    chat_id = users[0].id
+    tg_state.update_selective_user_state(chat_id, range(size), reply_markup=None)
+    markup = ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text='x')]])
+    started_at = time.perf_counter()
+    for _ in range(OPERATIONS):
+        tg_state.update_chat_user_state(chat_id, reply_markup=markup)
+        tg_state.get_user_state(chat_id=chat_id, user_id=size // 2)
+    return OPERATIONS, time.perf_counter() - started_at
+
+
+BENCHMARKS: Dict[str, Tuple[Benchmark, Sequence[int]]] = {
+    'message_construction': (bench_message_construction, [1000]),
+    'trusted_message_construction': (bench_trusted_message_construction, [1000]),
+    'add_message': (bench_add_message, [0, 1000, 10000]),
+    'make_request_send_message': (bench_make_request, [0, 1000, 10000]),
+    'feed_update': (bench_feed_update, [0, 1000, 10000]),
+    'send': (bench_send, [0, 1000, 10000]),
+    'send_many_chats': (bench_send_many_chats, [1, 100, 1000]),
+    'click': (bench_click, [0, 1000, 10000]),
+    'edit': (bench_edit, [1, 1000, 10000]),
+    'photo_upload_kib': (bench_photo_upload, [64, 1024, 8192]),
+    'selective_user_state': (bench_selective_user_state, [10, 1000, 10000]),
+}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_benchmark(benchmark: Benchmark, size: int, repeat: int) -> Dict[str, Any]:
+    per_op = []
+    for _ in range(repeat):
+        ops, elapsed = asyncio.run(benchmark(size))
+        per_op.append(elapsed / ops)
+    return {
+        'min_us': min(per_op) * 1e6,
+        'median_us': statistics.median(per_op) * 1e6,
+        'repeat': repeat,
+    }
+
+
+def main(argv: Sequence[str]) -> None:
+    parser = argparse.ArgumentParser(description='Benchmark hot paths of aiogram_mock')
+    parser.add_argument('-o', '--output', help='path of JSON file with results, stdout is used by default')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-k', '--select', action='append', default=[], help='run only benchmarks with these names')
+    args = parser.parse_args(argv)
+
+    results = []
+    for name, (benchmark, sizes) in BENCHMARKS.items():
+        if args.select and name not in args.select:
+            continue
+        for size in sizes:
+            result = {'name': name, 'size': size, **run_benchmark(benchmark, size, args.repeat)}
+            print(f'{name:<28} size={size:<6} median={result["median_us"]:10.1f}us', file=sys.stderr)
+            results.append(result)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'aiogram': aiogram.__version__,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,75 @@
+from typing import Generator, Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import CommandStart
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
+from aiohttp import ClientSession
+
+from aiogram_mock.api_server import serve_bot_api
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.tg_control import PrivateChatTgControl
+
+
+async def on_start(message: Message):
+    await message.answer(
+        'hello',
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text='ping', callback_data='ping')]]),
+    )
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_start, CommandStart())
+    return bot, dispatcher
+
+
+@pytest.fixture()
+def tg_control() -> Generator[PrivateChatTgControl, None, None]:
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+    ) as tg_control:
+        yield tg_control
+
+
+async def test_bot_talks_to_server_through_real_session(tg_control):
+    async with serve_bot_api(tg_control.bot):
+        assert isinstance(tg_control.bot.session, AiohttpSession)
+        await tg_control.send('/start')
+
+    assert tg_control.last_message.text == 'hello'
+    assert tg_control.last_message.reply_markup.inline_keyboard[0][0].callback_data == 'ping'
+    assert not isinstance(tg_control.bot.session, AiohttpSession)
+
+
+async def test_errors_of_mocks_are_bad_requests(tg_control):
+    async with serve_bot_api(tg_control.bot):
+        with pytest.raises(TelegramBadRequest):
+            await tg_control.bot.edit_message_text('text', chat_id=tg_control.chat.id, message_id=100)
+
+
+@pytest.mark.parametrize(
+    ('token', 'status', 'description'),
+    [
+        ('not-a-token', 404, 'Not Found'),
+        ('654321:ABC-DEF1234ghIkl-zyx57W2v1u123ew11', 401, 'Unauthorized'),
+    ],
+)
+async def test_bad_tokens_get_bot_api_errors(tg_control, token, status, description):
+    async with serve_bot_api(tg_control.bot) as server, ClientSession() as client:
+        for url in (server.api.api_url(token, 'getMe'), server.api.file_url(token, 'files/unknown')):
+            async with client.get(url) as response:
+                assert response.status == status
+                assert await response.json() == {'ok': False, 'error_code': status, 'description': description}
+
+
+async def test_unknown_method_is_not_found(tg_control):
+    async with serve_bot_api(tg_control.bot) as server, ClientSession() as client:
+        async with client.post(server.api.api_url(tg_control.bot.token, 'sendDice')) as response:
+            assert response.status == 404
+            assert (await response.json())['ok'] is False
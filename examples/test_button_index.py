@@ -0,0 +1,141 @@
+import gc
+from typing import Generator, Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher, F
+from aiogram.filters import CommandStart
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
+
+from aiogram_mock import button_index
+from aiogram_mock.button_index import (
+    ButtonIndex,
+    ByCallbackData,
+    ByCallbackDataPrefix,
+    ByPredicate,
+    ByText,
+    compile_selector,
+)
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.tg_control import PrivateChatTgControl
+
+
+def _markup(*callback_data: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[[InlineKeyboardButton(text=data.upper(), callback_data=data)] for data in callback_data],
+    )
+
+
+async def on_start(message: Message):
+    await message.answer('menu', reply_markup=_markup('page:1', 'page:2', 'pages', 'back'))
+
+
+async def on_page(query: CallbackQuery):
+    await query.answer(text=query.data)
+    await query.message.edit_reply_markup(reply_markup=_markup('next', 'back'))
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_start, CommandStart())
+    dispatcher.callback_query.register(on_page)
+    return bot, dispatcher
+
+
+@pytest.fixture()
+def tg_control() -> Generator[PrivateChatTgControl, None, None]:
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher) as tg_control:
+        yield tg_control
+
+
+@pytest.fixture()
+def index() -> ButtonIndex:
+    buttons = _markup('page:1', 'page:2', 'pages', 'back').inline_keyboard
+    # buttons with equal text or callback data are all selected
+    return ButtonIndex([row[0] for row in buttons] + [InlineKeyboardButton(text='BACK', callback_data='back')])
+
+
+def _callback_data(buttons):
+    return [button.callback_data for button in buttons]
+
+
+def test_selectors(index):
+    assert _callback_data(ByText('PAGES').select(index)) == ['pages']
+    assert _callback_data(ByText('BACK').select(index)) == ['back', 'back']
+    assert _callback_data(ByText('missing').select(index)) == []
+    assert _callback_data(ByCallbackData('page:2').select(index)) == ['page:2']
+    assert _callback_data(ByCallbackDataPrefix('page:').select(index)) == ['page:1', 'page:2']
+    assert _callback_data(ByCallbackDataPrefix('page').select(index)) == ['page:1', 'page:2', 'pages']
+    assert _callback_data(ByCallbackDataPrefix('z').select(index)) == []
+    assert _callback_data(ByPredicate(lambda button: button.text.endswith('S')).select(index)) == ['pages']
+    assert index.callback_data == ['back', 'page:1', 'page:2', 'pages']
+
+
+@pytest.mark.parametrize(
+    ('magic_filter', 'selector_type'),
+    [
+        (F.text == 'PAGES', ByText),
+        (F.text == 'BACK', ByText),
+        (F.callback_data == 'page:1', ByCallbackData),
+        (F.callback_data.startswith('page'), ByCallbackDataPrefix),
+        # filters that are not compiled fall back to a scan of all buttons
+        (F.text.contains('AGE'), ByPredicate),
+        (F.callback_data.startswith('page', 0), ByPredicate),
+        (F.text == 1, ByPredicate),
+        (F.callback_data != 'back', ByPredicate),
+    ],
+)
+def test_compiled_selectors_select_like_scan(index, magic_filter, selector_type):
+    selector = compile_selector(magic_filter)
+    assert type(selector) is selector_type
+    assert selector.select(index) == ByPredicate(magic_filter.resolve).select(index)
+
+
+def test_other_selectors_are_not_compiled():
+    selector = ByText('text')
+    assert compile_selector(selector) is selector
+
+    def predicate(button: InlineKeyboardButton) -> bool:
+        return True
+
+    compiled = compile_selector(predicate)
+    assert isinstance(compiled, ByPredicate)
+    assert compiled.predicate is predicate
+
+
+def test_compiled_filters_are_cached_while_alive():
+    magic_filter = F.callback_data == 'cached'
+    assert compile_selector(magic_filter) is compile_selector(magic_filter)
+    key = id(magic_filter)
+    assert key in button_index._compiled_magic_filters
+
+    del magic_filter
+    gc.collect()
+    assert key not in button_index._compiled_magic_filters
+
+
+async def test_state_index_follows_edits(tg_control):
+    await tg_control.send('/start')
+    message = tg_control.last_message
+    tg_state = tg_control.tg_control.tg_state
+    index = tg_state.button_index(message)
+    assert tg_state.button_index(message) is index
+
+    answer = await tg_control.click(F.callback_data.startswith('page:2'), message)
+    assert answer.text == 'page:2'
+    edited = tg_control.last_message
+    assert edited is not message
+    assert tg_state.button_index(edited).callback_data == ['back', 'next']
+    # an outdated copy is indexed by its own keyboard
+    assert tg_state.button_index(message).callback_data == index.callback_data
+
+    with pytest.raises(ValueError, match='more than one'):
+        await tg_control.click(F.callback_data.startswith(''), edited)
+    with pytest.raises(ValueError, match='skip all'):
+        await tg_control.click(F.callback_data == 'page:1', edited)
+
+
+async def test_long_callback_data_is_rejected(tg_control):
+    with pytest.raises(ValueError, match='64 chars'):
+        await tg_control.bot.send_message(tg_control.chat.id, 'text', reply_markup=_markup('x' * 65))
@@ -0,0 +1,209 @@
+import random
+from datetime import datetime
+from typing import List
+
+import pytest
+from aiogram.types import Chat, InlineKeyboardButton, InlineKeyboardMarkup, Message, User
+
+from aiogram_mock.chat_history import ChatHistory
+from aiogram_mock.message_index import MessageIndex, MessageQuery
+
+CHAT = Chat(id=1, type='private')
+USER = User(id=1, is_bot=False, first_name='User')
+BOT = User(id=2, is_bot=True, first_name='Bot')
+
+
+def _message(message_id: int, text: str = 'text') -> Message:
+    return Message(message_id=message_id, date=datetime(2023, 1, 1), chat=CHAT, from_user=USER, text=text)
+
+
+def _messages(count: int) -> List[Message]:
+    return [_message(message_id, f'text {message_id}') for message_id in range(count)]
+
+
+def test_history_equals_list_of_its_messages():
+    messages = _messages(3)
+    history = ChatHistory(messages)
+    assert history == messages
+    assert messages == history
+    assert history == tuple(messages)
+    assert history != messages[:2]
+    assert history != 'text'
+
+    history.delete(1)
+    assert history == [messages[0], messages[2]]
+
+
+def test_index_and_slice_skip_deleted_messages():
+    messages = _messages(10)
+    history = ChatHistory(messages)
+    for message_id in (0, 4, 5, 9):  # leading, interior and trailing deletions
+        history.delete(message_id)
+    expected = [message for message in messages if message.message_id not in (0, 4, 5, 9)]
+
+    assert len(history) == len(expected)
+    assert [history[index] for index in range(len(history))] == expected
+    assert history[-1] is expected[-1]
+    assert history[1:5] == expected[1:5]
+    assert history[::-2] == expected[::-2]
+    assert list(reversed(history)) == expected[::-1]
+
+
+def test_random_operations_match_list():
+    rnd = random.Random(0)
+    history = ChatHistory()
+    expected: List[Message] = []
+    next_id = 0
+    for _ in range(2000):
+        if expected and rnd.random() < 0.45:
+            message = expected.pop(rnd.randrange(len(expected)))
+            history.delete(message.message_id)
+        else:
+            message = _message(next_id)
+            next_id += 1
+            history.append(message)
+            expected.append(message)
+
+        assert len(history) == len(expected)
+        if expected:
+            index = rnd.randrange(len(expected))
+            assert history[index] is expected[index]
+            assert history.last is expected[-1]
+    assert history == expected
+
+
+def test_last_of_empty_history():
+    history = ChatHistory(_messages(2))
+    history.delete(1)
+    assert history.last.message_id == 0
+
+    history.delete(0)
+    with pytest.raises(IndexError):
+        history.last
+    with pytest.raises(IndexError):
+        history[0]
+
+
+def test_find_and_find_last():
+    history = ChatHistory(_message(message_id, 'even' if message_id % 2 == 0 else 'odd') for message_id in range(200))
+    history.delete(198)
+
+    even = history.find(MessageQuery(text='even'))
+    assert [message.message_id for message in even] == list(range(0, 198, 2))
+    # more candidates than the sorting limit, the history is walked from the end
+    assert history.find_last(MessageQuery(text='even')).message_id == 196
+    assert history.find_last(MessageQuery(text='odd', from_user_id=USER.id)).message_id == 199
+    assert history.find_last(MessageQuery(pattern='^od')).message_id == 199
+    assert history.find_last(MessageQuery(text='missing')) is None
+
+
+def test_fork_is_isolated():
+    history = ChatHistory(_messages(5))
+    forked = history.fork()
+
+    history.delete(2)
+    history.append(_message(5))
+    forked.replace(_message(0, 'replaced'))
+    forked.delete(4)
+
+    assert [message.message_id for message in history] == [0, 1, 3, 4, 5]
+    assert history[0].text == 'text 0'
+    assert history.find(MessageQuery(text='replaced')) == []
+    assert [message.message_id for message in forked] == [0, 1, 2, 3]
+    assert forked[0].text == 'replaced'
+    assert forked.find_last(MessageQuery(text='text 4')) is None
+
+
+def test_fork_is_isolated_from_compaction():
+    history = ChatHistory(_messages(10))
+    forked = history.fork()
+    for message_id in range(1, 9):
+        history.delete(message_id)  # enough deletions to compact the slots
+
+    assert [message.message_id for message in history] == [0, 9]
+    assert len(forked) == 10
+    assert forked[5].message_id == 5
+    assert forked.find_last(MessageQuery(text='text 5')).message_id == 5
+
+
+def _mixed_message(message_id: int, previous: List[Message]) -> Message:
+    reply_markup = None
+    if message_id % 3 == 0:
+        reply_markup = InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text='Item', callback_data=f'item:{message_id % 5}'),
+            InlineKeyboardButton(text='All', callback_data='all'),
+            InlineKeyboardButton(text='Site', url='https://example.com'),
+        ]])
+    elif message_id % 5 == 0:
+        # a keyboard without callback data
+        reply_markup = InlineKeyboardMarkup(
+            inline_keyboard=[[InlineKeyboardButton(text='item:0', url='https://example.com')]],
+        )
+    return Message(
+        message_id=message_id,
+        date=datetime(2023, 1, 1),
+        chat=CHAT,
+        from_user=USER if message_id % 2 == 0 else BOT,
+        text=f'text {message_id % 7}',
+        reply_markup=reply_markup,
+        reply_to_message=previous[message_id // 4] if message_id >= 4 and message_id % 4 == 1 else None,
+    )
+
+
+@pytest.fixture()
+def mixed_history() -> ChatHistory:
+    history = ChatHistory()
+    messages: List[Message] = []
+    for message_id in range(300):
+        messages.append(_mixed_message(message_id, messages))
+        history.append(messages[-1])
+    for message_id in range(0, 300, 11):
+        history.delete(message_id)
+    # edits move messages between index entries
+    for message_id in (3, 30, 294):
+        history.replace(history.get(message_id).copy(update={'text': 'edited', 'reply_markup': None}))
+    history.replace(history.get(5).copy(update={'text': 'text 1', 'reply_markup': None}))
+    return history
+
+
+@pytest.mark.parametrize(
+    'query',
+    [
+        MessageQuery(pattern=r'^text [0-2]$'),
+        MessageQuery(pattern='edit'),
+        MessageQuery(pattern='^missing'),
+        MessageQuery(has_reply_markup=True),
+        MessageQuery(has_reply_markup=False),
+        MessageQuery(callback_data='all'),
+        MessageQuery(callback_data='item:2'),
+        MessageQuery(callback_data='item:0'),  # text of an url button is not callback data
+        MessageQuery(callback_data='missing'),
+        MessageQuery(reply_to_message_id=1),
+        MessageQuery(reply_to_message_id=11),  # deleted message
+        MessageQuery(reply_to_message_id=299),
+        MessageQuery(pattern='3$', from_user_id=BOT.id),
+        MessageQuery(pattern='3$', has_reply_markup=True),
+        MessageQuery(has_reply_markup=False, callback_data='all'),
+        MessageQuery(callback_data='item:4', from_user_id=USER.id),
+        MessageQuery(reply_to_message_id=6, text='text 4'),
+        MessageQuery(reply_to_message_id=2, has_reply_markup=True),
+        MessageQuery(reply_to_message_id=3, has_reply_markup=True),
+    ],
+)
+def test_indexed_find_matches_scan(mixed_history, query):
+    scanned = [message for message in mixed_history if query.matches(message)]
+    assert mixed_history.find(query) == scanned
+    assert mixed_history.find_last(query) is (scanned[-1] if scanned else None)
+
+
+def test_index_is_used_for_indexed_criteria():
+    index = MessageIndex()
+    assert index.candidates(MessageQuery(pattern='text')) is None
+    assert index.candidates(MessageQuery(has_reply_markup=False)) is None
+    for query in (
+        MessageQuery(has_reply_markup=True),
+        MessageQuery(callback_data='all'),
+        MessageQuery(reply_to_message_id=1),
+        MessageQuery(pattern='text', reply_to_message_id=1),
+    ):
+        assert index.candidates(query) == set()
@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime
+from functools import partial
+from typing import Generator, Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher, F
+from aiogram.types import Message
+
+from aiogram_mock.clock import VirtualClock
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.tg_control import PrivateChatTgControl
+from aiogram_mock.tg_state import TgState
+
+
+async def on_now(message: Message):
+    await message.answer('now')
+
+
+async def on_later(message: Message):
+    await asyncio.sleep(3600)
+    await message.answer('later')
+
+
+async def on_other(message: Message):
+    await message.answer('other')
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    # sync magic filters are executed by aiogram in the default executor
+    dispatcher.message.register(on_now, F.text == 'now')
+    dispatcher.message.register(on_later, F.text == 'later')
+    dispatcher.message.register(on_other, F.text.startswith('other'))
+    return bot, dispatcher
+
+
+@pytest.fixture()
+def clock() -> VirtualClock:
+    return VirtualClock(start=datetime(2023, 1, 1))
+
+
+@pytest.fixture()
+def tg_control(clock: VirtualClock) -> Generator[PrivateChatTgControl, None, None]:
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+        tg_state_factory=partial(TgState, clock=clock),
+    ) as tg_control:
+        yield tg_control
+    clock.detach()
+
+
+async def test_advance_fires_timers_of_handlers_behind_sync_filters(tg_control, clock):
+    task = asyncio.ensure_future(tg_control.send('later'))
+    await clock.advance(3599)
+    assert not task.done()
+
+    await clock.advance(2)
+    await task
+    assert tg_control.last_message.text == 'later'
+    assert tg_control.last_message.date == datetime(2023, 1, 1, 1, 0, 0)
+
+
+async def test_advance_repeatedly(tg_control, clock):
+    for _ in range(5):
+        task = asyncio.ensure_future(tg_control.send('later'))
+        await clock.advance(3600)
+        await task
+        assert tg_control.last_message.text == 'later'
+    assert clock.elapsed == 5 * 3600
+
+
+async def test_messages_are_dated_by_virtual_clock(tg_control, clock):
+    await tg_control.send('now')
+    assert tg_control.last_message.date == datetime(2023, 1, 1)
+
+    await clock.advance(90)
+    await tg_control.send('other')
+    assert tg_control.last_message.text == 'other'
+    assert tg_control.last_message.date == datetime(2023, 1, 1, 0, 1, 30)
+
+
+async def test_virtual_time_can_not_go_backwards(clock):
+    with pytest.raises(ValueError):
+        await clock.advance(-1)
+
+
+def test_only_default_event_loop_is_supported(clock):
+    # loops without asyncio internals, like uvloop, can not be driven by virtual time
+    with pytest.raises(TypeError, match='default asyncio event loop'):
+        clock.attach(asyncio.AbstractEventLoop())
+
+
+async def test_busy_loop_is_reported():
+    clock = VirtualClock(max_ready_iterations=100)
+    stopped = False
+
+    async def spin():
+        while not stopped:
+            await asyncio.sleep(0)
+
+    task = asyncio.create_task(spin())
+    try:
+        with pytest.raises(RuntimeError, match='has not settled after 100 iterations'):
+            await clock.advance(1)
+    finally:
+        stopped = True
+        await task
+        clock.detach()
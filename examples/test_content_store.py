@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+from typing import AsyncGenerator, Optional
+
+import pytest
+from aiogram.types import BufferedInputFile, InputFile
+
+from aiogram_mock.content_store import ContentStore
+
+
+class CountingInputFile(InputFile):
+    def __init__(self, content: bytes, chunk_size: int = 4):
+        super().__init__(filename='file.bin', chunk_size=chunk_size)
+        self.content = content
+        self.reads = 0
+
+    async def read(self, chunk_size: int) -> AsyncGenerator[bytes, None]:
+        self.reads += 1
+        for start in range(0, len(self.content), chunk_size):
+            await asyncio.sleep(0)
+            yield self.content[start:start + chunk_size]
+
+
+def _content(store: ContentStore, digest: str, chunk_size: int = 3) -> Optional[bytes]:
+    if digest not in store:
+        return None
+    return b''.join(bytes(chunk) for chunk in store.iter_chunks(digest, chunk_size))
+
+
+async def test_default_store_keeps_only_digests():
+    store = ContentStore()
+    info = await store.put(BufferedInputFile(b'hello', filename='a.txt'))
+    assert info.digest == hashlib.sha256(b'hello').hexdigest()
+    assert info.size == 5
+    assert info.digest not in store
+    assert store.memory_size == 0
+
+
+async def test_same_file_is_read_once():
+    store = ContentStore(max_memory_size=100)
+    input_file = CountingInputFile(b'shared content')
+    infos = await asyncio.gather(*(store.put(input_file) for _ in range(10)))
+    assert len(set(infos)) == 1
+    assert input_file.reads == 1
+
+    await store.put(input_file)
+    assert input_file.reads == 1
+
+
+async def test_equal_contents_are_stored_once():
+    store = ContentStore(max_memory_size=100)
+    first = await store.put(BufferedInputFile(b'same', filename='a.txt'))
+    second = await store.put(BufferedInputFile(b'same', filename='b.txt'))
+    assert first == second
+    assert store.memory_size == 4
+    assert store.memory_stats().entries == 1
+
+
+async def test_chunks_honor_chunk_size():
+    store = ContentStore(max_memory_size=100)
+    info = await store.put(BufferedInputFile(b'0123456789', filename='a.txt'))
+    assert [bytes(chunk) for chunk in store.iter_chunks(info.digest, 4)] == [b'0123', b'4567', b'89']
+    with pytest.raises(ValueError):
+        list(store.iter_chunks(info.digest, 0))
+
+
+async def test_least_recently_used_content_is_evicted():
+    store = ContentStore(max_memory_size=10)
+    first = await store.put(BufferedInputFile(b'aaaa', filename='a'))
+    second = await store.put(BufferedInputFile(b'bbbb', filename='b'))
+    _content(store, first.digest)  # reading moves the content to the end of the queue
+    third = await store.put(BufferedInputFile(b'cccc', filename='c'))
+
+    assert first.digest in store
+    assert second.digest not in store
+    assert third.digest in store
+    assert store.memory_size == 8
+
+
+async def test_content_larger_than_memory_is_not_kept_without_spill_dir():
+    store = ContentStore(max_memory_size=4)
+    info = await store.put(BufferedInputFile(b'too large', filename='a'))
+    assert info.size == 9
+    assert info.digest not in store
+
+
+async def test_large_content_spills_to_disk(tmp_path):
+    store = ContentStore(max_memory_size=4, spill_dir=tmp_path)
+    input_file = CountingInputFile(b'large content streamed to disk', chunk_size=3)
+    info = await store.put(input_file)
+
+    assert store.memory_size == 0
+    assert (tmp_path / info.digest).read_bytes() == input_file.content
+    assert _content(store, info.digest) == input_file.content
+    assert [path.name for path in tmp_path.iterdir()] == [info.digest]
+
+
+async def test_evicted_content_moves_to_disk(tmp_path):
+    store = ContentStore(max_memory_size=4, spill_dir=tmp_path)
+    first = await store.put(BufferedInputFile(b'aaaa', filename='a'))
+    second = await store.put(BufferedInputFile(b'bbbb', filename='b'))
+
+    assert store.memory_size == 4
+    assert _content(store, first.digest) == b'aaaa'
+    assert _content(store, second.digest) == b'bbbb'
+    assert (tmp_path / first.digest).exists()
+
+
+async def test_empty_content_is_retained(tmp_path):
+    store = ContentStore(spill_dir=tmp_path)
+    info = await store.put(BufferedInputFile(b'', filename='empty'))
+    assert info.digest in store
+    assert _content(store, info.digest) == b''
@@ -0,0 +1,81 @@
+from functools import partial
+from io import BytesIO
+from typing import Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command
+from aiogram.types import BufferedInputFile, Message
+
+from aiogram_mock.api_server import serve_bot_api
+from aiogram_mock.content_store import ContentStore
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.tg_state import TgState
+
+CONTENT = b'report content ' * 100
+
+
+async def on_report(message: Message):
+    await message.answer_document(BufferedInputFile(CONTENT, filename='report.txt'), caption='report')
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_report, Command('report'))
+    return bot, dispatcher
+
+
+@pytest.mark.parametrize('max_memory_size', [10 ** 6, 16])
+async def test_retained_upload_is_downloaded(tmp_path, max_memory_size):
+    bot, dispatcher = create_bot_and_dispatcher()
+    content_store = ContentStore(max_memory_size=max_memory_size, spill_dir=tmp_path)
+    with private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+        tg_state_factory=partial(TgState, content_store=content_store),
+    ) as tg_control:
+        await tg_control.send('/report')
+        document = tg_control.last_message.document
+        assert document.file_size == len(CONTENT)
+
+        file = await bot.get_file(document.file_id)
+        assert file.file_unique_id == document.file_unique_id
+        assert file.file_size == len(CONTENT)
+
+        destination = await bot.download(document, chunk_size=7)
+        assert isinstance(destination, BytesIO)
+        assert destination.getvalue() == CONTENT
+
+        path = tmp_path / 'downloaded.txt'
+        await bot.download_file(file.file_path, path)
+        assert path.read_bytes() == CONTENT
+
+
+async def test_get_file_of_not_retained_content_fails():
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher) as tg_control:
+        await tg_control.send('/report')
+        with pytest.raises(TelegramBadRequest, match='not retained'):
+            await bot.get_file(tg_control.last_message.document.file_id)
+
+
+async def test_unknown_file_path_is_not_streamed():
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher):
+        with pytest.raises(KeyError):
+            await bot.download_file('photos/unknown.jpg')
+
+
+async def test_download_through_local_server():
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+        tg_state_factory=partial(TgState, content_store=ContentStore(max_memory_size=10 ** 6)),
+    ) as tg_control:
+        async with serve_bot_api(bot):
+            await tg_control.send('/report')
+            destination = await bot.download(tg_control.last_message.document)
+        assert destination.getvalue() == CONTENT
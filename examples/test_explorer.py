@@ -0,0 +1,169 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher, F
+from aiogram.filters import CommandStart
+from aiogram.fsm.context import FSMContext
+from aiogram.types import (
+    CallbackQuery,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    KeyboardButton,
+    Message,
+    ReplyKeyboardMarkup,
+    ReplyKeyboardRemove,
+)
+
+from aiogram_mock.explorer import (
+    CALLBACK_ACTION,
+    TEXT_ACTION,
+    ExplorerAction,
+    StateExplorer,
+    StateGraph,
+    StateNode,
+    Transition,
+    explore_in_processes,
+)
+
+
+def _menu_markup() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text='About', callback_data='about')],
+            [InlineKeyboardButton(text='Order', callback_data='order')],
+        ],
+    )
+
+
+async def on_start(message: Message, state: FSMContext):
+    await state.clear()
+    await message.answer('menu', reply_markup=_menu_markup())
+
+
+async def on_about(query: CallbackQuery):
+    await query.answer()
+    await query.message.edit_text(
+        'about',
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text='Back', callback_data='back')]]),
+    )
+
+
+async def on_back(query: CallbackQuery):
+    await query.answer()
+    await query.message.edit_text('menu', reply_markup=_menu_markup())
+
+
+async def on_order(query: CallbackQuery, state: FSMContext):
+    await query.answer()
+    await state.set_state('confirming')
+    await query.message.edit_text('order')
+    await query.message.answer(
+        'confirm?',
+        reply_markup=ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text='yes'), KeyboardButton(text='no')]]),
+    )
+
+
+async def on_yes(message: Message, state: FSMContext):
+    await state.set_state('ordered')
+    await message.answer('ordered', reply_markup=ReplyKeyboardRemove())
+
+
+async def on_no(message: Message):
+    raise RuntimeError('not implemented')
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_start, CommandStart())
+    dispatcher.message.register(on_yes, F.text == 'yes')
+    dispatcher.message.register(on_no, F.text == 'no')
+    dispatcher.callback_query.register(on_about, F.data == 'about')
+    dispatcher.callback_query.register(on_back, F.data == 'back')
+    dispatcher.callback_query.register(on_order, F.data == 'order')
+    return bot, dispatcher
+
+
+def _texts(graph: StateGraph):
+    return sorted(node.text or '' for node in graph.nodes.values())
+
+
+@pytest.mark.parametrize('concurrency', [1, 4])
+async def test_states_are_explored_breadth_first(concurrency):
+    bot, dispatcher = create_bot_and_dispatcher()
+    graph = await StateExplorer(dispatcher, bot, concurrency=concurrency).explore()
+
+    assert _texts(graph) == ['', 'about', 'confirm?', 'menu', 'ordered']
+    by_text = {node.text: node for node in graph.nodes.values()}
+    assert by_text['about'].path == (ExplorerAction(TEXT_ACTION, '/start'), ExplorerAction(CALLBACK_ACTION, 'about'))
+    assert by_text['confirm?'].fsm_state == 'confirming'
+    assert by_text['ordered'].path[-1] == ExplorerAction(TEXT_ACTION, 'yes')
+    # back leads to the known menu state
+    back = ExplorerAction(CALLBACK_ACTION, 'back')
+    assert Transition(by_text['about'].fingerprint, back, by_text['menu'].fingerprint) in graph.transitions
+
+    assert [(error.source, error.action) for error in graph.errors] == [
+        (by_text['confirm?'].fingerprint, ExplorerAction(TEXT_ACTION, 'no')),
+    ]
+    assert graph.errors[0].error == 'RuntimeError: not implemented'
+
+    dot = graph.to_dot()
+    assert dot.startswith('digraph states {')
+    assert '"about"' in dot
+    assert 'color=red' in dot
+
+
+async def test_depth_and_number_of_states_are_limited():
+    bot, dispatcher = create_bot_and_dispatcher()
+    graph = await StateExplorer(dispatcher, bot, max_depth=1).explore()
+    assert _texts(graph) == ['', 'menu']
+
+    graph = await StateExplorer(dispatcher, bot, max_states=3).explore()
+    assert len(graph.nodes) == 3
+
+
+async def test_exploration_starts_from_path():
+    bot, dispatcher = create_bot_and_dispatcher()
+    start_path = (ExplorerAction(TEXT_ACTION, '/start'), ExplorerAction(CALLBACK_ACTION, 'about'))
+    graph = await StateExplorer(dispatcher, bot).explore(start_path)
+    assert _texts(graph) == ['about', 'confirm?', 'menu', 'ordered']
+
+
+def test_merge_keeps_shortest_paths():
+    action = ExplorerAction(TEXT_ACTION, '/start')
+    left = StateGraph(nodes={'a': StateNode('a', (action, action), 'menu', None)})
+    right = StateGraph(
+        nodes={'a': StateNode('a', (action,), 'menu', None)},
+        transitions=[Transition('root', action, 'a'), Transition('root', action, 'a')],
+    )
+    left.merge(right)
+    assert left.nodes['a'].path == (action,)
+    assert left.transitions == [Transition('root', action, 'a')]
+
+
+async def test_subtrees_are_explored_in_processes():
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        graph = await explore_in_processes(create_bot_and_dispatcher, executor)
+    assert _texts(graph) == ['', 'about', 'confirm?', 'menu', 'ordered']
+    assert len(graph.errors) == 1
+
+
+async def test_transitions_lead_only_to_known_states():
+    bot, dispatcher = create_bot_and_dispatcher()
+    graph = await StateExplorer(dispatcher, bot, max_states=3).explore()
+    assert all(transition.target in graph.nodes for transition in graph.transitions)
+
+
+async def test_failed_capture_is_recorded_as_error(monkeypatch):
+    async def get_state(self):
+        if self.key.user_id is not None and await self.storage.get_state(self.bot, self.key) == 'confirming':
+            raise RuntimeError('storage is broken')
+        return await self.storage.get_state(self.bot, self.key)
+
+    bot, dispatcher = create_bot_and_dispatcher()
+    monkeypatch.setattr(FSMContext, 'get_state', get_state)
+    graph = await asyncio.wait_for(StateExplorer(dispatcher, bot, concurrency=2).explore(), timeout=10)
+    assert _texts(graph) == ['', 'about', 'menu']
+    assert [error.error for error in graph.errors] == ['RuntimeError: storage is broken']
@@ -0,0 +1,101 @@
+from datetime import datetime
+from typing import Tuple
+
+import pytest
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetMe, SendMessage
+from aiogram.types import Chat, User
+
+from aiogram_mock.clock import VirtualClock
+from aiogram_mock.flood_control import FloodControl, RateLimit, constant_latency, lognormal_latency
+from aiogram_mock.mocked_session import MockedSession
+from aiogram_mock.tg_state import TgState
+
+PRIVATE_CHAT = Chat(id=1, type='private')
+GROUP_CHAT = Chat(id=-1, type='supergroup', title='Group')
+BOT_USER = User(id=123456, is_bot=True, first_name='Bot')
+
+
+@pytest.fixture()
+def clock() -> VirtualClock:
+    return VirtualClock(start=datetime(2023, 1, 1))
+
+
+def _create_bot(clock: VirtualClock, flood_control: FloodControl) -> Tuple[Bot, TgState]:
+    tg_state = TgState([PRIVATE_CHAT, GROUP_CHAT], clock=clock)
+    session = MockedSession(tg_state, BOT_USER, flood_control=flood_control)
+    return Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11', session=session), tg_state
+
+
+async def test_chat_limit_throttles_after_burst(clock):
+    flood_control = FloodControl()
+    bot, tg_state = _create_bot(clock, flood_control)
+    for _ in range(3):
+        await bot.send_message(PRIVATE_CHAT.id, 'text')
+
+    with pytest.raises(TelegramRetryAfter) as exc_info:
+        await bot.send_message(PRIVATE_CHAT.id, 'text')
+    assert exc_info.value.retry_after == 1
+    # rejected calls are not delivered
+    assert len(bot.session.sent_methods) == 3
+    assert len(tg_state.chat_history(PRIVATE_CHAT.id)) == 3
+    assert flood_control.stats.delivered == {'SendMessage': 3}
+    assert flood_control.stats.throttled == {'SendMessage': 1}
+
+    await clock.advance(1)
+    await bot.send_message(PRIVATE_CHAT.id, 'text')
+    assert flood_control.stats.delivered_total == 4
+    clock.detach()
+
+
+async def test_group_limit(clock):
+    flood_control = FloodControl(chat_limit=None, group_limit=RateLimit(rate=1 / 60, burst=2))
+    bot, _ = _create_bot(clock, flood_control)
+    await bot.send_message(GROUP_CHAT.id, 'text')
+    await bot.send_message(GROUP_CHAT.id, 'text')
+
+    with pytest.raises(TelegramRetryAfter) as exc_info:
+        await bot.send_message(GROUP_CHAT.id, 'text')
+    assert exc_info.value.retry_after == 60
+    # private chats are not limited by the group limit
+    await bot.send_message(PRIVATE_CHAT.id, 'text')
+
+
+async def test_bot_limit_is_shared_by_chats(clock):
+    flood_control = FloodControl(bot_limit=RateLimit(rate=1, burst=2), chat_limit=None, group_limit=None)
+    bot, _ = _create_bot(clock, flood_control)
+    await bot.send_message(PRIVATE_CHAT.id, 'text')
+    await bot.send_message(GROUP_CHAT.id, 'text')
+    with pytest.raises(TelegramRetryAfter):
+        await bot.send_message(PRIVATE_CHAT.id, 'text')
+
+
+async def test_methods_without_chat_are_not_limited(clock):
+    flood_control = FloodControl(bot_limit=RateLimit(rate=1, burst=1))
+    bot, _ = _create_bot(clock, flood_control)
+    for _ in range(5):
+        await bot(GetMe())
+    assert flood_control.stats.throttled_total == 0
+
+
+async def test_latency_is_sampled_per_method(clock):
+    flood_control = FloodControl(
+        chat_limit=None,
+        latencies={SendMessage: constant_latency(0.001)},
+    )
+    bot, _ = _create_bot(clock, flood_control)
+    await bot.send_message(PRIVATE_CHAT.id, 'text')
+    await bot(GetMe())
+    assert flood_control.stats.total_latency == pytest.approx(0.001)
+
+
+async def test_latency_is_reproducible_with_seed(clock):
+    total_latencies = []
+    for _ in range(2):
+        flood_control = FloodControl(default_latency=lognormal_latency(0.001, 0.5), seed=42)
+        bot, _ = _create_bot(clock, flood_control)
+        for _ in range(3):
+            await bot(GetMe())
+        total_latencies.append(flood_control.stats.total_latency)
+    assert total_latencies[0] == total_latencies[1] > 0
@@ -0,0 +1,165 @@
+import asyncio
+from datetime import datetime
+from functools import partial
+from typing import Generator, Iterable, List, Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Chat, InlineQuery, InlineQueryResultArticle, InputTextMessageContent, Update, User
+
+from aiogram_mock.clock import VirtualClock
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.replay import ReplayEngine
+from aiogram_mock.retention import RetentionPolicy
+from aiogram_mock.tg_control import PrivateChatTgControl
+from aiogram_mock.tg_state import TgState
+from aiogram_mock.transport import PollingTransport
+from aiogram_mock.webhook import WebhookTransport
+
+late_answers: List['asyncio.Future[bool]'] = []
+
+
+def _article(query: InlineQuery) -> InlineQueryResultArticle:
+    return InlineQueryResultArticle(
+        id=query.query or 'empty',
+        title=query.query,
+        input_message_content=InputTextMessageContent(message_text=query.query),
+    )
+
+
+async def on_inline_query(query: InlineQuery):
+    if query.query == 'late':
+        async def answer_later() -> bool:
+            await asyncio.sleep(0)
+            return await query.answer([_article(query)])
+
+        late_answers.append(asyncio.ensure_future(answer_later()))
+        return
+    if query.query == 'ignored':
+        return
+    await query.answer([_article(query)], cache_time=60, is_personal=query.query == 'personal')
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.inline_query.register(on_inline_query)
+    return bot, dispatcher
+
+
+@pytest.fixture()
+def clock() -> VirtualClock:
+    return VirtualClock(start=datetime(2023, 1, 1))
+
+
+@pytest.fixture()
+def tg_state(clock: VirtualClock) -> TgState:
+    return TgState([], clock=clock, retention=RetentionPolicy(answers_depth=10))
+
+
+def _with_chats(tg_state: TgState, chats: Iterable[Chat]) -> TgState:
+    for chat in chats:
+        tg_state.add_chat(chat)
+    return tg_state
+
+
+@pytest.fixture()
+def tg_control(tg_state, clock) -> Generator[PrivateChatTgControl, None, None]:
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+        tg_state_factory=partial(_with_chats, tg_state),
+    ) as tg_control:
+        yield tg_control
+    clock.detach()
+
+
+async def test_answer(tg_control):
+    answer = await tg_control.inline_query('cats')
+    assert answer.results[0].title == 'cats'
+
+
+async def test_cached_answer_is_returned_until_it_expires(tg_control, tg_state, clock):
+    first = await tg_control.inline_query('cats')
+    assert await tg_control.inline_query('cats') is first
+    assert tg_state.inline_cache_stats.hits == 1
+
+    await clock.advance(61)
+    assert await tg_control.inline_query('cats') is not first
+    assert tg_state.inline_cache_stats.misses == 2
+
+
+async def test_cache_is_bounded_by_answers_depth(tg_control, tg_state):
+    for number in range(50):
+        await tg_control.inline_query(f'query {number}')
+    assert tg_state.memory_stats()['inline_cache'].entries <= 10
+
+
+async def test_late_answer_is_rejected(tg_control):
+    late_answers.clear()
+    with pytest.raises(KeyError):
+        await tg_control.inline_query('late')
+
+    with pytest.raises(TelegramBadRequest, match='query is too old'):
+        await late_answers[0]
+
+
+def _inline_query_update(inline_query_id: str, query: str) -> Update:
+    return Update(
+        update_id=1000,
+        inline_query=InlineQuery(
+            id=inline_query_id,
+            from_user=User(id=555000111, is_bot=False, first_name='Recorded'),
+            query=query,
+            offset='',
+        ),
+    )
+
+
+async def test_delivered_inline_query_is_answered(tg_control, tg_state):
+    await tg_control.tg_control.deliver_update(_inline_query_update('4472835722351783937', 'dogs'))
+    assert tg_state.get_answer_inline_query('4472835722351783937').results[0].title == 'dogs'
+
+
+async def test_inline_query_is_answered_through_polling(tg_state):
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+        tg_state_factory=partial(_with_chats, tg_state),
+        transport_factory=PollingTransport,
+    ) as tg_control:
+        async with tg_control.typed_transport(PollingTransport).polling(bot, polling_timeout=1):
+            answer = await tg_control.inline_query('birds')
+    assert answer.results[0].title == 'birds'
+
+
+async def test_inline_query_is_answered_through_webhook(tg_state):
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+        tg_state_factory=partial(_with_chats, tg_state),
+        transport_factory=WebhookTransport,
+    ) as tg_control:
+        async with tg_control.typed_transport(WebhookTransport).serving(bot):
+            answer = await tg_control.inline_query('birds')
+    assert answer.results[0].title == 'birds'
+
+
+async def test_replayed_inline_query_is_answered(tg_control, tg_state, tmp_path):
+    path = tmp_path / 'updates.jsonl'
+    path.write_text(_inline_query_update('4472835722351783937', 'fish').json(exclude_none=True), encoding='utf-8')
+    report = await ReplayEngine(tg_control).replay_file(path)
+    assert report.errors == []
+    assert report.requests == 1
+    # replayed queries get local ids
+    assert tg_state.get_answer_inline_query('1').results[0].title == 'fish'
+
+
+async def test_pending_inline_queries_are_bounded(tg_control, tg_state):
+    for number in range(20):
+        await tg_control.tg_control.deliver_update(_inline_query_update(str(number), 'ignored'))
+    assert tg_state.memory_stats()['inline_queries'].entries == 10
@@ -0,0 +1,125 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters import CommandStart
+from aiogram.types import Message
+
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.instrumentation import Instrumentation, RequestContext, UpdateContext
+
+HANDLER_PREFIX = f'{__name__}.'
+
+
+async def on_start(message: Message):
+    await message.answer('hello')
+    await message.answer('again')
+
+
+async def on_nested(message: Message):
+    await message.answer('nested')
+
+
+async def on_fail(message: Message):
+    raise RuntimeError('handler failed')
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_start, CommandStart())
+    dispatcher.message.register(on_fail, F.text == 'fail')
+    router = Router()
+    router.message.register(on_nested, F.text == 'nested')
+    dispatcher.include_router(router)
+    return bot, dispatcher
+
+
+async def test_requests_updates_and_handlers_are_measured():
+    bot, dispatcher = create_bot_and_dispatcher()
+    instrumentation = Instrumentation()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher, instrumentation=instrumentation) as tg_control:
+        await tg_control.send('/start')
+        await tg_control.send('nested')  # handlers of nested routers are wrapped by the root router
+        await tg_control.send('/start')
+
+    assert instrumentation.method_counts == {'SendMessage': 5}
+    assert instrumentation.request_latency['SendMessage'].count == 5
+    assert instrumentation.update_latency.count == 3
+    assert instrumentation.update_requests.count == 3
+    assert instrumentation.update_requests.max == 2
+    assert instrumentation.update_requests.percentile(0) == 1
+
+    start = instrumentation.handlers[HANDLER_PREFIX + 'on_start']
+    assert start.calls == 2
+    assert start.requests.p50 == 2
+    assert start.latency.count == 2
+    assert start.latency.p99 >= start.latency.p50 > 0
+    assert instrumentation.handlers[HANDLER_PREFIX + 'on_nested'].calls == 1
+
+
+async def test_hooks_see_results_and_exceptions():
+    bot, dispatcher = create_bot_and_dispatcher()
+    instrumentation = Instrumentation()
+    events: List[str] = []
+
+    @asynccontextmanager
+    async def request_hook(context: RequestContext) -> AsyncIterator[None]:
+        events.append(f'request {type(context.method).__name__}')
+        yield
+        events.append(f'result {context.result.text}')
+
+    @asynccontextmanager
+    async def update_hook(context: UpdateContext) -> AsyncIterator[None]:
+        events.append(f'update {context.update.message.text}')
+        try:
+            yield
+        finally:
+            events.append(f'handled {context.handlers} {context.requests} {type(context.exception).__name__}')
+
+    instrumentation.add_request_hook(request_hook)
+    instrumentation.add_update_hook(update_hook)
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher, instrumentation=instrumentation) as tg_control:
+        await tg_control.send('nested')
+        with pytest.raises(RuntimeError):
+            await tg_control.send('fail')
+
+    assert events == [
+        'update nested',
+        'request SendMessage',
+        'result nested',
+        f"handled ['{HANDLER_PREFIX}on_nested'] 1 NoneType",
+        'update fail',
+        f"handled ['{HANDLER_PREFIX}on_fail'] 0 RuntimeError",
+    ]
+    assert instrumentation.handlers[HANDLER_PREFIX + 'on_fail'].calls == 1
+    assert instrumentation.update_latency.count == 2
+
+
+async def test_attach_detach_and_attach_again():
+    bot, dispatcher = create_bot_and_dispatcher()
+    instrumentation = Instrumentation()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher) as tg_control:
+        instrumentation.attach(dispatcher=dispatcher, session=bot.session)
+        instrumentation.attach(dispatcher=dispatcher, session=bot.session)  # attaching twice does nothing
+        await tg_control.send('nested')
+        assert instrumentation.method_counts['SendMessage'] == 1
+        assert instrumentation.handlers[HANDLER_PREFIX + 'on_nested'].calls == 1
+
+        instrumentation.detach(dispatcher=dispatcher, session=bot.session)
+        instrumentation.detach(dispatcher=dispatcher, session=bot.session)
+        await tg_control.send('nested')
+        assert instrumentation.method_counts['SendMessage'] == 1
+        assert instrumentation.update_latency.count == 1
+
+        instrumentation.attach(dispatcher=dispatcher, session=bot.session)
+        await tg_control.send('nested')
+        assert instrumentation.method_counts['SendMessage'] == 2
+        assert instrumentation.handlers[HANDLER_PREFIX + 'on_nested'].calls == 2
+        instrumentation.detach(dispatcher=dispatcher, session=bot.session)
+
+        # handler middlewares are removed from every observer
+        assert all(not observer.middleware._middlewares for observer in dispatcher.observers.values())
+        await tg_control.send('nested')
+        assert instrumentation.handlers[HANDLER_PREFIX + 'on_nested'].calls == 2
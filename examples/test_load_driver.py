@@ -0,0 +1,109 @@
+import asyncio
+from typing import Generator, List, Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message, User
+
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.load_driver import LoadDriver
+from aiogram_mock.tg_control import PrivateChatTgControl, TgControl
+
+
+async def on_message(message: Message):
+    await asyncio.sleep(0)
+    await message.answer(f'echo: {message.text}')
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_message)
+    return bot, dispatcher
+
+
+@pytest.fixture()
+def tg_control() -> Generator[TgControl, None, None]:
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher) as control:
+        yield control.tg_control
+
+
+def _user(user_id: int) -> User:
+    return User(id=user_id, is_bot=False, first_name='User')
+
+
+async def test_steps_of_one_chat_run_in_order(tg_control):
+    driver = LoadDriver(tg_control, concurrency=10)
+    for user_id in range(1, 6):
+        control = driver.private_chat(_user(user_id))
+        for number in range(5):
+            driver.schedule(control.chat.id, lambda control=control, number=number: control.send(str(number)))
+    report = await driver.run()
+
+    assert report.errors == []
+    assert (report.chats, report.steps, report.updates) == (5, 25, 25)
+    assert report.updates_per_second > 0
+    for user_id in range(1, 6):
+        texts = [message.text for message in tg_control.messages(user_id)]
+        assert texts == [text for number in range(5) for text in (str(number), f'echo: {number}')]
+        message_ids = [message.message_id for message in tg_control.messages(user_id)]
+        assert message_ids == sorted(set(message_ids))
+
+
+async def test_concurrency_is_bounded(tg_control):
+    running = 0
+    max_running = 0
+
+    async def step():
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+
+    driver = LoadDriver(tg_control, concurrency=3)
+    for chat_id in range(10):
+        driver.schedule(chat_id, step)
+    report = await driver.run()
+    assert report.steps == 10
+    assert max_running == 3
+
+
+async def test_rest_of_chat_is_skipped_after_failure(tg_control):
+    executed: List[str] = []
+
+    async def scenario(control: PrivateChatTgControl):
+        executed.append(control.user.first_name)
+        if control.user.id == 1:
+            raise RuntimeError('scenario failed')
+        await control.send('/start')
+
+    driver = LoadDriver(tg_control)
+    for user_id in (1, 1, 2):
+        driver.schedule_scenario(_user(user_id), scenario)
+    report = await driver.run()
+
+    assert [str(error) for error in report.errors] == ['scenario failed']
+    assert (report.chats, report.steps, report.updates) == (2, 2, 1)
+    assert len(executed) == 2
+
+
+async def test_scheduled_steps_are_run_once(tg_control):
+    driver = LoadDriver(tg_control)
+    driver.schedule_scenario(_user(1), lambda control: control.send('hello'))
+    assert (await driver.run()).steps == 1
+    assert (await driver.run()).steps == 0
+
+
+async def test_concurrent_messages_of_one_chat_get_distinct_ids(tg_control):
+    control = LoadDriver(tg_control).private_chat(_user(1))
+    await asyncio.gather(*(control.send(str(number)) for number in range(20)))
+    message_ids = [message.message_id for message in control.messages]
+    assert len(message_ids) == 40
+    assert len(set(message_ids)) == 40
+
+
+def test_concurrency_must_be_positive(tg_control):
+    with pytest.raises(ValueError):
+        LoadDriver(tg_control, concurrency=0)
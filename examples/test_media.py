@@ -0,0 +1,102 @@
+import asyncio
+from typing import AsyncGenerator, Generator, Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.types import BufferedInputFile, InputFile, InputMediaAudio, InputMediaPhoto, InputMediaVideo
+
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.tg_control import PrivateChatTgControl
+
+
+class CountingInputFile(InputFile):
+    def __init__(self, content: bytes, filename: str):
+        super().__init__(filename=filename, chunk_size=4)
+        self.content = content
+        self.reads = 0
+
+    async def read(self, chunk_size: int) -> AsyncGenerator[bytes, None]:
+        self.reads += 1
+        for start in range(0, len(self.content), chunk_size):
+            await asyncio.sleep(0)
+            yield self.content[start:start + chunk_size]
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    return bot, dispatcher
+
+
+@pytest.fixture()
+def tg_control() -> Generator[PrivateChatTgControl, None, None]:
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher) as tg_control:
+        yield tg_control
+
+
+async def test_single_media_messages(tg_control: PrivateChatTgControl):
+    bot, chat_id = tg_control.bot, tg_control.chat.id
+
+    document = (await bot.send_document(chat_id, BufferedInputFile(b'doc', filename='a.txt'), caption='doc')).document
+    assert document.file_name == 'a.txt'
+    assert document.file_size == 3
+    assert tg_control.last_message.text == 'doc'
+
+    video = (await bot.send_video(chat_id, BufferedInputFile(b'video', filename='v.mp4'), width=640, height=480)).video
+    assert (video.width, video.height, video.duration) == (640, 480, 0)
+    assert video.file_size == 5
+
+    audio = (
+        await bot.send_audio(chat_id, BufferedInputFile(b'audio', filename='a.mp3'), performer='Band', title='Song')
+    ).audio
+    assert (audio.performer, audio.title) == ('Band', 'Song')
+
+    photo = await bot.send_photo(chat_id, BufferedInputFile(b'doc', filename='b.txt'))
+    # equal contents get the same unique id
+    assert photo.document.file_unique_id == document.file_unique_id
+
+
+async def test_file_id_is_resent_without_reading(tg_control: PrivateChatTgControl):
+    input_file = CountingInputFile(b'content', filename='file.bin')
+    sent = await tg_control.bot.send_document(tg_control.chat.id, input_file)
+    resent = await tg_control.bot.send_document(tg_control.chat.id, sent.document.file_id)
+    assert resent.document.file_unique_id == sent.document.file_unique_id
+    assert resent.document.file_size == 7
+    assert input_file.reads == 1
+
+
+async def test_concurrent_uploads_of_one_file_read_it_once(tg_control: PrivateChatTgControl):
+    input_file = CountingInputFile(b'broadcast content', filename='file.bin')
+    messages = await asyncio.gather(
+        *(tg_control.bot.send_document(tg_control.chat.id, input_file) for _ in range(5)),
+    )
+    assert input_file.reads == 1
+    assert len({message.document.file_id for message in messages}) == 1
+    assert len({message.message_id for message in messages}) == 5
+
+
+async def test_media_group_gets_consecutive_ids(tg_control: PrivateChatTgControl):
+    album = [
+        InputMediaPhoto(media=BufferedInputFile(b'photo', filename='p.jpg'), caption='album'),
+        InputMediaVideo(media=BufferedInputFile(b'video', filename='v.mp4'), duration=10),
+        InputMediaAudio(media=BufferedInputFile(b'audio', filename='a.mp3'), title='Song'),
+    ]
+    messages = await tg_control.bot.send_media_group(tg_control.chat.id, album)
+
+    first_id = messages[0].message_id
+    assert [message.message_id for message in messages] == [first_id, first_id + 1, first_id + 2]
+    assert len({message.media_group_id for message in messages}) == 1
+    assert messages[0].text == 'album'
+    assert messages[0].document.file_name == 'p.jpg'
+    assert messages[1].video.duration == 10
+    assert messages[2].audio.title == 'Song'
+    assert list(tg_control.messages) == messages
+
+
+async def test_media_group_size_is_checked(tg_control: PrivateChatTgControl):
+    with pytest.raises(ValueError, match='Media group'):
+        await tg_control.bot.send_media_group(
+            tg_control.chat.id,
+            [InputMediaPhoto(media=BufferedInputFile(b'photo', filename='p.jpg'))],
+        )
@@ -0,0 +1,123 @@
+import tracemalloc
+from functools import partial
+from typing import List, Set, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.instrumentation import Instrumentation
+from aiogram_mock.memory_stats import AllocationTracker, deep_size
+from aiogram_mock.retention import RetentionPolicy
+from aiogram_mock.tg_state import TgState
+
+leaked: List[bytes] = []
+
+
+async def on_message(message: Message):
+    if message.text == 'leak':
+        leaked.append(bytes(100_000))
+    await message.answer('x' * 1000)
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_message)
+    return bot, dispatcher
+
+
+async def _send_many(retention: RetentionPolicy, count: int):
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+        tg_state_factory=partial(TgState, retention=retention),
+    ) as tg_control:
+        before = (tg_control.tg_control.tg_state.memory_stats(), bot.session.memory_stats())
+        for number in range(count):
+            await tg_control.send(str(number))
+        after = (tg_control.tg_control.tg_state.memory_stats(), bot.session.memory_stats())
+        chat_stats = tg_control.tg_control.tg_state.chat_memory_stats()[tg_control.chat.id]
+    return before, after, chat_stats
+
+
+async def test_stats_grow_with_history():
+    (state_before, session_before), (state_after, session_after), chat_stats = await _send_many(RetentionPolicy(), 20)
+
+    assert state_before['histories'].entries == 0
+    assert state_after['histories'].entries == 40
+    assert state_after['histories'].size > state_before['histories'].size + 20 * 1000
+    assert session_after['sent_methods'].entries == 20
+    assert session_after['sent_methods'].size > session_before['sent_methods'].size
+    assert chat_stats.entries == 40
+    assert chat_stats.size >= state_after['histories'].size
+
+
+async def test_retention_bounds_stats():
+    _, (unbounded_state, unbounded_session), _ = await _send_many(RetentionPolicy(), 50)
+    retention = RetentionPolicy(history_depth=10, sent_methods_depth=5)
+    _, (state, session), chat_stats = await _send_many(retention, 50)
+
+    assert state['histories'].entries == chat_stats.entries == 10
+    assert state['histories'].size < unbounded_state['histories'].size / 2
+    assert session['sent_methods'].entries == 5
+    assert session['sent_methods'].size < unbounded_session['sent_methods'].size / 2
+
+
+def test_shared_objects_are_counted_once():
+    shared = bytes(10_000)
+    seen: Set[int] = set()
+    assert deep_size([shared], seen) > 10_000
+    assert deep_size([shared], seen) < 1000
+
+
+async def test_tracker_records_growth_by_handler():
+    bot, dispatcher = create_bot_and_dispatcher()
+    instrumentation = Instrumentation()
+    assert not tracemalloc.is_tracing()
+    with AllocationTracker(top_lines=2) as tracker, private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+        instrumentation=instrumentation,
+    ) as tg_control:
+        tracker.attach(instrumentation)
+        await tg_control.send('leak')
+        assert tracemalloc.is_tracing()
+    assert not tracemalloc.is_tracing()
+    leaked.clear()
+
+    [allocation] = tracker.updates
+    assert allocation.handlers == (f'{__name__}.on_message',)
+    assert allocation.growth >= 100_000
+    assert len(allocation.top) == 2
+    assert tracker.growth_by_handler[f'{__name__}.on_message'] == allocation.growth
+
+
+def test_tracker_can_be_restarted_and_keeps_foreign_tracing():
+    tracker = AllocationTracker()
+    for _ in range(2):
+        tracker.start()
+        assert tracemalloc.is_tracing()
+        tracker.stop()
+        assert not tracemalloc.is_tracing()
+    tracker.stop()  # stopping a stopped tracker does nothing
+
+    tracemalloc.start()
+    try:
+        with AllocationTracker():
+            pass
+        # tracing started by somebody else is not stopped
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+async def test_updates_are_not_recorded_without_tracing():
+    bot, dispatcher = create_bot_and_dispatcher()
+    instrumentation = Instrumentation()
+    tracker = AllocationTracker()
+    tracker.attach(instrumentation)
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher, instrumentation=instrumentation) as tg_control:
+        await tg_control.send('hello')
+    assert tracker.updates == []
@@ -0,0 +1,98 @@
+from datetime import datetime
+from functools import partial
+from typing import List, Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher, F
+from aiogram.filters import CommandStart
+from aiogram.types import CallbackQuery, Chat, InlineKeyboardButton, InlineKeyboardMarkup, Message, User
+
+from aiogram_mock.clock import VirtualClock
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.message_factory import MessageFactory
+from aiogram_mock.tg_state import TgState
+
+MARKUP = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text='Edit', callback_data='edit')]])
+
+
+async def on_start(message: Message):
+    reply = await message.answer('hello', reply_markup=MARKUP)
+    await message.reply('reply')
+    # the keyboard is sent again without changes
+    await reply.edit_reply_markup(reply_markup=reply.reply_markup)
+
+
+async def on_edit(query: CallbackQuery):
+    await query.answer()
+    await query.message.edit_text('edited', reply_markup=MARKUP)
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_start, CommandStart())
+    dispatcher.callback_query.register(on_edit, F.data == 'edit')
+    return bot, dispatcher
+
+
+async def _run(trusted: bool) -> List[Message]:
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+        tg_state_factory=partial(
+            TgState,
+            message_factory=MessageFactory(trusted=trusted),
+            clock=VirtualClock(start=datetime(2023, 1, 1)),
+        ),
+    ) as tg_control:
+        await tg_control.send('/start')
+        await tg_control.click(F.callback_data == 'edit', tg_control.messages[1])
+        return list(tg_control.messages)
+
+
+def _comparable(message: Message) -> str:
+    return message.json(exclude_none=True)
+
+
+async def test_trusted_messages_equal_validated_ones():
+    trusted = await _run(trusted=True)
+    strict = await _run(trusted=False)
+    assert [_comparable(message) for message in trusted] == [_comparable(message) for message in strict]
+    assert [message.text for message in trusted] == ['/start', 'edited', 'reply']
+    assert trusted[2].reply_to_message.message_id == trusted[0].message_id
+
+
+@pytest.mark.parametrize('trusted', [True, False])
+def test_created_messages_are_equal(trusted):
+    chat = Chat(id=1, type='private', first_name='User')
+    fields = dict(
+        message_id=1,
+        date=datetime(2023, 1, 1),
+        chat=chat,
+        from_user=User(id=1, is_bot=False, first_name='User'),
+        text='text',
+        reply_markup=MARKUP,
+    )
+    message = MessageFactory(trusted=trusted).create(**fields)
+    assert message == Message(**fields)
+    assert message.__fields_set__ == Message(**fields).__fields_set__
+
+    updated = MessageFactory(trusted=trusted).update(message, text='new')
+    assert updated == Message(**dict(fields, text='new'))
+    assert message.text == 'text'
+
+
+def test_unchanged_trusted_edit_shares_message():
+    factory = MessageFactory(trusted=True)
+    message = factory.create(
+        message_id=1,
+        date=datetime(2023, 1, 1),
+        chat=Chat(id=1, type='private', first_name='User'),
+        text='text',
+        reply_markup=MARKUP,
+    )
+    assert factory.update(message, text=message.text, reply_markup=message.reply_markup) is message
+    assert factory.update(message, reply_markup=None) is not message
+    # validating factory always copies
+    assert MessageFactory().update(message, text=message.text) is not message
@@ -0,0 +1,128 @@
+import asyncio
+from typing import Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.filters import CommandStart
+from aiogram.methods import SendMessage
+from aiogram.types import Message, Update
+
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.tg_state import TgState
+from aiogram_mock.transport import FeedTransport, PollingTransport
+from aiogram_mock.update_queue import UpdateQueue
+
+
+async def on_start(message: Message):
+    await message.answer('hello')
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_start, CommandStart())
+    return bot, dispatcher
+
+
+async def test_readme_polling_snippet():
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher, transport_factory=PollingTransport) as tg_control:
+        async with tg_control.typed_transport(PollingTransport).polling(bot, polling_timeout=1):
+            await tg_control.send('/start')  # waits until the polled update is processed
+            assert tg_control.last_message.text == 'hello'
+
+
+async def test_updates_sent_before_polling_are_queued():
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher, transport_factory=PollingTransport) as tg_control:
+        await tg_control.send('/start')
+        assert len(tg_control.tg_control.tg_state.update_queue) == 1
+        assert tg_control.last_message.text == '/start'
+
+        transport = tg_control.typed_transport(PollingTransport)
+        # the queued update is received by the first GetUpdates together with the new one and handled before it
+        async with transport.polling(bot, polling_timeout=1, handle_as_tasks=False):
+            await tg_control.send('/start')
+        assert [message.text for message in tg_control.messages] == ['/start', '/start', 'hello', 'hello']
+
+
+async def test_polling_without_waiting_for_processing():
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+        transport_factory=lambda dispatcher, tg_state: PollingTransport(dispatcher, tg_state, wait_processed=False),
+    ) as tg_control:
+        transport = tg_control.typed_transport(PollingTransport)
+        async with transport.polling(bot, polling_timeout=1):
+            for _ in range(3):
+                await tg_control.send('/start')
+            await transport.join()
+        assert [message.text for message in tg_control.messages].count('hello') == 3
+
+
+def test_typed_transport_checks_type():
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher) as tg_control:
+        assert isinstance(tg_control.typed_transport(FeedTransport), FeedTransport)
+        with pytest.raises(TypeError):
+            tg_control.typed_transport(PollingTransport)
+
+
+async def test_queue_confirms_updates_by_offset():
+    queue = UpdateQueue()
+    for update_id in range(1, 6):
+        queue.put(Update(update_id=update_id))
+    with pytest.raises(ValueError):
+        queue.put(Update(update_id=5))
+
+    assert [update.update_id for update in await queue.get_updates(limit=2)] == [1, 2]
+    assert [update.update_id for update in await queue.get_updates(offset=3)] == [3, 4, 5]
+    # negative offset keeps only the last updates
+    assert [update.update_id for update in await queue.get_updates(offset=-1)] == [5]
+    assert await queue.get_updates(offset=6) == []
+    with pytest.raises(ValueError):
+        await queue.get_updates(limit=101)
+
+
+async def test_long_polling_waits_for_updates():
+    queue = UpdateQueue()
+    assert await queue.get_updates(timeout=0) == []
+
+    asyncio.get_running_loop().call_later(0.01, queue.put, Update(update_id=1))
+    assert [update.update_id for update in await queue.get_updates(timeout=5)] == [1]
+
+
+async def test_polling_requests_are_not_logged():
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher, transport_factory=PollingTransport) as tg_control:
+        async with tg_control.typed_transport(PollingTransport).polling(bot, polling_timeout=1):
+            await tg_control.send('/start')
+        assert [type(method) for method in bot.session.sent_methods] == [SendMessage]
+
+
+async def test_restore_wakes_waiting_poller():
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher, transport_factory=PollingTransport) as tg_control:
+        await tg_control.send('/start')
+        snapshot = tg_control.snapshot()
+        tg_state = tg_control.tg_control.tg_state
+        queue = tg_state.update_queue
+        await queue.get_updates(offset=tg_state.last_update_id + 1)
+        assert len(queue) == 0
+
+        waiting = asyncio.ensure_future(queue.get_updates(timeout=5))
+        await asyncio.sleep(0)
+        tg_control.restore(snapshot)
+        assert tg_state.update_queue is queue
+        updates = await asyncio.wait_for(waiting, timeout=1)
+        assert [update.message.text for update in updates] == ['/start']
+
+
+def test_fork_has_own_queue():
+    tg_state = TgState([])
+    tg_state.update_queue.put(Update(update_id=1))
+    forked = tg_state.fork()
+    tg_state.update_queue.put(Update(update_id=2))
+    assert forked.update_queue is not tg_state.update_queue
+    assert (len(forked.update_queue), len(tg_state.update_queue)) == (1, 2)
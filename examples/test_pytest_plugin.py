@@ -0,0 +1,120 @@
+from typing import Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.filters import CommandStart
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.memory import SimpleEventIsolation
+from aiogram.types import Message
+
+from aiogram_mock.pytest_plugin import load_factory, reset_fsm
+
+pytest_plugins = ['pytester']
+
+
+async def on_start(message: Message, state: FSMContext):
+    await state.set_state('started')
+    await message.answer('hello')
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher(events_isolation=SimpleEventIsolation())
+    dispatcher.message.register(on_start, CommandStart())
+    return bot, dispatcher
+
+
+def test_factory_is_loaded_by_import_path():
+    assert load_factory('test_pytest_plugin:create_bot_and_dispatcher') is create_bot_and_dispatcher
+    with pytest.raises(ValueError):
+        load_factory('test_pytest_plugin.create_bot_and_dispatcher')
+
+
+async def test_reset_clears_states_and_isolation():
+    _, dispatcher = create_bot_and_dispatcher()
+    events_isolation = dispatcher.fsm.events_isolation
+    storage = dispatcher.fsm.storage
+    dispatcher.fsm.storage.storage['key'].state = 'started'
+
+    reset_fsm(dispatcher)
+    assert dispatcher.fsm.storage is storage
+    assert not storage.storage
+    assert dispatcher.fsm.events_isolation is not events_isolation
+    assert isinstance(dispatcher.fsm.events_isolation, SimpleEventIsolation)
+
+
+def test_fixtures_share_bot_and_reset_state(pytester: pytest.Pytester):
+    pytester.makeini(
+        """
+        [pytest]
+        asyncio_mode = auto
+        aiogram_mock_factory = bot:create_bot_and_dispatcher
+        """,
+    )
+    pytester.makepyfile(
+        bot="""
+        from aiogram import Bot, Dispatcher
+        from aiogram.filters import CommandStart
+
+        calls = []
+
+
+        async def on_start(message, state):
+            assert await state.get_state() is None
+            await state.set_state('started')
+            await message.answer('hello')
+
+
+        def create_bot_and_dispatcher():
+            calls.append(1)
+            dispatcher = Dispatcher()
+            dispatcher.message.register(on_start, CommandStart())
+            return Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11'), dispatcher
+        """,
+        test_bot="""
+        import pytest
+
+        import bot
+
+
+        @pytest.mark.parametrize('attempt', range(3))
+        async def test_start(aiogram_mock_tg_control, attempt):
+            await aiogram_mock_tg_control.send('/start')
+            assert aiogram_mock_tg_control.last_message.text == 'hello'
+            assert len(aiogram_mock_tg_control.messages) == 2
+            assert bot.calls == [1]
+
+
+        async def test_group(aiogram_mock_group_tg_control):
+            assert aiogram_mock_group_tg_control.chat.type == 'supergroup'
+
+
+        def test_tg_control_name_is_free(tg_control):
+            assert tg_control == 'own fixture'
+
+
+        @pytest.fixture()
+        def tg_control():
+            return 'own fixture'
+        """,
+    )
+    pytester.syspathinsert()
+    pytester.runpytest('-p', 'no:cacheprovider').assert_outcomes(passed=5)
+
+
+def test_missing_factory_is_usage_error(pytester: pytest.Pytester):
+    pytester.makeini(
+        """
+        [pytest]
+        asyncio_mode = auto
+        """,
+    )
+    pytester.makepyfile(
+        """
+        def test_start(aiogram_mock_tg_control):
+            pass
+        """,
+    )
+    result = pytester.runpytest()
+    result.assert_outcomes(errors=1)
+    result.stdout.fnmatch_lines(['*Set aiogram_mock_factory ini option*'])
@@ -0,0 +1,224 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Dict, Generator, List, Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.types import CallbackQuery, Message, Update
+
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.replay import ReplayEngine
+from aiogram_mock.tg_control import PrivateChatTgControl
+
+ORIGINAL_USER = {'id': 555000111, 'is_bot': False, 'first_name': 'Recorded'}
+ORIGINAL_CHAT = {'id': 555000111, 'type': 'private', 'first_name': 'Recorded'}
+
+
+async def on_message(message: Message):
+    await message.answer(f'echo: {message.text}')
+
+
+async def on_callback_query(query: CallbackQuery):
+    await query.answer(text=f'answer: {query.data}')
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_message)
+    dispatcher.callback_query.register(on_callback_query)
+    return bot, dispatcher
+
+
+@pytest.fixture()
+def tg_control() -> Generator[PrivateChatTgControl, None, None]:
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+    ) as tg_control:
+        yield tg_control
+
+
+def _message_update(update_id: int, message_id: int, text: str) -> Dict[str, Any]:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': message_id,
+            'date': 1672531200,
+            'chat': ORIGINAL_CHAT,
+            'from': ORIGINAL_USER,
+            'text': text,
+        },
+    }
+
+
+def _write_records(path: Path, records: List[Dict[str, Any]]) -> Path:
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records), encoding='utf-8')
+    return path
+
+
+async def test_replay_through_facade_control(tg_control, tmp_path):
+    path = _write_records(tmp_path / 'updates.jsonl', [
+        _message_update(1000, 10, 'first'),
+        {
+            'update': _message_update(1001, 11, 'second'),
+            'responses': [{'method': 'SendMessage', 'params': {'text': 'echo: second'}}],
+        },
+    ])
+    engine = ReplayEngine(tg_control)
+    report = await engine.replay_file(path)
+
+    assert report.updates == 2
+    assert report.requests == 2
+    assert report.errors == []
+    assert report.divergence_count == 0
+
+    chat_id = engine.remapper.chat_id(ORIGINAL_CHAT['id'])
+    messages = tg_control.tg_control.messages(chat_id)
+    assert [message.text for message in messages] == ['first', 'echo: first', 'second', 'echo: second']
+    # replayed chats do not collide with the chat of the facade
+    assert chat_id != tg_control.chat.id
+
+
+async def test_replay_twice_into_one_state(tg_control, tmp_path):
+    path = _write_records(tmp_path / 'updates.jsonl', [
+        {
+            'update_id': 1000,
+            'callback_query': {
+                'id': '4472835722351783937',  # production ids are large
+                'from': ORIGINAL_USER,
+                'chat_instance': '-123',
+                'data': 'ping',
+            },
+        },
+    ])
+    engine = ReplayEngine(tg_control)
+    for _ in range(2):  # warm-up, then measure
+        report = await engine.replay_file(path)
+        assert report.errors == []
+        assert report.requests == 1
+
+    tg_state = tg_control.tg_control.tg_state
+    assert tg_state.get_answer_callback_query('1').text == 'answer: ping'
+    assert tg_state.get_answer_callback_query('2').text == 'answer: ping'
+
+
+async def test_divergences_are_reported(tg_control, tmp_path):
+    path = _write_records(tmp_path / 'updates.jsonl', [
+        {
+            'update': _message_update(1000, 10, 'text'),
+            'responses': [
+                {'method': 'SendMessage', 'params': {'text': 'something else'}},
+                {'method': 'SendMessage', 'params': {'text': 'missing'}},
+            ],
+        },
+    ])
+    report = await ReplayEngine(tg_control, max_divergences=1).replay_file(path)
+
+    assert report.divergence_count == 2
+    assert len(report.divergences) == 1
+    divergence = report.divergences[0]
+    assert divergence.line == 1
+    assert divergence.expected == {'method': 'SendMessage', 'text': 'something else'}
+    assert divergence.actual == {'method': 'SendMessage', 'text': 'echo: text'}
+
+
+async def test_replies_and_edits_refer_to_local_messages(tg_control, tmp_path):
+    bot_message = {'message_id': 11, 'date': 1672531200, 'chat': ORIGINAL_CHAT, 'text': 'echo: first'}
+    reply = _message_update(1001, 12, 'reply')
+    reply['message']['reply_to_message'] = bot_message
+    edited = _message_update(1002, 10, 'edited')
+    edited['edited_message'] = edited.pop('message')
+    path = _write_records(tmp_path / 'updates.jsonl', [
+        {
+            'update': _message_update(1000, 10, 'first'),
+            'responses': [{'method': 'SendMessage', 'params': {'text': 'echo: first'}, 'result': bot_message}],
+        },
+        reply,
+        edited,
+    ])
+    engine = ReplayEngine(tg_control)
+    report = await engine.replay_file(path)
+    assert report.errors == []
+
+    messages = tg_control.tg_control.messages(engine.remapper.chat_id(ORIGINAL_CHAT['id']))
+    first, echo, reply_message = messages[0], messages[1], messages[2]
+    assert first.text == 'edited'
+    assert reply_message.reply_to_message.message_id == echo.message_id
+
+
+async def test_group_chats_are_registered(tg_control, tmp_path):
+    update = _message_update(1000, 10, 'in group')
+    update['message']['chat'] = {'id': -100777, 'type': 'supergroup', 'title': 'Recorded group'}
+    path = _write_records(tmp_path / 'updates.jsonl', [update])
+    engine = ReplayEngine(tg_control)
+    await engine.replay_file(path)
+
+    chat_id = engine.remapper.chat_id(-100777)
+    assert chat_id < 0
+    assert tg_control.tg_control.tg_state.chats[chat_id].title == 'Recorded group'
+    assert [message.text for message in tg_control.tg_control.messages(chat_id)] == ['in group', 'echo: in group']
+
+
+@pytest.mark.parametrize('batch_size', [None, 3])
+async def test_updates_of_one_chat_keep_order(tg_control, tmp_path, batch_size):
+    records = []
+    for number in range(20):
+        update = _message_update(1000 + number, number, str(number))
+        user_id = 555000200 + number % 4
+        update['message']['chat'] = dict(ORIGINAL_CHAT, id=user_id)
+        update['message']['from'] = dict(ORIGINAL_USER, id=user_id)
+        records.append(update)
+    path = _write_records(tmp_path / 'updates.jsonl', records)
+    engine = ReplayEngine(tg_control, concurrency=4, batch_size=batch_size)
+    report = await engine.replay_file(path)
+    assert report.updates == 20
+    assert report.errors == []
+
+    for chat_number in range(4):
+        messages = tg_control.tg_control.messages(engine.remapper.chat_id(555000200 + chat_number))
+        texts = [message.text for message in messages if not message.text.startswith('echo')]
+        assert texts == [str(number) for number in range(chat_number, 20, 4)]
+
+
+async def test_update_ids_follow_records(tmp_path):
+    update_ids: List[Tuple[str, int]] = []
+
+    async def on_record(message: Message, event_update: Update):
+        # the first update of the chat is slow, so the waiting second one would be resumed after the other chat
+        if message.text == 'first':
+            await asyncio.sleep(0.01)
+        update_ids.append((message.text, event_update.update_id))
+
+    bot, dispatcher = create_bot_and_dispatcher()
+    dispatcher.message.handlers.clear()
+    dispatcher.message.register(on_record)
+    other_user = dict(ORIGINAL_USER, id=555000222)
+    other = _message_update(1002, 10, 'other')
+    other['message']['chat'] = dict(ORIGINAL_CHAT, id=555000222)
+    other['message']['from'] = other_user
+    path = _write_records(tmp_path / 'updates.jsonl', [
+        _message_update(1000, 10, 'first'),
+        _message_update(1001, 11, 'second'),
+        other,
+    ])
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher) as tg_control:
+        report = await ReplayEngine(tg_control, concurrency=3).replay_file(path)
+    assert report.errors == []
+    assert sorted(update_ids, key=lambda item: item[1]) == [('first', 1), ('second', 2), ('other', 3)]
+
+
+async def test_malformed_responses_are_errors(tg_control, tmp_path):
+    path = _write_records(tmp_path / 'updates.jsonl', [
+        {'update': _message_update(1000, 10, 'first'), 'responses': [{'params': {'text': 'echo: first'}}]},
+        _message_update(1001, 11, 'second'),
+    ])
+    engine = ReplayEngine(tg_control)
+    report = await engine.replay_file(path)
+
+    assert report.updates == 2
+    assert [(error.line, type(error.exception)) for error in report.errors] == [(1, KeyError)]
+    chat_id = engine.remapper.chat_id(ORIGINAL_CHAT['id'])
+    assert tg_control.tg_control.last_message(chat_id).text == 'echo: second'
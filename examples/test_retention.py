@@ -0,0 +1,92 @@
+import random
+from datetime import datetime
+from typing import Set
+
+import pytest
+from aiogram.methods import AnswerCallbackQuery, GetMe, SendMessage
+from aiogram.types import Chat, Message, User
+
+from aiogram_mock.chat_history import ChatHistory
+from aiogram_mock.retention import COMPACT_TEXT_LIMIT, EvictedError, MethodLog, RetentionPolicy
+from aiogram_mock.tg_state import TgState
+
+CHAT = Chat(id=1, type='private')
+USER = User(id=1, is_bot=False, first_name='User')
+
+
+def _message(message_id: int) -> Message:
+    return Message(message_id=message_id, date=datetime(2023, 1, 1), chat=CHAT, from_user=USER, text=str(message_id))
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_deleted_messages_are_never_reported_as_evicted(seed):
+    rnd = random.Random(seed)
+    history = ChatHistory(max_depth=5)
+    deleted: Set[int] = set()
+    for message_id in range(60):
+        history.append(_message(message_id))
+        if rnd.random() < 0.3:
+            victim = rnd.choice(list(history)).message_id
+            history.delete(victim)
+            deleted.add(victim)
+
+    for message_id in deleted:
+        with pytest.raises(KeyError) as exc_info:
+            history.get(message_id)
+        assert not isinstance(exc_info.value, EvictedError)
+
+
+def test_policy_is_validated():
+    with pytest.raises(ValueError):
+        RetentionPolicy(history_depth=0)
+    with pytest.raises(ValueError):
+        RetentionPolicy(compact_depth=-1)
+
+
+def test_oldest_messages_are_evicted():
+    history = ChatHistory(max_depth=3, compact_depth=2)
+    for message_id in range(6):
+        history.append(_message(message_id))
+
+    assert [message.message_id for message in history] == [3, 4, 5]
+    assert [record.message_id for record in history.evicted] == [1, 2]
+    with pytest.raises(EvictedError) as exc_info:
+        history.get(2)
+    assert exc_info.value.compact.text == '2'
+    with pytest.raises(EvictedError) as exc_info:
+        history.get(0)
+    assert exc_info.value.compact is None
+    with pytest.raises(KeyError) as exc_info:
+        history.get(6)
+    assert not isinstance(exc_info.value, EvictedError)
+
+
+def test_sent_methods_are_bounded_per_method_type():
+    log = MethodLog(depth=2, compact_depth=1)
+    for number in range(4):
+        log.append(SendMessage(chat_id=1, text=f'text {number}'))
+    log.append(GetMe())
+
+    assert [getattr(method, 'text', None) for method in log.methods] == ['text 2', 'text 3', None]
+    assert [(record.seq, record.text) for record in log.evicted] == [(2, 'text 1')]
+    assert log.total_count == 5
+
+
+def test_compact_records_truncate_text():
+    log = MethodLog(depth=1, compact_depth=1)
+    log.append(SendMessage(chat_id=1, text='x' * 100))
+    log.append(SendMessage(chat_id=1, text='y'))
+    assert log.evicted[0].text == 'x' * COMPACT_TEXT_LIMIT
+
+
+def test_callback_query_answers_are_bounded():
+    tg_state = TgState([CHAT], retention=RetentionPolicy(answers_depth=2))
+    for _ in range(3):
+        tg_state.add_answer_callback_query(AnswerCallbackQuery(callback_query_id=tg_state.next_callback_query_id()))
+
+    assert tg_state.get_answer_callback_query('3').callback_query_id == '3'
+    with pytest.raises(EvictedError):
+        tg_state.get_answer_callback_query('1')
+    with pytest.raises(KeyError) as exc_info:
+        tg_state.get_answer_callback_query('4')
+    assert not isinstance(exc_info.value, EvictedError)
@@ -0,0 +1,92 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.filters import CommandStart
+from aiogram.types import Message, User
+
+from aiogram_mock.sharded_runner import ScenarioCase, ShardedRunner, ShardReport
+from aiogram_mock.tg_control import PrivateChatTgControl
+
+
+async def on_start(message: Message):
+    await message.answer('hello')
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_start, CommandStart())
+    return bot, dispatcher
+
+
+# scenarios run in other processes, so they are module level functions
+async def first_scenario(tg_control: PrivateChatTgControl) -> None:
+    await tg_control.send('/start')
+    assert tg_control.last_message.text == 'hello'
+
+
+async def second_scenario(tg_control: PrivateChatTgControl) -> None:
+    # the scenario follows the first one of the chat in the same TgState
+    assert len(tg_control.messages) == 2
+    await tg_control.send('/start')
+
+
+async def failing_scenario(tg_control: PrivateChatTgControl) -> None:
+    raise RuntimeError(f'chat {tg_control.chat.id} failed')
+
+
+def _user(user_id: int) -> User:
+    return User(id=user_id, is_bot=False, first_name='User')
+
+
+def _cases(users: int):
+    for user_id in range(1, users + 1):
+        yield ScenarioCase(_user(user_id), first_scenario)
+        yield ScenarioCase(_user(user_id), second_scenario)
+
+
+async def test_scenarios_of_one_chat_run_in_order_in_processes():
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        report = await ShardedRunner(create_bot_and_dispatcher, executor, shards=4, concurrency=5).run(_cases(20))
+
+    assert report.errors == []
+    assert [shard.shard for shard in report.shards] == [0, 1, 2, 3]
+    assert [shard.chats for shard in report.shards] == [5, 5, 5, 5]
+    assert report.chats == 20
+    assert report.steps == 40
+    assert report.updates == 40
+    assert report.updates_per_second > 0
+
+
+async def test_errors_are_formatted():
+    cases = [ScenarioCase(_user(1), failing_scenario), ScenarioCase(_user(1), first_scenario)]
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        report = await ShardedRunner(create_bot_and_dispatcher, executor, shards=2).run(cases)
+
+    assert report.errors == ['RuntimeError: chat 1 failed']
+    # the rest of the chat is skipped after the failure
+    assert report.updates == 0
+
+
+async def test_only_shards_with_chats_are_run():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        runner = ShardedRunner(create_bot_and_dispatcher, executor, shards=8)
+        shards = [shard async for shard in runner.iter_shards(_cases(2))]
+
+    assert sorted(shard.shard for shard in shards) == [runner.shard_of(_user(1)), runner.shard_of(_user(2))]
+    assert all(isinstance(shard, ShardReport) for shard in shards)
+
+
+def test_options_are_checked():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        with pytest.raises(ValueError):
+            ShardedRunner(create_bot_and_dispatcher, executor, shards=0)
+        with pytest.raises(ValueError):
+            ShardedRunner(create_bot_and_dispatcher, executor, shards=1, concurrency=0)
+
+
+def test_empty_shard_report_has_no_rate():
+    report = ShardReport(shard=0, chats=0, steps=0, updates=0, elapsed=0, errors=[])
+    assert report.updates_per_second == 0
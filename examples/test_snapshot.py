@@ -0,0 +1,64 @@
+from typing import Generator, Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.filters import CommandStart
+from aiogram.types import Chat, Message, Update
+
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.message_index import MessageQuery
+from aiogram_mock.tg_control import PrivateChatTgControl
+from aiogram_mock.tg_state import TgState
+
+
+async def on_start(message: Message):
+    await message.answer('hello')
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_start, CommandStart())
+    return bot, dispatcher
+
+
+@pytest.fixture()
+def tg_control() -> Generator[PrivateChatTgControl, None, None]:
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+    ) as tg_control:
+        yield tg_control
+
+
+async def test_restore_after_read_and_mutation(tg_control):
+    await tg_control.send("/start")
+    await tg_control.send("/start")
+    snapshot = tg_control.snapshot()
+    # interior deletion leaves a tombstone in the history shared by the snapshot
+    snapshot.tg_state.delete_message(tg_control.chat.id, tg_control.messages[1].message_id)
+
+    tg_control.restore(snapshot)
+    assert tg_control.messages[0].text == '/start'
+    await tg_control.send("/start")
+
+    tg_control.restore(snapshot)
+    assert len(tg_control.find_messages(MessageQuery(from_user_id=tg_control.user.id))) == 2
+    assert tg_control.last_message.text == 'hello'
+
+
+async def test_update_ids_are_not_rewound_by_restore():
+    chat = Chat(id=1, type='private')
+    tg_state = TgState([chat])
+    snapshot = tg_state.fork()
+
+    for _ in range(2):
+        tg_state.update_queue.put(Update(update_id=tg_state.increment_update_id()))
+    assert len(await tg_state.update_queue.get_updates()) == 2
+    offset = tg_state.last_update_id + 1
+
+    tg_state.restore(snapshot)
+    tg_state.update_queue.put(Update(update_id=tg_state.increment_update_id()))
+    updates = await tg_state.update_queue.get_updates(offset=offset)
+    assert [update.update_id for update in updates] == [3]
@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Tuple
+from uuid import uuid4
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import GetFile
+from aiogram.types import File, Message
+
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.instrumentation import Instrumentation
+from aiogram_mock.transcript import TranscriptRecorder, diff_transcripts, iter_transcript, main, to_jsonable
+
+
+def create_bot_and_dispatcher(reply: str) -> Tuple[Bot, Dispatcher]:
+    async def on_message(message: Message):
+        await message.answer(reply)
+
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_message)
+    return bot, dispatcher
+
+
+async def _record(path: Path, reply: str, texts: Tuple[str, ...] = ('hello', 'again')) -> None:
+    bot, dispatcher = create_bot_and_dispatcher(reply)
+    instrumentation = Instrumentation()
+    with TranscriptRecorder(path) as recorder, private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+        instrumentation=instrumentation,
+    ) as tg_control:
+        recorder.attach(instrumentation)
+        for text in texts:
+            await tg_control.send(text)
+
+
+async def test_requests_are_linked_to_updates(tmp_path):
+    path = tmp_path / 'transcript.jsonl.gz'
+    await _record(path, 'reply')
+
+    events = list(iter_transcript(path))
+    assert [event['event'] for event in events] == ['update', 'request', 'update', 'request']
+    assert [event['seq'] for event in events] == [1, 2, 3, 4]
+    assert events[0]['update']['message']['text'] == 'hello'
+    assert events[1]['update'] == 1
+    assert events[1]['method'] == 'SendMessage'
+    assert events[1]['params']['text'] == 'reply'
+    assert events[1]['result']['text'] == 'reply'
+    assert events[3]['update'] == 3
+
+
+async def test_identical_runs_have_no_differences(tmp_path):
+    await _record(tmp_path / 'left.jsonl', 'reply')
+    await _record(tmp_path / 'right.jsonl', 'reply')
+    assert list(diff_transcripts(tmp_path / 'left.jsonl', tmp_path / 'right.jsonl')) == []
+    assert main([str(tmp_path / 'left.jsonl'), str(tmp_path / 'right.jsonl')]) == 0
+
+
+async def test_changed_replies_are_reported(tmp_path, capsys):
+    await _record(tmp_path / 'left.jsonl', 'reply')
+    await _record(tmp_path / 'right.jsonl', 'changed')
+
+    differences = list(diff_transcripts(tmp_path / 'left.jsonl', tmp_path / 'right.jsonl'))
+    assert [difference.event_number for difference in differences] == [1, 3]
+    assert differences[0].left['params']['text'] == 'reply'
+    assert differences[0].right['params']['text'] == 'changed'
+
+    assert main([str(tmp_path / 'left.jsonl'), str(tmp_path / 'right.jsonl'), '-n', '1']) == 1
+    assert '... 1 more differences' in capsys.readouterr().out
+
+
+async def test_extra_event_shifts_later_events(tmp_path):
+    await _record(tmp_path / 'left.jsonl', 'reply', ('first', 'second'))
+    await _record(tmp_path / 'right.jsonl', 'reply', ('extra', 'first', 'second'))
+    differences = list(diff_transcripts(tmp_path / 'left.jsonl', tmp_path / 'right.jsonl'))
+    # events are compared in lockstep, not resynchronized, so the updates after the extra one differ too
+    assert [difference.event_number for difference in differences if difference.left is not None][:2] == [0, 2]
+    assert [difference.event_number for difference in differences if difference.left is None] == [4, 5]
+
+
+def test_ignored_fields_can_be_extended(tmp_path):
+    paths = [tmp_path / 'left.jsonl', tmp_path / 'right.jsonl']
+    for number, path in enumerate(paths):
+        with TranscriptRecorder(path) as recorder:
+            recorder.record_request(GetFile(file_id=f'file {number}'), exception=KeyError('file'))
+    assert len(list(diff_transcripts(*paths, ignored_fields=frozenset()))) == 1
+    assert main([str(paths[0]), str(paths[1]), '--ignore', 'file_id']) == 0
+
+
+def test_file_paths_are_ignored_by_default(tmp_path):
+    paths = [tmp_path / 'left.jsonl', tmp_path / 'right.jsonl']
+    for path in paths:
+        with TranscriptRecorder(path) as recorder:
+            # the mocked GetFile returns a new file_path in every run
+            recorder.record_request(
+                GetFile(file_id='file'),
+                File(file_id='file', file_unique_id=str(uuid4()), file_path=f'files/{uuid4()}'),
+            )
+    assert list(diff_transcripts(*paths)) == []
+
+
+def test_naive_datetimes_are_utc():
+    assert to_jsonable(datetime(2023, 1, 1)) == 1672531200
+    assert to_jsonable(datetime(2023, 1, 1, tzinfo=timezone.utc)) == 1672531200
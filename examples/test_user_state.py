@@ -0,0 +1,36 @@
+from aiogram.types import Chat, KeyboardButton, ReplyKeyboardMarkup
+
+from aiogram_mock.tg_state import TgState, UserState
+
+CHAT = Chat(id=-1, type='supergroup', title='Group')
+
+
+def _keyboard(text: str) -> ReplyKeyboardMarkup:
+    return ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text=text)]])
+
+
+def test_selective_state_overrides_chat_state():
+    tg_state = TgState([CHAT])
+    tg_state.update_chat_user_state(CHAT.id, reply_markup=_keyboard('chat'))
+    tg_state.update_selective_user_state(CHAT.id, [1], reply_markup=_keyboard('selective'))
+
+    assert tg_state.get_user_state(chat_id=CHAT.id, user_id=1) == UserState(reply_markup=_keyboard('selective'))
+    assert tg_state.get_user_state(chat_id=CHAT.id, user_id=2) == UserState(reply_markup=_keyboard('chat'))
+
+
+def test_chat_state_update_shadows_selective_states():
+    tg_state = TgState([CHAT])
+    tg_state.update_selective_user_state(CHAT.id, [1], reply_markup=_keyboard('selective'))
+    tg_state.update_chat_user_state(CHAT.id, reply_markup=_keyboard('chat'))
+    assert tg_state.get_user_state(chat_id=CHAT.id, user_id=1) == UserState(reply_markup=_keyboard('chat'))
+
+
+def test_partial_selective_update_starts_from_chat_state():
+    tg_state = TgState([CHAT])
+    tg_state.update_selective_user_state(CHAT.id, [1], reply_markup=_keyboard('selective'))
+    tg_state.update_chat_user_state(CHAT.id, reply_markup=_keyboard('chat'))
+    # reply_markup is unset, so the update changes nothing
+    tg_state.update_selective_user_state(CHAT.id, [1, 2])
+
+    for user_id in (1, 2):
+        assert tg_state.get_user_state(chat_id=CHAT.id, user_id=user_id) == UserState(reply_markup=_keyboard('chat'))
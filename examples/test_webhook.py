@@ -0,0 +1,100 @@
+import asyncio
+from typing import Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher, F
+from aiogram.filters import CommandStart
+from aiogram.methods import SendMessage
+from aiogram.types import Message
+
+from aiogram_mock.facade_factory import private_chat_tg_control
+from aiogram_mock.instrumentation import Histogram
+from aiogram_mock.webhook import WebhookError, WebhookTransport
+
+
+async def on_start(message: Message):
+    await message.answer('hello')
+
+
+async def on_inline(message: Message) -> SendMessage:
+    # the method is returned in the webhook response instead of being sent
+    return message.answer('inline')
+
+
+async def on_fail(message: Message):
+    raise RuntimeError('handler failed')
+
+
+def create_bot_and_dispatcher() -> Tuple[Bot, Dispatcher]:
+    bot = Bot(token='123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11')
+    dispatcher = Dispatcher()
+    dispatcher.message.register(on_start, CommandStart())
+    dispatcher.message.register(on_inline, F.text == 'inline')
+    dispatcher.message.register(on_fail, F.text == 'fail')
+    return bot, dispatcher
+
+
+async def test_readme_webhook_snippet():
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher, transport_factory=WebhookTransport) as tg_control:
+        transport = tg_control.typed_transport(WebhookTransport)
+        async with transport.serving(bot):
+            await tg_control.send('/start')
+
+        assert tg_control.last_message.text == 'hello'
+        assert transport.latency.count == 1
+        assert transport.latency.p99 > 0
+
+
+async def test_method_returned_in_response_is_sent():
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher, transport_factory=WebhookTransport) as tg_control:
+        async with tg_control.typed_transport(WebhookTransport).serving(bot):
+            await tg_control.send('inline')
+        assert tg_control.last_message.text == 'inline'
+        assert isinstance(bot.session.sent_methods[-1], SendMessage)
+
+
+async def test_failed_update_raises_webhook_error():
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(bot=bot, dispatcher=dispatcher, transport_factory=WebhookTransport) as tg_control:
+        transport = tg_control.typed_transport(WebhookTransport)
+        with pytest.raises(RuntimeError, match='not started'):
+            await tg_control.send('/start')
+
+        async with transport.serving(bot):
+            with pytest.raises(WebhookError) as exc_info:
+                await tg_control.send('fail')
+        assert exc_info.value.status == 500
+        assert transport.latency.count == 1
+
+
+async def test_updates_handled_in_background():
+    bot, dispatcher = create_bot_and_dispatcher()
+    with private_chat_tg_control(
+        bot=bot,
+        dispatcher=dispatcher,
+        transport_factory=lambda dispatcher, tg_state: WebhookTransport(
+            dispatcher, tg_state, handle_in_background=True,
+        ),
+    ) as tg_control:
+        async with tg_control.typed_transport(WebhookTransport).serving(bot):
+            await tg_control.send('/start')
+            for _ in range(100):
+                if tg_control.last_message.text == 'hello':
+                    break
+                await asyncio.sleep(0.01)
+        assert tg_control.last_message.text == 'hello'
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for value in (5, 1, 4, 2, 3):
+        histogram.record(value)
+    assert histogram.count == 5
+    assert histogram.mean == 3
+    assert histogram.p50 == 3
+    assert histogram.p99 == histogram.max == 5
+    assert histogram.percentile(0) == 1
+    with pytest.raises(ValueError):
+        histogram.percentile(101)
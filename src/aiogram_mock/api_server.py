@@ -0,0 +1,213 @@
+import json
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, Mapping, Optional, Type, Union
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.base import BaseSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.types import BufferedInputFile, InputFile
+from aiogram.utils.token import TokenValidationError
+from aiohttp import web
+from pydantic import ValidationError
+
+from aiogram_mock.mocked_session import MockedSession
+from aiogram_mock.transcript import to_jsonable
+
+ATTACH_PREFIX = 'attach://'
+
+FILE_CHUNK_SIZE = 65536
+FILE_TIMEOUT = 30
+
+
+def _api_method_name(method_type: Type[TelegramMethod[Any]]) -> str:
+    # Bot API method names are class names with lowercased first letter, and they are case insensitive
+    return method_type.__name__.lower()
+
+
+def _decode_value(method_type: Type[TelegramMethod[Any]], name: str, value: str) -> Any:
+    # AiohttpSession sends lists and objects as json, plain strings are sent as is
+    field = method_type.__fields__.get(name)
+    if field is not None and field.outer_type_ is str:
+        return value
+    if value[:1] in ('{', '['):
+        return json.loads(value)
+    return value
+
+
+def _resolve_attachments(value: Any, files: Mapping[str, InputFile]) -> Any:
+    if isinstance(value, str) and value.startswith(ATTACH_PREFIX):
+        return files.get(value[len(ATTACH_PREFIX):], value)
+    if isinstance(value, dict):
+        return {key: _resolve_attachments(item, files) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_resolve_attachments(item, files) for item in value]
+    return value
+
+
+def build_method(
+    method_type: Type[TelegramMethod[Any]],
+    fields: Mapping[str, str],
+    files: Mapping[str, InputFile],
+) -> TelegramMethod[Any]:
+    data: Dict[str, Any] = {name: _decode_value(method_type, name, value) for name, value in fields.items()}
+    for name, input_file in files.items():
+        if name in method_type.__fields__:
+            data[name] = input_file
+    return method_type(**_resolve_attachments(data, files))
+
+
+def default_method_types() -> Dict[str, Type[TelegramMethod[Any]]]:
+    return {_api_method_name(method_type): method_type for method_type in MockedSession.METHOD_MOCKS}
+
+
+def _error_response(status: int, description: str, parameters: Optional[Dict[str, Any]] = None) -> web.Response:
+    body: Dict[str, Any] = {'ok': False, 'error_code': status, 'description': description}
+    if parameters is not None:
+        body['parameters'] = parameters
+    return web.json_response(body, status=status)
+
+
+class BotAPIServer:
+    def __init__(
+        self,
+        session: BaseSession,
+        method_types: Optional[Mapping[str, Type[TelegramMethod[Any]]]] = None,
+        tokens: Optional[Iterable[str]] = None,
+    ):
+        self._session = session
+        if method_types is None:
+            method_types = default_method_types()
+        self._method_types = method_types
+        # None means that any valid token is accepted
+        self._tokens = None if tokens is None else frozenset(tokens)
+        self._bots: Dict[str, Bot] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self._api: Optional[TelegramAPIServer] = None
+
+    def _get_bot(self, token: str) -> Union[Bot, web.Response]:
+        # mocks need only the identity of the bot, requests are sent to the wrapped session
+        try:
+            return self._bots[token]
+        except KeyError:
+            pass
+        # like Bot API, malformed tokens match no endpoint and unknown ones are unauthorized
+        try:
+            bot = Bot(token=token, session=self._session)
+        except TokenValidationError:
+            return _error_response(404, 'Not Found')
+        if self._tokens is not None and token not in self._tokens:
+            return _error_response(401, 'Unauthorized')
+        self._bots[token] = bot
+        return bot
+
+    async def _parse_method(self, method_type: Type[TelegramMethod[Any]], request: web.Request) -> TelegramMethod[Any]:
+        fields: Dict[str, str] = {}
+        files: Dict[str, InputFile] = {}
+        form = await request.post()
+        for name, value in form.items():
+            if isinstance(value, web.FileField):
+                files[name] = BufferedInputFile(value.file.read(), filename=value.filename)
+            else:
+                fields[name] = str(value)
+        return build_method(method_type, fields, files)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        try:
+            method_type = self._method_types[request.match_info['method'].lower()]
+        except KeyError:
+            return _error_response(404, 'Not Found')
+
+        bot = self._get_bot(request.match_info['token'])
+        if isinstance(bot, web.Response):
+            return bot
+        try:
+            method = await self._parse_method(method_type, request)
+        except (ValidationError, ValueError) as e:
+            return _error_response(400, f'Bad Request: {e}')
+
+        try:
+            result = await self._session(bot, method)
+        except TelegramRetryAfter as e:
+            return _error_response(429, e.message, {'retry_after': e.retry_after})
+        except TelegramAPIError as e:
+            return _error_response(400, e.message)
+        except (KeyError, ValueError) as e:
+            return _error_response(400, f'Bad Request: {e}')
+        return web.json_response({'ok': True, 'result': to_jsonable(result)})
+
+    async def handle_file(self, request: web.Request) -> web.StreamResponse:
+        bot = self._get_bot(request.match_info['token'])
+        if isinstance(bot, web.Response):
+            return bot
+
+        # the path has the same layout as in api.file_url, so the session resolves it like for in-process downloads
+        chunks = self._session.stream_content(
+            request.path,
+            timeout=FILE_TIMEOUT,
+            chunk_size=FILE_CHUNK_SIZE,
+            raise_for_status=True,
+        )
+        try:
+            first_chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            first_chunk = b''
+        except (KeyError, ValueError):
+            return _error_response(404, 'Not Found')
+
+        response = web.StreamResponse()
+        await response.prepare(request)
+        await response.write(first_chunk)
+        async for chunk in chunks:
+            await response.write(chunk)
+        await response.write_eof()
+        return response
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        app.router.add_route('GET', '/file/bot{token}/{path:.*}', self.handle_file)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> TelegramAPIServer:
+        if self._runner is not None:
+            raise RuntimeError('Server is already started')
+
+        runner = web.AppRunner(self.create_app())
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        self._runner = runner
+        # port 0 means that the port is chosen by OS
+        bound_host, bound_port = runner.addresses[0][:2]
+        self._api = TelegramAPIServer.from_base(f'http://{bound_host}:{bound_port}')
+        return self._api
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+            self._api = None
+
+    @property
+    def api(self) -> TelegramAPIServer:
+        if self._api is None:
+            raise RuntimeError('Server is not started')
+        return self._api
+
+
+@asynccontextmanager
+async def serve_bot_api(bot: Bot, host: str = '127.0.0.1', port: int = 0) -> AsyncIterator[BotAPIServer]:
+    # the mocked session of the bot moves behind the local server, the bot talks to it through a real session
+    mocked_session = bot.session
+    server = BotAPIServer(mocked_session, tokens=(bot.token,))
+    api = await server.start(host, port)
+    bot.session = AiohttpSession(api=api)
+    try:
+        yield server
+    finally:
+        await bot.session.close()
+        bot.session = mocked_session
+        await server.close()
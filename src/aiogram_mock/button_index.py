@@ -0,0 +1,157 @@
+import bisect
+import itertools
+import operator
+import weakref
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from aiogram import MagicFilter
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
+from magic_filter.operations import CallOperation, ComparatorOperation, GetAttributeOperation
+
+
+class ButtonIndex:
+    def __init__(self, buttons: Sequence[InlineKeyboardButton]):
+        self._buttons = tuple(buttons)
+        self._by_text: Dict[str, List[InlineKeyboardButton]] = {}
+        self._by_callback_data: Dict[str, List[InlineKeyboardButton]] = {}
+        for button in self._buttons:
+            self._by_text.setdefault(button.text, []).append(button)
+            if button.callback_data is not None:
+                self._by_callback_data.setdefault(button.callback_data, []).append(button)
+        self._sorted_callback_data = sorted(self._by_callback_data)
+
+    @classmethod
+    def from_markup(cls, markup: InlineKeyboardMarkup) -> 'ButtonIndex':
+        return cls(list(itertools.chain.from_iterable(markup.inline_keyboard)))
+
+    @classmethod
+    def from_message(cls, message: Message) -> Optional['ButtonIndex']:
+        if isinstance(message.reply_markup, InlineKeyboardMarkup):
+            return cls.from_markup(message.reply_markup)
+        return None
+
+    @property
+    def buttons(self) -> Sequence[InlineKeyboardButton]:
+        return self._buttons
+
+    @property
+    def callback_data(self) -> Sequence[str]:
+        return self._sorted_callback_data
+
+    def with_text(self, text: str) -> Sequence[InlineKeyboardButton]:
+        return self._by_text.get(text, ())
+
+    def with_callback_data(self, callback_data: str) -> Sequence[InlineKeyboardButton]:
+        return self._by_callback_data.get(callback_data, ())
+
+    def with_callback_data_prefix(self, prefix: str) -> Sequence[InlineKeyboardButton]:
+        start = bisect.bisect_left(self._sorted_callback_data, prefix)
+        result: List[InlineKeyboardButton] = []
+        for callback_data in itertools.islice(self._sorted_callback_data, start, None):
+            if not callback_data.startswith(prefix):
+                break
+            result.extend(self._by_callback_data[callback_data])
+        return result
+
+
+class ButtonSelector(ABC):
+    @abstractmethod
+    def select(self, index: ButtonIndex) -> Sequence[InlineKeyboardButton]:
+        ...
+
+
+@dataclass(frozen=True)
+class ByText(ButtonSelector):
+    text: str
+
+    def select(self, index: ButtonIndex) -> Sequence[InlineKeyboardButton]:
+        return index.with_text(self.text)
+
+
+@dataclass(frozen=True)
+class ByCallbackData(ButtonSelector):
+    callback_data: str
+
+    def select(self, index: ButtonIndex) -> Sequence[InlineKeyboardButton]:
+        return index.with_callback_data(self.callback_data)
+
+
+@dataclass(frozen=True)
+class ByCallbackDataPrefix(ButtonSelector):
+    prefix: str
+
+    def select(self, index: ButtonIndex) -> Sequence[InlineKeyboardButton]:
+        return index.with_callback_data_prefix(self.prefix)
+
+
+@dataclass(frozen=True)
+class ByPredicate(ButtonSelector):
+    predicate: Callable[[InlineKeyboardButton], Any]
+
+    def select(self, index: ButtonIndex) -> Sequence[InlineKeyboardButton]:
+        return [button for button in index.buttons if self.predicate(button)]
+
+
+ButtonSelectorLike = Union[Callable[[InlineKeyboardButton], Any], MagicFilter, ButtonSelector]
+
+_EQUALITY_SELECTORS: Dict[str, Callable[[str], ButtonSelector]] = {
+    'text': ByText,
+    'callback_data': ByCallbackData,
+}
+
+
+def _compile_magic_filter(magic_filter: MagicFilter) -> ButtonSelector:
+    operations: Tuple[Any, ...] = magic_filter._operations
+    # F.text == '...' and F.callback_data == '...'
+    if (
+        len(operations) == 2
+        and isinstance(operations[0], GetAttributeOperation)
+        and operations[0].name in _EQUALITY_SELECTORS
+        and isinstance(operations[1], ComparatorOperation)
+        and operations[1].comparator is operator.eq
+        and isinstance(operations[1].right, str)
+    ):
+        return _EQUALITY_SELECTORS[operations[0].name](operations[1].right)
+    # F.callback_data.startswith('...')
+    if (
+        len(operations) == 3
+        and isinstance(operations[0], GetAttributeOperation)
+        and operations[0].name == 'callback_data'
+        and isinstance(operations[1], GetAttributeOperation)
+        and operations[1].name == 'startswith'
+        and isinstance(operations[2], CallOperation)
+        and len(operations[2].args) == 1
+        and isinstance(operations[2].args[0], str)
+        and not operations[2].kwargs
+    ):
+        return ByCallbackDataPrefix(operations[2].args[0])
+    return ByPredicate(magic_filter.resolve)
+
+
+# MagicFilter is unhashable, so compiled selectors are cached by id while the filter is alive
+_compiled_magic_filters: Dict[int, Tuple['weakref.ref[MagicFilter]', ButtonSelector]] = {}
+
+
+def compile_selector(selector: ButtonSelectorLike) -> ButtonSelector:
+    if isinstance(selector, ButtonSelector):
+        return selector
+    if not isinstance(selector, MagicFilter):
+        return ByPredicate(selector)
+
+    key = id(selector)
+    try:
+        ref, compiled = _compiled_magic_filters[key]
+    except KeyError:
+        pass
+    else:
+        if ref() is selector:
+            return compiled
+
+    compiled = _compile_magic_filter(selector)
+    _compiled_magic_filters[key] = (
+        weakref.ref(selector, lambda _: _compiled_magic_filters.pop(key, None)),
+        compiled,
+    )
+    return compiled
@@ -0,0 +1,254 @@
+import bisect
+import copy
+import math
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union, cast, overload
+
+from aiogram.types import Message
+
+from aiogram_mock.button_index import ButtonIndex
+from aiogram_mock.message_index import MessageIndex, MessageQuery
+from aiogram_mock.retention import CompactMessage, EvictedError, compact_message
+
+
+class ChatHistory(Sequence[Message]):
+    _SORTED_CANDIDATES_LIMIT = 64
+
+    def __init__(
+        self,
+        messages: Iterable[Message] = (),
+        max_depth: Optional[int] = None,
+        compact_depth: int = 0,
+    ):
+        self._slots: List[Optional[Message]] = []
+        self._positions: Dict[int, int] = {}
+        self._index = MessageIndex()
+        self._buttons: Dict[int, ButtonIndex] = {}
+        self._head = 0  # number of leading tombstones
+        self._tombstones: List[int] = []  # sorted positions of tombstones between head and the last slot
+        self._live_count = 0
+        self._next_message_id = 0
+        # slots, positions and indexes can be shared with forks, they are copied before the first mutation
+        self._owned = True
+
+        self._max_depth = max_depth
+        self._evicted: Deque[CompactMessage] = deque(maxlen=compact_depth)
+        # sorted disjoint inclusive ranges of evicted ids, deleted messages are not included
+        self._evicted_ranges: List[Tuple[int, int]] = []
+        for message in messages:
+            self.append(message)
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    @overload
+    def __getitem__(self, index: int) -> Message:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[Message]:
+        ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Message, Sequence[Message]]:
+        if isinstance(index, slice):
+            return [cast(Message, self._slots[self._position(i)]) for i in range(self._live_count)[index]]
+        if index < 0:
+            index += self._live_count
+        if not 0 <= index < self._live_count:
+            raise IndexError('chat history index out of range')
+        return cast(Message, self._slots[self._position(index)])
+
+    def _position(self, index: int) -> int:
+        # leading tombstones are skipped by offset, interior ones are counted by binary search without mutation.
+        # The k-th interior tombstone has tombstones[k] - head - k live messages before it
+        low, high = 0, len(self._tombstones)
+        while low < high:
+            middle = (low + high) // 2
+            if self._tombstones[middle] - self._head - middle <= index:
+                low = middle + 1
+            else:
+                high = middle
+        return self._head + index + low
+
+    def __iter__(self) -> Iterator[Message]:
+        for message in self._slots:
+            if message is not None:
+                yield message
+
+    def __reversed__(self) -> Iterator[Message]:
+        for message in reversed(self._slots):
+            if message is not None:
+                yield message
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({list(self)!r})'
+
+    def __eq__(self, other: object) -> bool:
+        # history is compared like the list of messages it used to be
+        if not isinstance(other, Sequence) or isinstance(other, (str, bytes)):
+            return NotImplemented
+        return len(self) == len(other) and all(left == right for left, right in zip(self, other))
+
+    @property
+    def last(self) -> Message:
+        # trailing tombstones are dropped on deletion, so the last slot is always alive
+        if not self._slots:
+            raise IndexError('chat history is empty')
+        return cast(Message, self._slots[-1])
+
+    @property
+    def next_message_id(self) -> int:
+        return self._next_message_id
+
+    def allocate_message_id(self) -> int:
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return message_id
+
+    @property
+    def evicted(self) -> Sequence[CompactMessage]:
+        return tuple(self._evicted)
+
+    def fork(self) -> 'ChatHistory':
+        forked = copy.copy(self)
+        forked._evicted = copy.copy(self._evicted)
+        forked._owned = False
+        self._owned = False
+        return forked
+
+    def _own(self) -> None:
+        if not self._owned:
+            self._slots = list(self._slots)
+            self._positions = dict(self._positions)
+            self._index = self._index.copy()
+            self._buttons = dict(self._buttons)
+            self._tombstones = list(self._tombstones)
+            self._evicted_ranges = list(self._evicted_ranges)
+            self._owned = True
+
+    def has_message_id(self, message_id: int) -> bool:
+        return message_id in self._positions
+
+    def get(self, message_id: int) -> Message:
+        try:
+            position = self._positions[message_id]
+        except KeyError:
+            if self._is_evicted(message_id):
+                compact = next((record for record in self._evicted if record.message_id == message_id), None)
+                raise EvictedError(
+                    f'message {message_id} was evicted from chat history by retention policy',
+                    compact=compact,
+                ) from None
+            raise
+        return cast(Message, self._slots[position])
+
+    def _sorted_by_position(self, message_ids: Iterable[int]) -> List[Message]:
+        positions = sorted(self._positions[message_id] for message_id in message_ids)
+        return [cast(Message, self._slots[position]) for position in positions]
+
+    def find(self, query: MessageQuery) -> List[Message]:
+        candidates = self._index.candidates(query)
+        if candidates is None:
+            return [message for message in self if query.matches(message)]
+        return [message for message in self._sorted_by_position(candidates) if query.matches(message)]
+
+    def find_last(self, query: MessageQuery) -> Optional[Message]:
+        candidates = self._index.candidates(query)
+        if candidates is None:
+            return next((message for message in reversed(self) if query.matches(message)), None)
+        if len(candidates) > self._SORTED_CANDIDATES_LIMIT:
+            # recent messages are the most likely to match, walking from the end is cheaper than sorting
+            messages: Iterable[Message] = (message for message in reversed(self) if message.message_id in candidates)
+        else:
+            messages = reversed(self._sorted_by_position(candidates))
+        return next((message for message in messages if query.matches(message)), None)
+
+    def button_index(self, message_id: int) -> Optional[ButtonIndex]:
+        return self._buttons.get(message_id)
+
+    def _set_button_index(self, message: Message, button_index: Optional[ButtonIndex]) -> None:
+        if button_index is None:
+            button_index = ButtonIndex.from_message(message)
+        if button_index is None:
+            self._buttons.pop(message.message_id, None)
+        else:
+            self._buttons[message.message_id] = button_index
+
+    def append(self, message: Message, button_index: Optional[ButtonIndex] = None) -> None:
+        if message.message_id in self._positions:
+            raise ValueError('message.message_id duplication')
+
+        self._own()
+        self._set_button_index(message, button_index)
+        self._positions[message.message_id] = len(self._slots)
+        self._slots.append(message)
+        self._index.add(message)
+        self._live_count += 1
+        self._next_message_id = max(self._next_message_id, message.message_id + 1)
+        if self._max_depth is not None and self._live_count > self._max_depth:
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        message = cast(Message, self._slots[self._head])
+        self.delete(message.message_id)
+        if self._evicted.maxlen:
+            self._evicted.append(compact_message(message))
+        self._mark_evicted(message.message_id)
+
+    def _is_evicted(self, message_id: int) -> bool:
+        position = bisect.bisect_right(self._evicted_ranges, (message_id, math.inf))
+        return position > 0 and self._evicted_ranges[position - 1][1] >= message_id
+
+    def _mark_evicted(self, message_id: int) -> None:
+        ranges = self._evicted_ranges
+        position = bisect.bisect_left(ranges, (message_id,))
+        start = end = message_id
+        if position > 0 and ranges[position - 1][1] + 1 == message_id:
+            position -= 1
+            start = ranges.pop(position)[0]
+        if position < len(ranges) and ranges[position][0] - 1 == message_id:
+            end = ranges.pop(position)[1]
+        ranges.insert(position, (start, end))
+        # deletions between evictions split ranges, the oldest range is forgotten to keep memory bounded.
+        # Merging ranges would report deleted messages as evicted, forgotten ones are reported as missing
+        if self._max_depth is not None and len(ranges) > self._max_depth:
+            del ranges[0]
+
+    def replace(self, message: Message, button_index: Optional[ButtonIndex] = None) -> None:
+        self._own()
+        self._set_button_index(message, button_index)
+        position = self._positions[message.message_id]
+        self._index.remove(cast(Message, self._slots[position]))
+        self._index.add(message)
+        self._slots[position] = message
+
+    def delete(self, message_id: int) -> None:
+        self._own()
+        position = self._positions.pop(message_id)
+        self._buttons.pop(message_id, None)
+        self._index.remove(cast(Message, self._slots[position]))
+        self._slots[position] = None
+        self._live_count -= 1
+        bisect.insort(self._tombstones, position)
+        while self._head < len(self._slots) and self._slots[self._head] is None:
+            self._head += 1
+        while self._slots and self._slots[-1] is None:
+            self._slots.pop()
+        self._head = min(self._head, len(self._slots))
+        # leading and trailing tombstones are not interior anymore
+        del self._tombstones[bisect.bisect_left(self._tombstones, len(self._slots)):]
+        del self._tombstones[:bisect.bisect_left(self._tombstones, self._head)]
+        # compaction is amortized by deletions, reads never mutate the history
+        if len(self._slots) > 2 * self._live_count:
+            self._compact()
+
+    def _compact(self) -> None:
+        # index and buttons are not rebuilt, so they have to be detached from forks too
+        self._own()
+        self._slots = [message for message in self._slots if message is not None]
+        self._positions = {
+            cast(Message, message).message_id: position
+            for position, message in enumerate(self._slots)
+        }
+        self._head = 0
+        self._tombstones = []
@@ -0,0 +1,118 @@
+import asyncio
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional, Set, cast
+
+# loop iterations advance() waits for ready callbacks before it assumes that a task never settles
+MAX_READY_ITERATIONS = 10_000
+
+
+class Clock(ABC):
+    @abstractmethod
+    def now(self) -> datetime:
+        ...
+
+
+class SystemClock(Clock):
+    def now(self) -> datetime:
+        return datetime.utcnow()
+
+
+class VirtualClock(Clock):
+    def __init__(self, start: Optional[datetime] = None, max_ready_iterations: int = MAX_READY_ITERATIONS):
+        if max_ready_iterations <= 0:
+            raise ValueError('max_ready_iterations must be positive')
+        self._max_ready_iterations = max_ready_iterations
+        self._start = datetime.utcnow().replace(microsecond=0) if start is None else start
+        self._offset = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_base = 0.0
+        self._executor_futures: Set['asyncio.Future[Any]'] = set()
+
+    def now(self) -> datetime:
+        return self._start + timedelta(seconds=self._offset)
+
+    @property
+    def elapsed(self) -> float:
+        return self._offset
+
+    def attach(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        if loop is None:
+            loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._loop is not None:
+            self.detach()
+        # timers and ready callbacks are read from internals of the default asyncio loop, e.g. uvloop has none of them
+        missing = [name for name in ('_scheduled', '_ready') if not hasattr(loop, name)]
+        if missing:
+            raise TypeError(f'VirtualClock supports only the default asyncio event loop, {type(loop)} has no {missing}')
+
+        # loop time is frozen and moves only by advance(), so timers fire when virtual time reaches them
+        self._loop_base = loop.time()
+        self._loop = loop
+        loop.time = self._loop_time  # type: ignore[method-assign]
+        # aiogram runs sync filters and handlers in the executor, advance() waits for them like for ready callbacks
+        run_in_executor = loop.run_in_executor
+
+        def tracked_run_in_executor(executor: Any, func: Callable[..., Any], *args: Any) -> 'asyncio.Future[Any]':
+            future = run_in_executor(executor, func, *args)
+            self._executor_futures.add(future)
+            future.add_done_callback(self._executor_futures.discard)
+            return future
+
+        loop.run_in_executor = tracked_run_in_executor  # type: ignore[method-assign]
+
+    def detach(self) -> None:
+        if self._loop is None:
+            return
+        del self._loop.time  # type: ignore[method-assign]
+        del self._loop.run_in_executor  # type: ignore[method-assign]
+        self._executor_futures.clear()
+        self._loop = None
+
+    def _loop_time(self) -> float:
+        return self._loop_base + self._offset
+
+    def _next_timer_offset(self) -> Optional[float]:
+        # asyncio keeps pending timers in a private heap, cancelled ones are removed lazily
+        scheduled = cast(Any, self._loop)._scheduled
+        deadlines = [handle.when() for handle in scheduled if not handle.cancelled()]
+        if not deadlines:
+            return None
+        return min(deadlines) - self._loop_base
+
+    async def _run_ready(self) -> None:
+        iterations = 0
+        while True:
+            await asyncio.sleep(0)
+            while cast(Any, self._loop)._ready:
+                # a task that reschedules itself by sleep(0) keeps the ready queue non-empty forever
+                iterations += 1
+                if iterations > self._max_ready_iterations:
+                    raise RuntimeError(
+                        f'Event loop has not settled after {self._max_ready_iterations} iterations, '
+                        f'some task probably loops with asyncio.sleep(0)',
+                    )
+                await asyncio.sleep(0)
+            if not self._executor_futures:
+                return
+            # executor futures are resolved by other threads, waiting for them needs no timers
+            await asyncio.wait(list(self._executor_futures))
+
+    async def advance(self, seconds: float) -> None:
+        if seconds < 0:
+            raise ValueError('Virtual time can not go backwards')
+
+        self.attach()
+        target = self._offset + seconds
+        await self._run_ready()
+        while True:
+            deadline = self._next_timer_offset()
+            if deadline is None or deadline > target:
+                break
+            self._offset = max(self._offset, deadline)
+            await self._run_ready()
+
+        self._offset = target
+        await self._run_ready()
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import mmap
+import os
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, Optional, Union
+from weakref import WeakKeyDictionary
+
+from aiogram.types import InputFile
+
+from aiogram_mock.memory_stats import StructureStats
+
+
+@dataclass(frozen=True)
+class ContentInfo:
+    digest: str
+    size: int
+
+
+class ContentStore:
+    def __init__(
+        self,
+        max_memory_size: int = 0,
+        spill_dir: Union[str, Path, None] = None,
+        hash_name: str = 'sha256',
+    ):
+        if max_memory_size < 0:
+            raise ValueError('max_memory_size must be non-negative')
+
+        self._max_memory_size = max_memory_size
+        self._spill_dir = None if spill_dir is None else Path(spill_dir)
+        self._hash_name = hash_name
+
+        self._in_memory: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._memory_size = 0
+        self._on_disk: Dict[str, Path] = {}
+        # the same InputFile object is usually sent to many chats, its content is read only once
+        self._known_files: 'WeakKeyDictionary[InputFile, ContentInfo]' = WeakKeyDictionary()
+        self._pending_files: 'Dict[InputFile, asyncio.Future[ContentInfo]]' = {}
+
+    @property
+    def memory_size(self) -> int:
+        return self._memory_size
+
+    @property
+    def retains_content(self) -> bool:
+        return self._max_memory_size > 0 or self._spill_dir is not None
+
+    def memory_stats(self) -> StructureStats:
+        # content on disk is not counted, it does not take memory
+        return StructureStats(len(self._in_memory) + len(self._on_disk), self._memory_size)
+
+    def __contains__(self, digest: object) -> bool:
+        return digest in self._in_memory or digest in self._on_disk
+
+    async def put(self, input_file: InputFile) -> ContentInfo:
+        content_info = self._known_files.get(input_file)
+        if content_info is not None and (content_info.digest in self or not self.retains_content):
+            self._touch(content_info.digest)
+            return content_info
+
+        # concurrent uploads of one file, e.g. by a broadcast, wait for the single read
+        pending = self._pending_files.get(input_file)
+        if pending is None:
+            pending = self._pending_files[input_file] = asyncio.ensure_future(self._read(input_file))
+            pending.add_done_callback(lambda _: self._pending_files.pop(input_file, None))
+        content_info = await asyncio.shield(pending)
+        self._known_files[input_file] = content_info
+        return content_info
+
+    async def _read(self, input_file: InputFile) -> ContentInfo:
+        hasher = hashlib.new(self._hash_name)
+        size = 0
+        chunks: List[bytes] = []
+        spill_file: Optional[IO[bytes]] = None
+        try:
+            async for chunk in input_file:
+                hasher.update(chunk)
+                size += len(chunk)
+                if spill_file is not None:
+                    spill_file.write(chunk)
+                elif self.retains_content:
+                    chunks.append(chunk)
+                    if size > self._max_memory_size and self._spill_dir is not None:
+                        # content does not fit into memory, rest of it is streamed directly to disk
+                        spill_file = self._create_spill_file()
+                        spill_file.writelines(chunks)
+                        chunks.clear()
+                    elif size > self._max_memory_size:
+                        chunks.clear()
+        except BaseException:
+            if spill_file is not None:
+                spill_file.close()
+                os.unlink(spill_file.name)
+            raise
+
+        digest = hasher.hexdigest()
+        if spill_file is not None:
+            spill_file.close()
+            self._keep_on_disk(digest, Path(spill_file.name))
+        elif chunks or (size == 0 and self.retains_content):
+            self._keep_in_memory(digest, b''.join(chunks))
+        else:
+            self._touch(digest)
+        return ContentInfo(digest=digest, size=size)
+
+    def iter_chunks(self, digest: str, chunk_size: int) -> Iterator[memoryview]:
+        # chunks are views of the retained content, on-disk content is memory-mapped instead of being read
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive')
+
+        if digest in self._in_memory:
+            self._touch(digest)
+            view = memoryview(self._in_memory[digest])
+            for start in range(0, len(view), chunk_size):
+                yield view[start:start + chunk_size]
+            return
+
+        try:
+            path = self._on_disk[digest]
+        except KeyError:
+            raise KeyError(f'Content {digest} is not retained') from None
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        try:
+            for start in range(0, len(view), chunk_size):
+                yield view[start:start + chunk_size]
+        finally:
+            view.release()
+            try:
+                mapped.close()
+            except BufferError:  # some chunks are still referenced, the mapping is closed with the last of them
+                pass
+
+    def _create_spill_file(self) -> IO[bytes]:
+        assert self._spill_dir is not None
+        self._spill_dir.mkdir(parents=True, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=self._spill_dir, prefix='.upload-', delete=False)
+
+    def _touch(self, digest: str) -> None:
+        if digest in self._in_memory:
+            self._in_memory.move_to_end(digest)
+
+    def _keep_on_disk(self, digest: str, temp_path: Path) -> None:
+        if digest in self:
+            os.unlink(temp_path)
+            self._touch(digest)
+            return
+
+        assert self._spill_dir is not None
+        path = self._spill_dir / digest
+        os.replace(temp_path, path)
+        self._on_disk[digest] = path
+
+    def _keep_in_memory(self, digest: str, content: bytes) -> None:
+        if digest in self:
+            self._touch(digest)
+            return
+
+        self._in_memory[digest] = content
+        self._memory_size += len(content)
+        while self._memory_size > self._max_memory_size:
+            self._evict()
+
+    def _evict(self) -> None:
+        digest, content = self._in_memory.popitem(last=False)
+        self._memory_size -= len(content)
+        if self._spill_dir is not None:
+            self._spill_dir.mkdir(parents=True, exist_ok=True)
+            path = self._spill_dir / digest
+            path.write_bytes(content)
+            self._on_disk[digest] = path
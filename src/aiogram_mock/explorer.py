@@ -0,0 +1,332 @@
+import asyncio
+import copy
+import hashlib
+import json
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message, ReplyKeyboardMarkup, User
+
+from aiogram_mock.button_index import ButtonIndex, ButtonSelector
+from aiogram_mock.facade_factory import BotAndDispatcherFactory, create_private_chat
+from aiogram_mock.mocked_session import MockedSession
+from aiogram_mock.tg_control import PrivateChatTgControl, TgControl
+from aiogram_mock.tg_state import TgState
+from aiogram_mock.transcript import to_jsonable
+
+TEXT_ACTION = 'text'
+CALLBACK_ACTION = 'callback'
+
+
+class ExplorerAction(NamedTuple):
+    kind: str  # TEXT_ACTION or CALLBACK_ACTION
+    value: str
+
+
+class StateNode(NamedTuple):
+    fingerprint: str
+    path: Tuple[ExplorerAction, ...]  # shortest known sequence of actions leading to the state
+    text: Optional[str]
+    fsm_state: Optional[str]
+
+
+class Transition(NamedTuple):
+    source: str
+    action: ExplorerAction
+    target: str
+
+
+class ExplorerError(NamedTuple):
+    source: str
+    action: ExplorerAction
+    error: str  # exceptions are formatted, so graphs can be sent between processes
+
+
+@dataclass
+class StateGraph:
+    nodes: Dict[str, StateNode] = field(default_factory=dict)
+    transitions: List[Transition] = field(default_factory=list)
+    errors: List[ExplorerError] = field(default_factory=list)
+
+    def merge(self, other: 'StateGraph') -> None:
+        for fingerprint, node in other.nodes.items():
+            known = self.nodes.get(fingerprint)
+            if known is None or len(node.path) < len(known.path):
+                self.nodes[fingerprint] = node
+
+        seen_transitions = {(transition.source, transition.action) for transition in self.transitions}
+        for transition in other.transitions:
+            if (transition.source, transition.action) not in seen_transitions:
+                seen_transitions.add((transition.source, transition.action))
+                self.transitions.append(transition)
+
+        seen_errors = {(error.source, error.action) for error in self.errors}
+        for error in other.errors:
+            if (error.source, error.action) not in seen_errors:
+                seen_errors.add((error.source, error.action))
+                self.errors.append(error)
+
+    def to_dot(self) -> str:
+        lines = ['digraph states {']
+        for node in self.nodes.values():
+            lines.append(f'  "{node.fingerprint[:12]}" [label={json.dumps(node.text or "")}];')
+        for transition in self.transitions:
+            lines.append(
+                f'  "{transition.source[:12]}" -> "{transition.target[:12]}"'
+                f' [label={json.dumps(transition.action.value)}];',
+            )
+        for error in self.errors:
+            lines.append(f'  "{error.source[:12]}" -> "error" [label={json.dumps(error.action.value)}, color=red];')
+        lines.append('}')
+        return '\n'.join(lines)
+
+
+class _FirstWithCallbackData(ButtonSelector):
+    # buttons with the same callback data are indistinguishable for the bot
+    def __init__(self, callback_data: str):
+        self._callback_data = callback_data
+
+    def select(self, index: ButtonIndex) -> Sequence[InlineKeyboardButton]:
+        return index.with_callback_data(self._callback_data)[:1]
+
+
+class _Snapshot(NamedTuple):
+    tg_state: TgState
+    fsm_state: Optional[str]
+    fsm_data: Dict[str, Any]
+
+
+def _last_bot_message(messages: Sequence[Message], with_inline_keyboard: bool = False) -> Optional[Message]:
+    for message in reversed(messages):
+        if message.from_user is None or not message.from_user.is_bot:
+            continue
+        if not with_inline_keyboard or isinstance(message.reply_markup, InlineKeyboardMarkup):
+            return message
+    return None
+
+
+def _fingerprint(
+    message: Optional[Message],
+    keyboard_message: Optional[Message],
+    reply_markup: Any,
+    fsm_state: Optional[str],
+) -> str:
+    # hash of python objects is salted per process, fingerprints have to match between processes
+    screen = {
+        'text': None if message is None else message.text or message.caption,
+        'inline_keyboard': None if keyboard_message is None else to_jsonable(keyboard_message.reply_markup),
+        'reply_keyboard': to_jsonable(reply_markup),
+        'fsm_state': fsm_state,
+    }
+    return hashlib.sha1(json.dumps(screen, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def _screen_actions(button_index: Optional[ButtonIndex], reply_markup: Any) -> List[ExplorerAction]:
+    actions: List[ExplorerAction] = []
+    if button_index is not None:
+        actions.extend(ExplorerAction(CALLBACK_ACTION, callback_data) for callback_data in button_index.callback_data)
+    if isinstance(reply_markup, ReplyKeyboardMarkup):
+        # buttons requesting contact, location and so on send no text
+        actions.extend(
+            ExplorerAction(TEXT_ACTION, button.text)
+            for row in reply_markup.keyboard
+            for button in row
+            if not any(value for name, value in button if name != 'text')
+        )
+    return list(dict.fromkeys(actions))
+
+
+class _Worker:
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, bot_id: int, user: User):
+        # every worker has its own bot id, so FSM records of workers do not collide in the shared storage
+        bot_user = User(id=bot_id, is_bot=True, first_name='Explorer', username=f'explorer_{bot_id}_bot')
+        chat = create_private_chat(user)
+        self._tg_state = TgState([chat])
+        worker_bot = Bot(
+            token=f'{bot_id}:{bot.token.partition(":")[2]}',
+            session=MockedSession(self._tg_state, bot_user),
+            parse_mode=bot.parse_mode,
+        )
+        self._control = PrivateChatTgControl(
+            tg_control=TgControl(dispatcher=dispatcher, bot=worker_bot, tg_state=self._tg_state),
+            chat=chat,
+            user=user,
+        )
+
+    async def perform(self, action: ExplorerAction) -> None:
+        if action.kind == TEXT_ACTION:
+            await self._control.send(action.value)
+        elif action.kind == CALLBACK_ACTION:
+            # the bot can send a message with a reply keyboard after the one with inline keyboard
+            message = _last_bot_message(self._control.messages, with_inline_keyboard=True)
+            if message is None:
+                raise ValueError('There is no message to click')
+            await self._control.click(_FirstWithCallbackData(action.value), message)
+        else:
+            raise ValueError(f'Unknown action kind {action.kind}')
+
+    async def capture(self, path: Tuple[ExplorerAction, ...]) -> Tuple[StateNode, _Snapshot, List[ExplorerAction]]:
+        message = _last_bot_message(self._control.messages)
+        keyboard_message = _last_bot_message(self._control.messages, with_inline_keyboard=True)
+        reply_markup = self._control.user_state.reply_markup
+        context = self._control.state()
+        fsm_state = await context.get_state()
+        fsm_data = copy.deepcopy(await context.get_data())
+
+        node = StateNode(
+            fingerprint=_fingerprint(message, keyboard_message, reply_markup, fsm_state),
+            path=path,
+            text=None if message is None else message.text or message.caption,
+            fsm_state=fsm_state,
+        )
+        button_index = None if keyboard_message is None else self._tg_state.button_index(keyboard_message)
+        return node, _Snapshot(self._tg_state.fork(), fsm_state, fsm_data), _screen_actions(button_index, reply_markup)
+
+    async def restore(self, snapshot: _Snapshot) -> None:
+        self._tg_state.restore(snapshot.tg_state)
+        context = self._control.state()
+        await context.set_state(snapshot.fsm_state)
+        await context.set_data(copy.deepcopy(snapshot.fsm_data))
+
+
+class StateExplorer:
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        start_texts: Sequence[str] = ('/start',),
+        concurrency: int = 8,
+        max_states: int = 1000,
+        max_depth: Optional[int] = None,
+        user: Optional[User] = None,
+    ):
+        if concurrency < 1:
+            raise ValueError('concurrency must be positive')
+
+        self._dispatcher = dispatcher
+        self._bot = bot
+        self._start_texts = start_texts
+        self._concurrency = concurrency
+        self._max_states = max_states
+        self._max_depth = max_depth
+        if user is None:
+            user = User(id=103592704, first_name='Linus', last_name='Torvalds', is_bot=False)
+        self._user = user
+
+    def _can_expand(self, node: StateNode) -> bool:
+        return self._max_depth is None or len(node.path) < self._max_depth
+
+    async def _expand(
+        self,
+        worker: _Worker,
+        graph: StateGraph,
+        snapshots: Dict[str, _Snapshot],
+        queue: 'asyncio.Queue[Tuple[StateNode, ExplorerAction]]',
+        source: StateNode,
+        action: ExplorerAction,
+    ) -> None:
+        try:
+            await worker.restore(snapshots[source.fingerprint])
+            await worker.perform(action)
+            node, snapshot, actions = await worker.capture(source.path + (action,))
+        except Exception as e:
+            # a failed step must not stop the worker, otherwise the queue is never joined
+            graph.errors.append(ExplorerError(source.fingerprint, action, f'{type(e).__name__}: {e}'))
+            return
+
+        # states are deduplicated synchronously after the last await, so workers never expand one state twice
+        if node.fingerprint in graph.nodes:
+            graph.transitions.append(Transition(source.fingerprint, action, node.fingerprint))
+            return
+        if len(graph.nodes) >= self._max_states:
+            return  # transitions lead only to states of the graph
+        graph.transitions.append(Transition(source.fingerprint, action, node.fingerprint))
+        graph.nodes[node.fingerprint] = node
+        snapshots[node.fingerprint] = snapshot
+        if self._can_expand(node):
+            for next_action in actions:
+                queue.put_nowait((node, next_action))
+
+    async def _run_worker(
+        self,
+        worker: _Worker,
+        graph: StateGraph,
+        snapshots: Dict[str, _Snapshot],
+        queue: 'asyncio.Queue[Tuple[StateNode, ExplorerAction]]',
+    ) -> None:
+        while True:
+            source, action = await queue.get()
+            try:
+                await self._expand(worker, graph, snapshots, queue, source, action)
+            finally:
+                queue.task_done()
+
+    async def explore(self, start_path: Sequence[ExplorerAction] = ()) -> StateGraph:
+        # branches run concurrently on workers with isolated TgState, states are moved between them by snapshots
+        workers = [
+            _Worker(self._dispatcher, self._bot, self._bot.id + worker_id, self._user)
+            for worker_id in range(self._concurrency)
+        ]
+        path = tuple(start_path)
+        for action in path:
+            await workers[0].perform(action)
+
+        graph = StateGraph()
+        root, root_snapshot, actions = await workers[0].capture(path)
+        graph.nodes[root.fingerprint] = root
+        snapshots = {root.fingerprint: root_snapshot}
+        if not path:
+            actions = [ExplorerAction(TEXT_ACTION, text) for text in self._start_texts] + actions
+
+        queue: 'asyncio.Queue[Tuple[StateNode, ExplorerAction]]' = asyncio.Queue()
+        if self._can_expand(root):
+            for action in actions:
+                queue.put_nowait((root, action))
+
+        tasks = [asyncio.ensure_future(self._run_worker(worker, graph, snapshots, queue)) for worker in workers]
+        try:
+            await queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return graph
+
+
+def _explore_subtree(
+    factory: BotAndDispatcherFactory,
+    start_path: Sequence[ExplorerAction],
+    options: Dict[str, Any],
+) -> StateGraph:
+    bot, dispatcher = factory()
+    return asyncio.run(StateExplorer(dispatcher, bot, **options).explore(start_path))
+
+
+async def explore_in_processes(
+    factory: BotAndDispatcherFactory,
+    executor: Executor,
+    start_texts: Sequence[str] = ('/start',),
+    concurrency: int = 8,
+    max_states: int = 1000,
+    max_depth: Optional[int] = None,
+) -> StateGraph:
+    # factory must be picklable, e.g. a module level function, every process builds its own bot and dispatcher.
+    # The first level is explored here, then subtrees are explored by processes with their own deduplication
+    # and merged, states reachable from several subtrees are visited by each of them.
+    bot, dispatcher = factory()
+    graph = await StateExplorer(dispatcher, bot, start_texts, concurrency, max_states, max_depth=1).explore()
+    if max_depth is not None and max_depth <= 1:
+        return graph
+
+    options = {'concurrency': concurrency, 'max_states': max_states, 'max_depth': max_depth}
+    loop = asyncio.get_running_loop()
+    subtrees = [
+        loop.run_in_executor(executor, _explore_subtree, factory, node.path, options)
+        for node in list(graph.nodes.values())
+        if len(node.path) == 1
+    ]
+    for subtree in asyncio.as_completed(subtrees):
+        graph.merge(await subtree)
+    return graph
@@ -1,14 +1,78 @@
 from contextlib import contextmanager
-from typing import Callable, Generator, Iterable, Optional
+from typing import Callable, Generator, Iterable, Optional, Tuple
 from unittest.mock import patch
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.session.base import BaseSession
 from aiogram.types import Chat, User
 
+from aiogram_mock.instrumentation import Instrumentation
 from aiogram_mock.mocked_session import MockedSession
-from aiogram_mock.tg_control import PrivateChatTgControl, TgControl
+from aiogram_mock.tg_control import GroupChatTgControl, PrivateChatTgControl, TgControl
 from aiogram_mock.tg_state import TgState
+from aiogram_mock.transport import FeedTransport, UpdateTransportFactory
+
+# builds bot and dispatcher once per test session or worker process, process pools need a picklable one
+BotAndDispatcherFactory = Callable[[], Tuple[Bot, Dispatcher]]
+
+
+@contextmanager
+def _instrumented(
+    instrumentation: Optional[Instrumentation],
+    dispatcher: Dispatcher,
+    session: BaseSession,
+) -> Generator[None, None, None]:
+    if instrumentation is None:
+        yield
+        return
+
+    instrumentation.attach(dispatcher=dispatcher, session=session)
+    try:
+        yield
+    finally:
+        instrumentation.detach(dispatcher=dispatcher, session=session)
+
+
+def create_private_chat(user: User) -> Chat:
+    return Chat(
+        id=user.id,
+        type='private',
+        username=user.username,
+        first_name=user.first_name,
+        last_name=user.last_name,
+    )
+
+
+def _default_bot_user() -> User:
+    return User(
+        id=738453453,
+        first_name='Test',
+        last_name='bot',
+        username='test_bot',
+        is_bot=True,
+    )
+
+
+@contextmanager
+def _tg_control(
+    dispatcher: Dispatcher,
+    bot: Bot,
+    chat: Chat,
+    bot_user: User,
+    tg_state_factory: Callable[[Iterable[Chat]], TgState],
+    mocked_session_factory: Callable[[TgState, User], BaseSession],
+    instrumentation: Optional[Instrumentation],
+    transport_factory: UpdateTransportFactory,
+) -> Generator[TgControl, None, None]:
+    tg_state = tg_state_factory([chat])
+    session = mocked_session_factory(tg_state, bot_user)
+    with patch.object(bot, 'session', session), _instrumented(instrumentation, dispatcher, session):
+        yield TgControl(
+            dispatcher=dispatcher,
+            bot=bot,
+            tg_state=tg_state,
+            transport_factory=transport_factory,
+        )
 
 
 @contextmanager
@@ -19,6 +83,8 @@ def private_chat_tg_control(
     bot_user: Optional[User] = None,
     tg_state_factory: Callable[[Iterable[Chat]], TgState] = TgState,
     mocked_session_factory: Callable[[TgState, User], BaseSession] = MockedSession,
+    instrumentation: Optional[Instrumentation] = None,
+    transport_factory: UpdateTransportFactory = FeedTransport,
 ) -> Generator[PrivateChatTgControl, None, None]:
     if target_user is None:
         target_user = User(
@@ -28,31 +94,43 @@ def private_chat_tg_control(
             is_bot=False,
         )
     if bot_user is None:
-        bot_user = User(
-            id=738453453,
-            first_name='Test',
-            last_name='bot',
-            username='test_bot',
-            is_bot=True,
-        )
-
-    chat = Chat(
-        id=target_user.id,
-        type='private',
-        username=target_user.username,
-        first_name=target_user.first_name,
-        last_name=target_user.last_name,
-    )
+        bot_user = _default_bot_user()
 
-    tg_state = tg_state_factory([chat])
-    session = mocked_session_factory(tg_state, bot_user)
-    with patch.object(bot, 'session', session):
+    chat = create_private_chat(target_user)
+    with _tg_control(
+        dispatcher, bot, chat, bot_user, tg_state_factory, mocked_session_factory, instrumentation, transport_factory,
+    ) as tg_control:
         yield PrivateChatTgControl(
-            tg_control=TgControl(
-                dispatcher=dispatcher,
-                bot=bot,
-                tg_state=tg_state,
-            ),
+            tg_control=tg_control,
             chat=chat,
             user=target_user,
         )
+
+
+@contextmanager
+def group_chat_tg_control(
+    dispatcher: Dispatcher,
+    bot: Bot,
+    chat: Optional[Chat] = None,
+    bot_user: Optional[User] = None,
+    tg_state_factory: Callable[[Iterable[Chat]], TgState] = TgState,
+    mocked_session_factory: Callable[[TgState, User], BaseSession] = MockedSession,
+    instrumentation: Optional[Instrumentation] = None,
+    transport_factory: UpdateTransportFactory = FeedTransport,
+) -> Generator[GroupChatTgControl, None, None]:
+    if chat is None:
+        chat = Chat(
+            id=-1001234567890,
+            type='supergroup',
+            title='Test group',
+        )
+    if bot_user is None:
+        bot_user = _default_bot_user()
+
+    with _tg_control(
+        dispatcher, bot, chat, bot_user, tg_state_factory, mocked_session_factory, instrumentation, transport_factory,
+    ) as tg_control:
+        yield GroupChatTgControl(
+            tg_control=tg_control,
+            chat=chat,
+        )
@@ -0,0 +1,146 @@
+import asyncio
+import math
+import random
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Counter, Dict, Hashable, List, Mapping, Optional, Tuple, Type
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat
+
+from aiogram_mock.clock import Clock
+
+LatencyDistribution = Callable[[random.Random], float]
+
+
+def constant_latency(seconds: float) -> LatencyDistribution:
+    return lambda rnd: seconds
+
+
+def uniform_latency(low: float, high: float) -> LatencyDistribution:
+    return lambda rnd: rnd.uniform(low, high)
+
+
+def lognormal_latency(median: float, sigma: float) -> LatencyDistribution:
+    return lambda rnd: rnd.lognormvariate(math.log(median), sigma)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    rate: float  # tokens per second
+    burst: float
+
+
+TELEGRAM_BOT_LIMIT = RateLimit(rate=30, burst=30)
+TELEGRAM_CHAT_LIMIT = RateLimit(rate=1, burst=3)
+TELEGRAM_GROUP_LIMIT = RateLimit(rate=20 / 60, burst=20)
+
+
+class TokenBucket:
+    def __init__(self, limit: RateLimit, now: datetime):
+        self._limit = limit
+        self._tokens = limit.burst
+        self._updated_at = now
+
+    def _refill(self, now: datetime) -> None:
+        elapsed = (now - self._updated_at).total_seconds()
+        if elapsed > 0:
+            self._tokens = min(self._limit.burst, self._tokens + elapsed * self._limit.rate)
+            self._updated_at = now
+
+    def wait_time(self, now: datetime) -> float:
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self._limit.rate
+
+    def consume(self) -> None:
+        self._tokens -= 1
+
+
+@dataclass
+class FloodControlStats:
+    delivered: Counter[str] = field(default_factory=Counter)
+    throttled: Counter[str] = field(default_factory=Counter)
+    total_latency: float = 0.0
+
+    @property
+    def delivered_total(self) -> int:
+        return sum(self.delivered.values())
+
+    @property
+    def throttled_total(self) -> int:
+        return sum(self.throttled.values())
+
+
+class FloodControl:
+    def __init__(
+        self,
+        bot_limit: Optional[RateLimit] = TELEGRAM_BOT_LIMIT,
+        chat_limit: Optional[RateLimit] = TELEGRAM_CHAT_LIMIT,
+        group_limit: Optional[RateLimit] = TELEGRAM_GROUP_LIMIT,
+        latencies: Mapping[Type[TelegramMethod[Any]], LatencyDistribution] = {},
+        default_latency: Optional[LatencyDistribution] = None,
+        seed: Optional[int] = None,
+    ):
+        self._bot_limit = bot_limit
+        self._chat_limit = chat_limit
+        self._group_limit = group_limit
+        self._latencies = latencies
+        self._default_latency = default_latency
+        self._random = random.Random(seed)
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._stats = FloodControlStats()
+
+    @property
+    def stats(self) -> FloodControlStats:
+        return self._stats
+
+    def _bucket(self, key: Hashable, limit: RateLimit, now: datetime) -> TokenBucket:
+        try:
+            return self._buckets[key]
+        except KeyError:
+            bucket = self._buckets[key] = TokenBucket(limit, now)
+            return bucket
+
+    def _limited_buckets(self, bot_id: int, chat: Optional[Chat], now: datetime) -> List[TokenBucket]:
+        # only methods addressed to a chat are counted, like messages in Telegram limits
+        if chat is None:
+            return []
+
+        limits: List[Tuple[Hashable, Optional[RateLimit]]] = [
+            (('bot', bot_id), self._bot_limit),
+            (('chat', bot_id, chat.id), self._chat_limit),
+        ]
+        if chat.type in ('group', 'supergroup'):
+            limits.append((('group', bot_id, chat.id), self._group_limit))
+        return [self._bucket(key, limit, now) for key, limit in limits if limit is not None]
+
+    def _sample_latency(self, method: TelegramMethod[Any]) -> float:
+        distribution = self._latencies.get(type(method), self._default_latency)
+        if distribution is None:
+            return 0.0
+        return max(0.0, distribution(self._random))
+
+    async def acquire(self, bot_id: int, method: TelegramMethod[Any], chat: Optional[Chat], clock: Clock) -> None:
+        latency = self._sample_latency(method)
+        if latency:
+            self._stats.total_latency += latency
+            await asyncio.sleep(latency)
+
+        now = clock.now()
+        buckets = self._limited_buckets(bot_id, chat, now)
+        wait_time = max((bucket.wait_time(now) for bucket in buckets), default=0.0)
+        method_name = type(method).__name__
+        if wait_time > 0:
+            self._stats.throttled[method_name] += 1
+            raise TelegramRetryAfter(
+                method=method,
+                message=f'Too Many Requests: retry after {math.ceil(wait_time)}',
+                retry_after=math.ceil(wait_time),
+            )
+
+        for bucket in buckets:
+            bucket.consume()
+        self._stats.delivered[method_name] += 1
@@ -0,0 +1,286 @@
+import inspect
+import math
+import time
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncContextManager, Awaitable, Callable, Counter, DefaultDict, Dict, List, Optional, TypeVar
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+T = TypeVar('T')
+
+
+class Histogram:
+    def __init__(self) -> None:
+        self._samples: List[float] = []
+        self._is_sorted = True
+        self._total = 0.0
+
+    def record(self, value: float) -> None:
+        if self._samples and value < self._samples[-1]:
+            self._is_sorted = False
+        self._samples.append(value)
+        self._total += value
+
+    @property
+    def count(self) -> int:
+        return len(self._samples)
+
+    @property
+    def total(self) -> float:
+        return self._total
+
+    @property
+    def mean(self) -> float:
+        if not self._samples:
+            return 0.0
+        return self._total / len(self._samples)
+
+    @property
+    def max(self) -> float:
+        return self.percentile(100)
+
+    def percentile(self, q: float) -> float:
+        if not 0 <= q <= 100:
+            raise ValueError('percentile must be in range [0, 100]')
+        if not self._samples:
+            return 0.0
+        if not self._is_sorted:
+            self._samples.sort()
+            self._is_sorted = True
+        # nearest-rank method
+        rank = max(1, math.ceil(q / 100 * len(self._samples)))
+        return self._samples[rank - 1]
+
+    @property
+    def p50(self) -> float:
+        return self.percentile(50)
+
+    @property
+    def p95(self) -> float:
+        return self.percentile(95)
+
+    @property
+    def p99(self) -> float:
+        return self.percentile(99)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(count={self.count}, p50={self.p50}, p95={self.p95}, p99={self.p99})'
+
+
+@dataclass
+class RequestContext:
+    bot: Bot
+    method: TelegramMethod[Any]
+    result: Any = None
+    exception: Optional[BaseException] = None
+    elapsed: float = 0.0
+
+
+@dataclass
+class UpdateContext:
+    bot: Optional[Bot]
+    update: Update
+    result: Any = None
+    exception: Optional[BaseException] = None
+    elapsed: float = 0.0
+    requests: int = 0
+    handlers: List[str] = field(default_factory=list)
+
+
+@dataclass
+class HandlerStats:
+    calls: int = 0
+    latency: Histogram = field(default_factory=Histogram)
+    requests: Histogram = field(default_factory=Histogram)
+
+
+@dataclass
+class _HandlerCall:
+    requests: int = 0
+
+
+RequestHook = Callable[[RequestContext], AsyncContextManager[None]]
+UpdateHook = Callable[[UpdateContext], AsyncContextManager[None]]
+
+_current_update: ContextVar[Optional[UpdateContext]] = ContextVar('aiogram_mock_current_update', default=None)
+_current_handler_call: ContextVar[Optional[_HandlerCall]] = ContextVar(
+    'aiogram_mock_current_handler_call',
+    default=None,
+)
+
+
+def get_handler_name(handler: HandlerObject) -> str:
+    callback = inspect.unwrap(handler.callback)
+    module = getattr(callback, '__module__', None)
+    qualname = getattr(callback, '__qualname__', None) or repr(callback)
+    return qualname if module is None else f'{module}.{qualname}'
+
+
+async def _run_hooked(
+    hooks: List[Callable[[Any], AsyncContextManager[None]]],
+    context: Any,
+    call: Callable[[], Awaitable[T]],
+) -> T:
+    async with AsyncExitStack() as stack:
+        for hook in hooks:
+            await stack.enter_async_context(hook(context))
+
+        started_at = time.perf_counter()
+        try:
+            context.result = await call()
+        except BaseException as e:
+            context.exception = e
+            raise
+        finally:
+            context.elapsed = time.perf_counter() - started_at
+    return context.result
+
+
+class _RequestMiddleware(BaseRequestMiddleware):
+    def __init__(self, instrumentation: 'Instrumentation'):
+        self._instrumentation = instrumentation
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        return await self._instrumentation.wrap_request(make_request, bot, method)
+
+
+class _UpdateMiddleware(BaseMiddleware):
+    def __init__(self, instrumentation: 'Instrumentation'):
+        self._instrumentation = instrumentation
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+        return await self._instrumentation.wrap_update(handler, event, data)
+
+
+class _HandlerMiddleware(BaseMiddleware):
+    def __init__(self, instrumentation: 'Instrumentation'):
+        self._instrumentation = instrumentation
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        return await self._instrumentation.wrap_handler(handler, event, data)
+
+
+class Instrumentation:
+    def __init__(self) -> None:
+        self.method_counts: Counter[str] = Counter()
+        self.request_latency: DefaultDict[str, Histogram] = defaultdict(Histogram)
+        self.update_latency = Histogram()
+        self.update_requests = Histogram()
+        self.handlers: DefaultDict[str, HandlerStats] = defaultdict(HandlerStats)
+
+        self._request_hooks: List[RequestHook] = []
+        self._update_hooks: List[UpdateHook] = []
+        self._request_middleware = _RequestMiddleware(self)
+        self._update_middleware = _UpdateMiddleware(self)
+        self._handler_middleware = _HandlerMiddleware(self)
+
+    def add_request_hook(self, hook: RequestHook) -> None:
+        self._request_hooks.append(hook)
+
+    def add_update_hook(self, hook: UpdateHook) -> None:
+        self._update_hooks.append(hook)
+
+    def attach(self, dispatcher: Optional[Dispatcher] = None, session: Optional[BaseSession] = None) -> None:
+        if session is not None and self._request_middleware not in session.middleware:
+            session.middleware.register(self._request_middleware)
+        if dispatcher is not None and self._update_middleware not in dispatcher.update.outer_middleware:
+            dispatcher.update.outer_middleware.register(self._update_middleware)
+            # inner middlewares of the root router wrap handlers of all nested routers
+            for event_name, observer in dispatcher.observers.items():
+                if event_name != 'update':
+                    observer.middleware.register(self._handler_middleware)
+
+    def detach(self, dispatcher: Optional[Dispatcher] = None, session: Optional[BaseSession] = None) -> None:
+        if session is not None and self._request_middleware in session.middleware:
+            session.middleware.unregister(self._request_middleware)
+        if dispatcher is not None and self._update_middleware in dispatcher.update.outer_middleware:
+            dispatcher.update.outer_middleware.unregister(self._update_middleware)
+            for event_name, observer in dispatcher.observers.items():
+                if event_name != 'update':
+                    observer.middleware.unregister(self._handler_middleware)
+
+    async def wrap_request(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        method_name = type(method).__name__
+        self.method_counts[method_name] += 1
+        update_context = _current_update.get()
+        if update_context is not None:
+            update_context.requests += 1
+        handler_call = _current_handler_call.get()
+        if handler_call is not None:
+            handler_call.requests += 1
+
+        context = RequestContext(bot=bot, method=method)
+        try:
+            return await _run_hooked(self._request_hooks, context, lambda: make_request(bot, method))
+        finally:
+            self.request_latency[method_name].record(context.elapsed)
+
+    async def wrap_update(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        update: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        context = UpdateContext(bot=data.get('bot'), update=update)
+        token = _current_update.set(context)
+        try:
+            return await _run_hooked(self._update_hooks, context, lambda: handler(update, data))
+        finally:
+            _current_update.reset(token)
+            self.update_latency.record(context.elapsed)
+            self.update_requests.record(context.requests)
+
+    async def wrap_handler(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        name = get_handler_name(data['handler'])
+        update_context = _current_update.get()
+        if update_context is not None:
+            update_context.handlers.append(name)
+
+        handler_call = _HandlerCall()
+        token = _current_handler_call.set(handler_call)
+        started_at = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            _current_handler_call.reset(token)
+            stats = self.handlers[name]
+            stats.calls += 1
+            stats.latency.record(time.perf_counter() - started_at)
+            stats.requests.record(handler_call.requests)
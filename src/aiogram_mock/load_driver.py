@@ -0,0 +1,90 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+from aiogram.types import User
+
+from aiogram_mock.facade_factory import create_private_chat
+from aiogram_mock.tg_control import PrivateChatTgControl, TgControl
+
+LoadStep = Callable[[], Awaitable[Any]]
+LoadScenario = Callable[[PrivateChatTgControl], Awaitable[Any]]
+
+
+@dataclass(frozen=True)
+class LoadReport:
+    chats: int
+    steps: int
+    updates: int
+    elapsed: float
+    errors: Sequence[BaseException]
+
+    @property
+    def updates_per_second(self) -> float:
+        if self.elapsed == 0:
+            return 0.0
+        return self.updates / self.elapsed
+
+
+class LoadDriver:
+    def __init__(self, tg_control: TgControl, concurrency: int = 100):
+        if concurrency < 1:
+            raise ValueError('concurrency must be positive')
+
+        self._tg_control = tg_control
+        self._concurrency = concurrency
+        self._chat_steps: Dict[int, List[LoadStep]] = {}
+
+    def private_chat(self, user: User) -> PrivateChatTgControl:
+        tg_state = self._tg_control.tg_state
+        if user.id in tg_state.chats:
+            chat = tg_state.chats[user.id]
+        else:
+            chat = create_private_chat(user)
+            tg_state.add_chat(chat)
+        return PrivateChatTgControl(tg_control=self._tg_control, chat=chat, user=user)
+
+    def schedule(self, chat_id: int, step: LoadStep) -> None:
+        self._chat_steps.setdefault(chat_id, []).append(step)
+
+    def schedule_scenario(self, user: User, scenario: LoadScenario) -> None:
+        control = self.private_chat(user)
+        self.schedule(control.chat.id, lambda: scenario(control))
+
+    async def _run_chat(
+        self,
+        steps: Sequence[LoadStep],
+        semaphore: asyncio.Semaphore,
+        errors: List[BaseException],
+    ) -> int:
+        # steps of one chat are executed strictly one after another, the rest of a chat is skipped after failure
+        for executed, step in enumerate(steps, start=1):
+            async with semaphore:
+                try:
+                    await step()
+                except Exception as e:
+                    errors.append(e)
+                    return executed
+        return len(steps)
+
+    async def run(self) -> LoadReport:
+        chat_steps, self._chat_steps = self._chat_steps, {}
+        semaphore = asyncio.Semaphore(self._concurrency)
+        errors: List[BaseException] = []
+        tg_state = self._tg_control.tg_state
+
+        first_update_id = tg_state.last_update_id
+        started_at = time.perf_counter()
+        executed = await asyncio.gather(
+            *(self._run_chat(steps, semaphore, errors) for steps in chat_steps.values()),
+        )
+        elapsed = time.perf_counter() - started_at
+
+        return LoadReport(
+            chats=len(chat_steps),
+            steps=sum(executed),
+            updates=tg_state.last_update_id - first_update_id,
+            elapsed=elapsed,
+            errors=errors,
+        )
@@ -0,0 +1,106 @@
+import asyncio
+import gc
+import sys
+import tracemalloc
+from collections import Counter
+from contextlib import asynccontextmanager
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType, TracebackType
+from typing import Any, AsyncIterator, List, NamedTuple, Optional, Set, Tuple, Type
+
+from aiogram_mock.instrumentation import Instrumentation, UpdateContext
+
+# shared by everything and not retained by the structures, also they lead to the whole heap
+_OPAQUE_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType, asyncio.AbstractEventLoop)
+
+
+class StructureStats(NamedTuple):
+    entries: int
+    size: int  # approximate retained bytes
+
+
+def deep_size(value: Any, seen: Optional[Set[int]] = None) -> int:
+    # objects that are already in seen are not counted, so one set shared by several calls counts shared objects once
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = [value]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _OPAQUE_TYPES):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return size
+
+
+class UpdateAllocation(NamedTuple):
+    update_id: int
+    handlers: Tuple[str, ...]
+    growth: int  # bytes allocated during the update that are still alive after it
+    top: Tuple[str, ...]  # source lines with the largest growth, if top_lines is set
+
+
+class AllocationTracker:
+    def __init__(self, top_lines: int = 0):
+        self._top_lines = top_lines
+        self._started_tracing = False
+        self.updates: List[UpdateAllocation] = []
+        self.growth_by_handler: Counter[str] = Counter()
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self) -> None:
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def _top(self, before: tracemalloc.Snapshot) -> Tuple[str, ...]:
+        after = self._take_snapshot()
+        return tuple(str(stat) for stat in after.compare_to(before, 'lineno')[:self._top_lines])
+
+    @asynccontextmanager
+    async def _update_hook(self, context: UpdateContext) -> AsyncIterator[None]:
+        # traced memory is process wide, so growth of concurrently processed updates is mixed
+        if not tracemalloc.is_tracing():
+            yield
+            return
+
+        before_snapshot = self._take_snapshot() if self._top_lines else None
+        before, _ = tracemalloc.get_traced_memory()
+        try:
+            yield
+        finally:
+            growth = tracemalloc.get_traced_memory()[0] - before
+            handlers = tuple(context.handlers)
+            self.updates.append(
+                UpdateAllocation(
+                    update_id=context.update.update_id,
+                    handlers=handlers,
+                    growth=growth,
+                    top=() if before_snapshot is None else self._top(before_snapshot),
+                ),
+            )
+            for handler in handlers:
+                self.growth_by_handler[handler] += growth
+
+    def attach(self, instrumentation: Instrumentation) -> None:
+        instrumentation.add_update_hook(self._update_hook)
+
+    def __enter__(self) -> 'AllocationTracker':
+        self.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.stop()
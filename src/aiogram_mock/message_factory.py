@@ -0,0 +1,37 @@
+from typing import Any, Dict, Set
+
+from aiogram.types import Message
+
+# every optional field of Message defaults to None, required fields are always passed by the mock
+_MESSAGE_TEMPLATE: Dict[str, Any] = {name: field.get_default() for name, field in Message.__fields__.items()}
+
+
+def _construct_message(base: Dict[str, Any], fields: Dict[str, Any], fields_set: Set[str]) -> Message:
+    message_dict = dict(base)  # keeps field order of validated messages
+    message_dict.update(fields)
+    message = Message.__new__(Message)
+    object.__setattr__(message, '__dict__', message_dict)
+    object.__setattr__(message, '__fields_set__', fields_set)
+    return message
+
+
+class MessageFactory:
+    def __init__(self, trusted: bool = False):
+        # trusted mode skips validation, so fields must be passed by name and be already validated objects
+        self._trusted = trusted
+
+    @property
+    def trusted(self) -> bool:
+        return self._trusted
+
+    def create(self, **fields: Any) -> Message:
+        if not self._trusted:
+            return Message(**fields)
+        return _construct_message(_MESSAGE_TEMPLATE, fields, set(fields))
+
+    def update(self, message: Message, **fields: Any) -> Message:
+        if not self._trusted:
+            return message.copy(update=fields)
+        if all(getattr(message, name) is value for name, value in fields.items()):
+            return message  # messages are immutable, so an unchanged message can be shared
+        return _construct_message(message.__dict__, fields, message.__fields_set__ | fields.keys())
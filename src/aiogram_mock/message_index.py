@@ -0,0 +1,122 @@
+import itertools
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Pattern, Set, TypeVar, Union
+
+from aiogram.types import InlineKeyboardMarkup, Message
+
+K = TypeVar('K')
+
+
+def get_sender_id(message: Message) -> Optional[int]:
+    return None if message.from_user is None else message.from_user.id
+
+
+def get_callback_data(message: Message) -> Iterable[str]:
+    if not isinstance(message.reply_markup, InlineKeyboardMarkup):
+        return ()
+    buttons = itertools.chain.from_iterable(message.reply_markup.inline_keyboard)
+    return {button.callback_data for button in buttons if button.callback_data is not None}
+
+
+def get_reply_to_message_id(message: Message) -> Optional[int]:
+    return None if message.reply_to_message is None else message.reply_to_message.message_id
+
+
+@dataclass(frozen=True)
+class MessageQuery:
+    from_user_id: Optional[int] = None
+    text: Optional[str] = None
+    pattern: Union[str, Pattern[str], None] = None
+    has_reply_markup: Optional[bool] = None
+    callback_data: Optional[str] = None
+    reply_to_message_id: Optional[int] = None
+
+    def matches(self, message: Message) -> bool:
+        if self.from_user_id is not None and get_sender_id(message) != self.from_user_id:
+            return False
+        if self.text is not None and message.text != self.text:
+            return False
+        if self.pattern is not None and (message.text is None or re.search(self.pattern, message.text) is None):
+            return False
+        if self.has_reply_markup is not None and (message.reply_markup is not None) != self.has_reply_markup:
+            return False
+        if self.callback_data is not None and self.callback_data not in get_callback_data(message):
+            return False
+        if self.reply_to_message_id is not None and get_reply_to_message_id(message) != self.reply_to_message_id:
+            return False
+        return True
+
+
+class MessageIndex:
+    def __init__(self) -> None:
+        self._by_sender: Dict[Optional[int], Set[int]] = {}
+        self._by_text: Dict[str, Set[int]] = {}
+        self._by_callback_data: Dict[str, Set[int]] = {}
+        self._by_reply_to: Dict[int, Set[int]] = {}
+        self._with_reply_markup: Set[int] = set()
+
+    def copy(self) -> 'MessageIndex':
+        index = MessageIndex()
+        index._by_sender = {key: set(ids) for key, ids in self._by_sender.items()}
+        index._by_text = {key: set(ids) for key, ids in self._by_text.items()}
+        index._by_callback_data = {key: set(ids) for key, ids in self._by_callback_data.items()}
+        index._by_reply_to = {key: set(ids) for key, ids in self._by_reply_to.items()}
+        index._with_reply_markup = set(self._with_reply_markup)
+        return index
+
+    @staticmethod
+    def _link(mapping: Dict[K, Set[int]], key: K, message_id: int) -> None:
+        try:
+            mapping[key].add(message_id)
+        except KeyError:
+            mapping[key] = {message_id}
+
+    @staticmethod
+    def _unlink(mapping: Dict[K, Set[int]], key: K, message_id: int) -> None:
+        ids = mapping[key]
+        ids.discard(message_id)
+        if not ids:
+            del mapping[key]
+
+    def add(self, message: Message) -> None:
+        message_id = message.message_id
+        self._link(self._by_sender, get_sender_id(message), message_id)
+        if message.text is not None:
+            self._link(self._by_text, message.text, message_id)
+        for callback_data in get_callback_data(message):
+            self._link(self._by_callback_data, callback_data, message_id)
+        reply_to_message_id = get_reply_to_message_id(message)
+        if reply_to_message_id is not None:
+            self._link(self._by_reply_to, reply_to_message_id, message_id)
+        if message.reply_markup is not None:
+            self._with_reply_markup.add(message_id)
+
+    def remove(self, message: Message) -> None:
+        message_id = message.message_id
+        self._unlink(self._by_sender, get_sender_id(message), message_id)
+        if message.text is not None:
+            self._unlink(self._by_text, message.text, message_id)
+        for callback_data in get_callback_data(message):
+            self._unlink(self._by_callback_data, callback_data, message_id)
+        reply_to_message_id = get_reply_to_message_id(message)
+        if reply_to_message_id is not None:
+            self._unlink(self._by_reply_to, reply_to_message_id, message_id)
+        self._with_reply_markup.discard(message_id)
+
+    def candidates(self, query: MessageQuery) -> Optional[Set[int]]:
+        # the smallest set of ids that can match the query, None means that no criterion is indexed
+        sets: List[Set[int]] = []
+        if query.from_user_id is not None:
+            sets.append(self._by_sender.get(query.from_user_id, set()))
+        if query.text is not None:
+            sets.append(self._by_text.get(query.text, set()))
+        if query.callback_data is not None:
+            sets.append(self._by_callback_data.get(query.callback_data, set()))
+        if query.reply_to_message_id is not None:
+            sets.append(self._by_reply_to.get(query.reply_to_message_id, set()))
+        if query.has_reply_markup:
+            sets.append(self._with_reply_markup)
+        if not sets:
+            return None
+        return min(sets, key=len)
@@ -1,46 +1,136 @@
-from datetime import datetime
-from typing import Any, AsyncGenerator, List, Mapping, Optional, Sequence, Type, Union
+import asyncio
+from typing import Any, AsyncGenerator, Dict, FrozenSet, List, Mapping, Optional, Sequence, Type, Union
 
 from aiogram import Bot
 from aiogram.client.session.base import BaseSession
 from aiogram.methods import (
     AnswerCallbackQuery,
+    AnswerInlineQuery,
     EditMessageReplyMarkup,
     EditMessageText,
+    GetFile,
+    GetMe,
+    GetUpdates,
+    SendAudio,
+    SendDocument,
+    SendMediaGroup,
     SendMessage,
     SendPhoto,
+    SendVideo,
     SetChatMenuButton,
     TelegramMethod,
 )
 from aiogram.methods.base import TelegramType
-from aiogram.types import UNSET, InlineKeyboardMarkup, Message, ReplyKeyboardRemove, User
+from aiogram.types import (
+    UNSET,
+    Audio,
+    Chat,
+    Document,
+    File,
+    ForceReply,
+    InlineKeyboardMarkup,
+    InputMediaAudio,
+    InputMediaVideo,
+    Message,
+    ReplyKeyboardMarkup,
+    ReplyKeyboardRemove,
+    Update,
+    User,
+    Video,
+)
 
+from aiogram_mock.flood_control import FloodControl
+from aiogram_mock.memory_stats import StructureStats, deep_size
+from aiogram_mock.retention import CompactMethod, MethodLog
 from aiogram_mock.tg_state import TgState
 
-SendMessageVariant = Union[SendMessage, SendPhoto]
+SendMessageVariant = Union[SendMessage, SendPhoto, SendDocument, SendVideo, SendAudio]
+SendMediaVariant = Union[SendPhoto, SendDocument, SendVideo, SendAudio]
+MEDIA_GROUP_SIZE_RANGE = (2, 10)
+UNLOGGED_METHODS: FrozenSet[Type[TelegramMethod[Any]]] = frozenset((GetUpdates, GetMe))
+
+
+def _video(document: Document, width: Optional[int], height: Optional[int], duration: Optional[int]) -> Video:
+    # dimensions are not detected from the content, they are taken from the request
+    return Video(
+        file_id=document.file_id,
+        file_unique_id=document.file_unique_id,
+        width=width or 0,
+        height=height or 0,
+        duration=duration or 0,
+        file_name=document.file_name,
+        file_size=document.file_size,
+    )
+
+
+def _audio(document: Document, duration: Optional[int], performer: Optional[str], title: Optional[str]) -> Audio:
+    return Audio(
+        file_id=document.file_id,
+        file_unique_id=document.file_unique_id,
+        duration=duration or 0,
+        performer=performer,
+        title=title,
+        file_name=document.file_name,
+        file_size=document.file_size,
+    )
 
 
 class MockedSession(BaseSession):
-    def __init__(self, tg_state: TgState, bot_user: User):
+    def __init__(self, tg_state: TgState, bot_user: User, flood_control: Optional[FloodControl] = None):
         self._tg_state = tg_state
         self._bot_user = bot_user
-        self._sent_methods: List[TelegramMethod[Any]] = []
+        self._flood_control = flood_control
+        self._sent_methods = MethodLog(
+            depth=tg_state.retention.sent_methods_depth,
+            compact_depth=tg_state.retention.compact_depth,
+        )
         super().__init__()
 
     async def close(self) -> None:
         pass
 
-    def _process_reply_markup(self, chat_id: int, method: SendMessageVariant) -> Optional[InlineKeyboardMarkup]:
+    def _selective_users_ids(self, method: SendMessageVariant, reply_to_message: Optional[Message]) -> List[int]:
+        # mentions by username are not resolved, only text mentions and the sender of the replied message
+        entities = method.entities if isinstance(method, SendMessage) else method.caption_entities
+        users_ids = [
+            entity.user.id
+            for entity in entities or ()
+            if entity.type == 'text_mention' and entity.user is not None
+        ]
+        if reply_to_message is not None and reply_to_message.from_user is not None:
+            users_ids.append(reply_to_message.from_user.id)
+        return users_ids
+
+    def _update_user_state(
+        self,
+        chat_id: int,
+        method: SendMessageVariant,
+        reply_to_message: Optional[Message],
+        reply_markup: Union[ReplyKeyboardMarkup, ForceReply, None],
+    ) -> None:
+        if getattr(method.reply_markup, 'selective', False):
+            users_ids = self._selective_users_ids(method, reply_to_message)
+            if users_ids:
+                self._tg_state.update_selective_user_state(chat_id, users_ids, reply_markup=reply_markup)
+                return
+        self._tg_state.update_chat_user_state(chat_id=chat_id, reply_markup=reply_markup)
+
+    def _process_reply_markup(
+        self,
+        chat_id: int,
+        method: SendMessageVariant,
+        reply_to_message: Optional[Message],
+    ) -> Optional[InlineKeyboardMarkup]:
         if isinstance(method.reply_markup, InlineKeyboardMarkup):
             return method.reply_markup
         elif isinstance(method.reply_markup, ReplyKeyboardRemove):
-            self._tg_state.update_chat_user_state(chat_id=chat_id, reply_markup=None)
+            self._update_user_state(chat_id, method, reply_to_message, None)
             return None
         if method.reply_markup is not None:
-            self._tg_state.update_chat_user_state(chat_id=chat_id, reply_markup=method.reply_markup)
+            self._update_user_state(chat_id, method, reply_to_message, method.reply_markup)
         return None
 
-    def _process_reply(self, chat_id: int, method: SendMessageVariant) -> Optional[Message]:
+    def _process_reply(self, chat_id: int, method: Union[SendMessageVariant, SendMediaGroup]) -> Optional[Message]:
         if method.reply_to_message_id is not None:
             try:
                 return self._tg_state.get_message(chat_id, method.reply_to_message_id)
@@ -51,35 +141,107 @@ class MockedSession(BaseSession):
 
     async def _mock_send_message(self, bot: Bot, method: SendMessage, timeout: Optional[int] = UNSET) -> Message:
         chat_id = int(method.chat_id)
+        reply_to_message = self._process_reply(chat_id, method)
         return self._tg_state.add_message(
-            Message(
-                message_id=self._tg_state.next_message_id(chat_id),
+            self._tg_state.message_factory.create(
+                message_id=self._tg_state.allocate_message_id(chat_id),
                 text=method.text,
                 chat=self._tg_state.chats[chat_id],
-                date=datetime.utcnow(),
+                date=self._tg_state.clock.now(),
                 message_thread_id=method.message_thread_id,
                 from_user=self._bot_user,
-                reply_to_message=self._process_reply(chat_id, method),
-                reply_markup=self._process_reply_markup(chat_id, method),
+                reply_to_message=reply_to_message,
+                reply_markup=self._process_reply_markup(chat_id, method, reply_to_message),
             ),
         )
 
-    async def _mock_send_photo(self, bot: Bot, method: SendPhoto, timeout: Optional[int] = UNSET) -> Message:
+    async def _send_media(self, bot: Bot, method: SendMediaVariant, **media: Any) -> Message:
+        # media is uploaded before message_id is allocated, so ids follow the order of completed uploads
         chat_id = int(method.chat_id)
+        reply_to_message = self._process_reply(chat_id, method)
         return self._tg_state.add_message(
-            Message(
-                message_id=self._tg_state.next_message_id(chat_id),
+            self._tg_state.message_factory.create(
+                message_id=self._tg_state.allocate_message_id(chat_id),
                 text=method.caption,
                 chat=self._tg_state.chats[chat_id],
-                date=datetime.utcnow(),
+                date=self._tg_state.clock.now(),
                 message_thread_id=method.message_thread_id,
                 from_user=self._bot_user,
-                reply_to_message=self._process_reply(chat_id, method),
-                reply_markup=self._process_reply_markup(chat_id, method),
-                document=await self._tg_state.load_file(bot.id, method.photo),
+                reply_to_message=reply_to_message,
+                reply_markup=self._process_reply_markup(chat_id, method, reply_to_message),
+                **media,
             ),
         )
 
+    async def _mock_send_photo(self, bot: Bot, method: SendPhoto, timeout: Optional[int] = UNSET) -> Message:
+        return await self._send_media(bot, method, document=await self._tg_state.load_file(bot.id, method.photo))
+
+    async def _mock_send_document(self, bot: Bot, method: SendDocument, timeout: Optional[int] = UNSET) -> Message:
+        return await self._send_media(bot, method, document=await self._tg_state.load_file(bot.id, method.document))
+
+    async def _mock_send_video(self, bot: Bot, method: SendVideo, timeout: Optional[int] = UNSET) -> Message:
+        document = await self._tg_state.load_file(bot.id, method.video)
+        return await self._send_media(
+            bot,
+            method,
+            video=_video(document, method.width, method.height, method.duration),
+        )
+
+    async def _mock_send_audio(self, bot: Bot, method: SendAudio, timeout: Optional[int] = UNSET) -> Message:
+        document = await self._tg_state.load_file(bot.id, method.audio)
+        return await self._send_media(
+            bot,
+            method,
+            audio=_audio(document, method.duration, method.performer, method.title),
+        )
+
+    async def _mock_send_media_group(
+        self,
+        bot: Bot,
+        method: SendMediaGroup,
+        timeout: Optional[int] = UNSET,
+    ) -> List[Message]:
+        min_size, max_size = MEDIA_GROUP_SIZE_RANGE
+        if not min_size <= len(method.media) <= max_size:
+            raise ValueError(f'Media group must include from {min_size} to {max_size} items')
+
+        chat_id = int(method.chat_id)
+        reply_to_message = self._process_reply(chat_id, method)
+        documents = await asyncio.gather(
+            *(self._tg_state.load_file(bot.id, input_media.media) for input_media in method.media),
+        )
+
+        messages = []
+        media_group_id: Optional[str] = None
+        for input_media, document in zip(method.media, documents):
+            media: Dict[str, Any]
+            if isinstance(input_media, InputMediaVideo):
+                media = {'video': _video(document, input_media.width, input_media.height, input_media.duration)}
+            elif isinstance(input_media, InputMediaAudio):
+                media = {'audio': _audio(document, input_media.duration, input_media.performer, input_media.title)}
+            else:
+                media = {'document': document}
+
+            message_id = self._tg_state.allocate_message_id(chat_id)
+            if media_group_id is None:
+                media_group_id = f'{chat_id}-{message_id}'
+            messages.append(
+                self._tg_state.add_message(
+                    self._tg_state.message_factory.create(
+                        message_id=message_id,
+                        text=input_media.caption,
+                        chat=self._tg_state.chats[chat_id],
+                        date=self._tg_state.clock.now(),
+                        message_thread_id=method.message_thread_id,
+                        media_group_id=media_group_id,
+                        from_user=self._bot_user,
+                        reply_to_message=reply_to_message,
+                        **media,
+                    ),
+                ),
+            )
+        return messages
+
     async def _mock_answer_callback_query(
         self,
         bot: Bot,
@@ -89,6 +251,15 @@ class MockedSession(BaseSession):
         self._tg_state.add_answer_callback_query(method)
         return True
 
+    async def _mock_answer_inline_query(
+        self,
+        bot: Bot,
+        method: AnswerInlineQuery,
+        timeout: Optional[int] = UNSET,
+    ) -> bool:
+        self._tg_state.add_answer_inline_query(method)
+        return True
+
     async def _mock_set_chat_menu_button(
         self,
         bot: Bot,
@@ -109,10 +280,13 @@ class MockedSession(BaseSession):
             raise ValueError('Bad sent message')
 
         message = self._tg_state.get_message(int(method.chat_id), method.message_id)
-        new_message = message.copy(
-            update={'text': method.text, 'reply_markup': method.reply_markup},
+        new_message = self._tg_state.message_factory.update(
+            message,
+            text=method.text,
+            reply_markup=method.reply_markup,
         )
-        self._tg_state.replace_message(new_message)
+        if new_message is not message:
+            self._tg_state.replace_message(new_message)
         return new_message
 
     async def _mock_edit_message_reply_markup(
@@ -127,44 +301,94 @@ class MockedSession(BaseSession):
             raise ValueError('Bad sent message')
 
         message = self._tg_state.get_message(int(method.chat_id), method.message_id)
-        new_message = message.copy(
-            update={'reply_markup': method.reply_markup},
-        )
-        self._tg_state.replace_message(new_message)
+        new_message = self._tg_state.message_factory.update(message, reply_markup=method.reply_markup)
+        if new_message is not message:
+            self._tg_state.replace_message(new_message)
         return new_message
 
+    async def _mock_get_updates(self, bot: Bot, method: GetUpdates, timeout: Optional[int] = UNSET) -> List[Update]:
+        return await self._tg_state.update_queue.get_updates(
+            offset=method.offset,
+            limit=method.limit,
+            timeout=method.timeout,
+        )
+
+    async def _mock_get_me(self, bot: Bot, method: GetMe, timeout: Optional[int] = UNSET) -> User:
+        return self._bot_user
+
+    async def _mock_get_file(self, bot: Bot, method: GetFile, timeout: Optional[int] = UNSET) -> File:
+        return self._tg_state.get_file(bot.id, method)
+
     METHOD_MOCKS: Mapping[Type[TelegramMethod[Any]], str] = {
         SendMessage: _mock_send_message.__name__,
         SendPhoto: _mock_send_photo.__name__,
+        SendDocument: _mock_send_document.__name__,
+        SendVideo: _mock_send_video.__name__,
+        SendAudio: _mock_send_audio.__name__,
+        SendMediaGroup: _mock_send_media_group.__name__,
         AnswerCallbackQuery: _mock_answer_callback_query.__name__,
+        AnswerInlineQuery: _mock_answer_inline_query.__name__,
         SetChatMenuButton: _mock_set_chat_menu_button.__name__,
         EditMessageText: _mock_edit_message_text.__name__,
         EditMessageReplyMarkup: _mock_edit_message_reply_markup.__name__,
+        GetUpdates: _mock_get_updates.__name__,
+        GetMe: _mock_get_me.__name__,
+        GetFile: _mock_get_file.__name__,
     }
 
+    def _method_chat(self, method: TelegramMethod[Any]) -> Optional[Chat]:
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None:
+            return None
+        try:
+            return self._tg_state.chats[int(chat_id)]
+        except (KeyError, ValueError):
+            return None
+
     async def make_request(
         self,
         bot: Bot,
         method: TelegramMethod[TelegramType],
         timeout: Optional[int] = UNSET,
     ) -> TelegramType:
-        self._sent_methods.append(method)
-        try:
-            method_mock_attr = self.METHOD_MOCKS[type(method)]
-        except KeyError:
-            raise TypeError(f'Method mock for type {type(method)} is not implemented') from None
+        method_mock_attr = self.METHOD_MOCKS.get(type(method))
+        if method_mock_attr is not None and self._flood_control is not None:
+            await self._flood_control.acquire(bot.id, method, self._method_chat(method), self._tg_state.clock)
+
+        # calls rejected by flood control are not delivered, so they are not logged as sent.
+        # Polling repeats GetUpdates and GetMe endlessly, they would push out the methods sent by handlers
+        if type(method) not in UNLOGGED_METHODS:
+            self._sent_methods.append(method)
+        if method_mock_attr is None:
+            raise TypeError(f'Method mock for type {type(method)} is not implemented')
 
         return await getattr(self, method_mock_attr)(bot, method, timeout)
 
-    def stream_content(
+    async def stream_content(
         self,
         url: str,
         timeout: int,
         chunk_size: int,
         raise_for_status: bool,
     ) -> AsyncGenerator[bytes, None]:
-        raise NotImplementedError
+        # url is built by api.file_url, file_path follows the token
+        _, separator, token_and_path = url.partition('/file/bot')
+        if not separator:
+            raise ValueError(f'{url} is not a file url')
+        _, _, file_path = token_and_path.partition('/')
+        for chunk in self._tg_state.iter_file_content(file_path, chunk_size):
+            yield chunk  # memoryview is accepted by the writers of Bot.download_file
+
+    def memory_stats(self) -> Dict[str, StructureStats]:
+        # uploaded files are retained by sent methods until they are evicted
+        return {
+            'sent_methods': StructureStats(len(self._sent_methods.methods), deep_size(self._sent_methods)),
+        }
 
     @property
     def sent_methods(self) -> Sequence[TelegramMethod[Any]]:
-        return self._sent_methods
+        return self._sent_methods.methods
+
+    @property
+    def evicted_methods(self) -> Sequence[CompactMethod]:
+        return self._sent_methods.evicted
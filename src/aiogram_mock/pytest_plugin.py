@@ -0,0 +1,81 @@
+import importlib
+from typing import Generator, Tuple
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage, SimpleEventIsolation
+
+from aiogram_mock.facade_factory import BotAndDispatcherFactory, group_chat_tg_control, private_chat_tg_control
+from aiogram_mock.tg_control import GroupChatTgControl, PrivateChatTgControl
+
+FACTORY_INI = 'aiogram_mock_factory'
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addini(
+        FACTORY_INI,
+        help='import path of a function that creates bot and dispatcher once per session, e.g. tests.bot:create',
+    )
+
+
+def load_factory(path: str) -> BotAndDispatcherFactory:
+    module_name, separator, attr = path.partition(':')
+    if not separator:
+        raise ValueError(f'{FACTORY_INI} must look like module:function, got {path!r}')
+    factory: BotAndDispatcherFactory = getattr(importlib.import_module(module_name), attr)
+    return factory
+
+
+def reset_fsm(dispatcher: Dispatcher) -> None:
+    # only storages that live in the process can be reset, others have to be cleaned by the tests
+    storage = dispatcher.fsm.storage
+    if not isinstance(storage, MemoryStorage):
+        raise TypeError(f'Reset between tests is supported only for MemoryStorage, got {type(storage)}')
+    storage.storage.clear()
+
+    # locks are bound to the event loop of the test that created them, a new isolation starts without locks
+    if type(dispatcher.fsm.events_isolation) is SimpleEventIsolation:
+        dispatcher.fsm.events_isolation = SimpleEventIsolation()
+
+
+@pytest.fixture(scope='session')
+def aiogram_mock_bot_and_dispatcher(pytestconfig: pytest.Config) -> Tuple[Bot, Dispatcher]:
+    # under pytest-xdist every worker has its own session, so bot and dispatcher are built once per worker
+    path = pytestconfig.getini(FACTORY_INI)
+    if not path:
+        raise pytest.UsageError(
+            f'Set {FACTORY_INI} ini option or override aiogram_mock_bot_and_dispatcher fixture',
+        )
+    return load_factory(path)()
+
+
+@pytest.fixture()
+def aiogram_mock_dispatcher(aiogram_mock_bot_and_dispatcher: Tuple[Bot, Dispatcher]) -> Dispatcher:
+    _, dispatcher = aiogram_mock_bot_and_dispatcher
+    reset_fsm(dispatcher)
+    return dispatcher
+
+
+@pytest.fixture()
+def aiogram_mock_bot(aiogram_mock_bot_and_dispatcher: Tuple[Bot, Dispatcher]) -> Bot:
+    bot, _ = aiogram_mock_bot_and_dispatcher
+    return bot
+
+
+@pytest.fixture()
+def aiogram_mock_tg_control(
+    aiogram_mock_bot: Bot,
+    aiogram_mock_dispatcher: Dispatcher,
+) -> Generator[PrivateChatTgControl, None, None]:
+    # TgState and MockedSession are created for every test, the session of the shared bot is patched
+    with private_chat_tg_control(dispatcher=aiogram_mock_dispatcher, bot=aiogram_mock_bot) as control:
+        yield control
+
+
+@pytest.fixture()
+def aiogram_mock_group_tg_control(
+    aiogram_mock_bot: Bot,
+    aiogram_mock_dispatcher: Dispatcher,
+) -> Generator[GroupChatTgControl, None, None]:
+    with group_chat_tg_control(dispatcher=aiogram_mock_dispatcher, bot=aiogram_mock_bot) as control:
+        yield control
@@ -0,0 +1,353 @@
+import asyncio
+import functools
+import json
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Chat, Message, Update
+
+from aiogram_mock.tg_control import ChatMemberTgControl, GroupChatTgControl, TgControl
+
+CHAT_TYPES = frozenset(('private', 'group', 'supergroup', 'channel'))
+DEFAULT_COMPARED_FIELDS = ('text', 'caption', 'reply_markup')
+
+CapturedRequest = Tuple[TelegramMethod[Any], Any]
+
+_captured_requests: ContextVar[Optional[List[CapturedRequest]]] = ContextVar(
+    'aiogram_mock_captured_requests',
+    default=None,
+)
+
+
+class UpdateRecord(NamedTuple):
+    update: Dict[str, Any]
+    # None means that responses were not recorded, so they are not compared
+    responses: Optional[List[Dict[str, Any]]] = None
+    line: int = 0
+
+
+def read_update_records(path: Union[str, Path]) -> Iterator[UpdateRecord]:
+    # each line is either a raw update or {"update": {...}, "responses": [{"method": ..., "params": ...}, ...]}
+    with open(path, encoding='utf-8') as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'update' in record:
+                yield UpdateRecord(record['update'], record.get('responses'), line_number)
+            else:
+                yield UpdateRecord(record, None, line_number)
+
+
+class IdRemapper:
+    def __init__(self, first_user_id: int = 1, first_group_id: int = -1):
+        # private chats share ids with their users, so both are mapped by the same table
+        self._users: Dict[int, int] = {}
+        self._groups: Dict[int, int] = {}
+        self._messages: Dict[Tuple[int, int], int] = {}
+        self._next_user_id = first_user_id
+        self._next_group_id = first_group_id
+
+    def user_id(self, original_id: int) -> int:
+        try:
+            return self._users[original_id]
+        except KeyError:
+            user_id = self._users[original_id] = self._next_user_id
+            self._next_user_id += 1
+            return user_id
+
+    def chat_id(self, original_id: int) -> int:
+        if original_id > 0:
+            return self.user_id(original_id)
+        try:
+            return self._groups[original_id]
+        except KeyError:
+            chat_id = self._groups[original_id] = self._next_group_id
+            self._next_group_id -= 1
+            return chat_id
+
+    def message_id(self, original_chat_id: int, original_message_id: int) -> Optional[int]:
+        return self._messages.get((original_chat_id, original_message_id))
+
+    def link_message(self, original_chat_id: int, original_message_id: int, message_id: int) -> None:
+        self._messages[(original_chat_id, original_message_id)] = message_id
+
+
+@dataclass(frozen=True)
+class ReplayDivergence:
+    line: int
+    index: int
+    expected: Optional[Dict[str, Any]]
+    actual: Optional[Dict[str, Any]]
+
+
+class ReplayError(NamedTuple):
+    line: int
+    exception: BaseException
+
+
+@dataclass(frozen=True)
+class ReplayReport:
+    updates: int
+    requests: int
+    elapsed: float
+    divergences: Sequence[ReplayDivergence]
+    divergence_count: int
+    errors: Sequence[ReplayError]
+
+    @property
+    def updates_per_second(self) -> float:
+        if self.elapsed == 0:
+            return 0.0
+        return self.updates / self.elapsed
+
+
+class _RequestCapture(BaseRequestMiddleware):
+    # requests are bound to updates by the context of the task that delivers the update,
+    # requests sent from other tasks, e.g. by PollingTransport or background tasks of handlers, are not captured
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        result = await make_request(bot, method)
+        captured = _captured_requests.get()
+        if captured is not None:
+            captured.append((method, result))
+        return result
+
+
+def _original_chat_id(update: Dict[str, Any]) -> Optional[int]:
+    for key, event in update.items():
+        if key == 'update_id' or not isinstance(event, dict):
+            continue
+        if isinstance(event.get('chat'), dict):
+            return event['chat']['id']
+        message = event.get('message')
+        if isinstance(message, dict) and isinstance(message.get('chat'), dict):
+            return message['chat']['id']
+        if isinstance(event.get('from'), dict):
+            return event['from']['id']
+    return None
+
+
+class _Counters:
+    def __init__(self) -> None:
+        self.updates = 0
+        self.requests = 0
+        self.divergence_count = 0
+        self.divergences: List[ReplayDivergence] = []
+        self.errors: List[ReplayError] = []
+
+
+class ReplayEngine:
+    def __init__(
+        self,
+        tg_control: Union[TgControl, ChatMemberTgControl, GroupChatTgControl],
+        concurrency: int = 1,
+        batch_size: Optional[int] = None,
+        compared_fields: Sequence[str] = DEFAULT_COMPARED_FIELDS,
+        remapper: Optional[IdRemapper] = None,
+        max_divergences: int = 1000,
+    ):
+        if concurrency < 1:
+            raise ValueError('concurrency must be positive')
+        if batch_size is not None and batch_size < 1:
+            raise ValueError('batch_size must be positive')
+
+        # chat-level controls of the facades share one TgControl, replayed updates are not limited to their chat
+        if not isinstance(tg_control, TgControl):
+            tg_control = tg_control.tg_control
+        self._tg_control = tg_control
+        self._concurrency = concurrency
+        self._batch_size = batch_size
+        self._compared_fields = set(compared_fields)
+        if remapper is None:
+            # replayed chats must not be mixed up with chats that are already registered
+            chat_ids = tg_control.tg_state.chats.keys()
+            remapper = IdRemapper(
+                first_user_id=max((chat_id for chat_id in chat_ids if chat_id > 0), default=0) + 1,
+                first_group_id=min((chat_id for chat_id in chat_ids if chat_id < 0), default=0) - 1,
+            )
+        self._remapper = remapper
+        self._max_divergences = max_divergences
+
+    @property
+    def remapper(self) -> IdRemapper:
+        return self._remapper
+
+    def _remap(self, value: Any, original_chat_id: Optional[int], chats: Dict[int, Dict[str, Any]]) -> Any:
+        if isinstance(value, list):
+            return [self._remap(item, original_chat_id, chats) for item in value]
+        if not isinstance(value, dict):
+            return value
+
+        if isinstance(value.get('chat'), dict):
+            original_chat_id = value['chat']['id']
+        result = {key: self._remap(item, original_chat_id, chats) for key, item in value.items()}
+        if 'id' in value and 'is_bot' in value and not value['is_bot']:
+            result['id'] = self._remapper.user_id(value['id'])
+        elif 'id' in value and value.get('type') in CHAT_TYPES:
+            result['id'] = self._remapper.chat_id(value['id'])
+            chats.setdefault(result['id'], result)
+        elif 'message_id' in value and original_chat_id is not None:
+            message_id = self._remapper.message_id(original_chat_id, value['message_id'])
+            if message_id is not None:
+                result['message_id'] = message_id
+        return result
+
+    def _prepare(self, record: UpdateRecord, update_id: int) -> Update:
+        tg_state = self._tg_control.tg_state
+        chats: Dict[int, Dict[str, Any]] = {}
+        data = self._remap(record.update, None, chats)
+        for chat_id, chat in chats.items():
+            if chat_id not in tg_state.chats:
+                tg_state.add_chat(Chat(**chat))
+
+        data['update_id'] = update_id
+        # recorded query ids can repeat between replays and would be mixed up with evicted answers
+        if data.get('callback_query') is not None:
+            data['callback_query']['id'] = tg_state.next_callback_query_id()
+        if data.get('inline_query') is not None:
+            data['inline_query']['id'] = tg_state.next_inline_query_id()
+        message = data.get('message')
+        if message is not None:
+            # new messages get ids of the local history, replies to them are remapped later
+            original = record.update['message']
+            message['message_id'] = tg_state.allocate_message_id(message['chat']['id'])
+            self._remapper.link_message(original['chat']['id'], original['message_id'], message['message_id'])
+
+        update = Update(**data)
+        if update.message is not None:
+            tg_state.add_message(update.message)
+        elif update.edited_message is not None:
+            edited_message = update.edited_message
+            if tg_state.chat_history(edited_message.chat.id).has_message_id(edited_message.message_id):
+                tg_state.replace_message(edited_message)
+        return update
+
+    def _normalize(self, method: TelegramMethod[Any]) -> Dict[str, Any]:
+        normalized = json.loads(method.json(include=self._compared_fields, exclude_none=True))
+        normalized['method'] = type(method).__name__
+        return normalized
+
+    def _compare(
+        self,
+        line: int,
+        responses: List[Dict[str, Any]],
+        captured: List[CapturedRequest],
+        counters: _Counters,
+    ) -> None:
+        for index in range(max(len(responses), len(captured))):
+            expected: Optional[Dict[str, Any]] = None
+            actual: Optional[Dict[str, Any]] = None
+            if index < len(responses):
+                response = responses[index]
+                params = response.get('params', {})
+                expected = {key: params[key] for key in self._compared_fields if params.get(key) is not None}
+                expected['method'] = response['method']
+            if index < len(captured):
+                method, result = captured[index]
+                actual = self._normalize(method)
+                if expected is not None:
+                    self._link_result(responses[index].get('result'), result)
+            if expected != actual:
+                counters.divergence_count += 1
+                if len(counters.divergences) < self._max_divergences:
+                    counters.divergences.append(ReplayDivergence(line, index, expected, actual))
+
+    def _link_result(self, recorded_result: Any, result: Any) -> None:
+        # bot messages get local ids, later updates refer to them by the recorded ids
+        if (
+            isinstance(recorded_result, dict)
+            and 'message_id' in recorded_result
+            and isinstance(recorded_result.get('chat'), dict)
+            and isinstance(result, Message)
+        ):
+            self._remapper.link_message(recorded_result['chat']['id'], recorded_result['message_id'], result.message_id)
+
+    async def _replay_record(
+        self,
+        record: UpdateRecord,
+        update_id: int,
+        previous: Optional['asyncio.Task[None]'],
+        counters: _Counters,
+    ) -> None:
+        # updates of one chat are fed strictly one after another
+        if previous is not None:
+            await asyncio.wait((previous,))
+
+        captured: List[CapturedRequest] = []
+        token = _captured_requests.set(captured)
+        try:
+            update = self._prepare(record, update_id)
+            await self._tg_control.deliver_update(update)
+        except Exception as e:
+            counters.errors.append(ReplayError(record.line, e))
+        finally:
+            _captured_requests.reset(token)
+            counters.updates += 1
+            counters.requests += len(captured)
+
+        if record.responses is None:
+            return
+        try:
+            self._compare(record.line, record.responses, captured, counters)
+        except Exception as e:  # malformed recorded responses must not stop the replay
+            counters.errors.append(ReplayError(record.line, e))
+
+    async def run(self, records: Iterable[UpdateRecord]) -> ReplayReport:
+        counters = _Counters()
+        semaphore = asyncio.Semaphore(self._concurrency)
+        pending: Set['asyncio.Task[None]'] = set()
+        last_tasks: Dict[int, 'asyncio.Task[None]'] = {}
+
+        def on_done(task: 'asyncio.Task[None]', chat_id: Optional[int]) -> None:
+            semaphore.release()
+            pending.discard(task)
+            if chat_id is not None and last_tasks.get(chat_id) is task:
+                del last_tasks[chat_id]
+
+        tg_state = self._tg_control.tg_state
+        capture = _RequestCapture()
+        session = self._tg_control.bot.session
+        session.middleware.register(capture)
+        started_at = time.perf_counter()
+        try:
+            for number, record in enumerate(records, start=1):
+                await semaphore.acquire()
+                chat_id = _original_chat_id(record.update)
+                previous = None if chat_id is None else last_tasks.get(chat_id)
+                # update ids follow the order of records, not the order in which waiting chats are resumed
+                update_id = tg_state.increment_update_id()
+                task = asyncio.ensure_future(self._replay_record(record, update_id, previous, counters))
+                task.add_done_callback(functools.partial(on_done, chat_id=chat_id))
+                pending.add(task)
+                if chat_id is not None:
+                    last_tasks[chat_id] = task
+                if self._batch_size is not None and number % self._batch_size == 0:
+                    await asyncio.gather(*pending)
+            await asyncio.gather(*pending)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            session.middleware.unregister(capture)
+
+        return ReplayReport(
+            updates=counters.updates,
+            requests=counters.requests,
+            elapsed=elapsed,
+            divergences=counters.divergences,
+            divergence_count=counters.divergence_count,
+            errors=counters.errors,
+        )
+
+    async def replay_file(self, path: Union[str, Path]) -> ReplayReport:
+        return await self.run(read_update_records(path))
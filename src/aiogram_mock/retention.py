@@ -0,0 +1,119 @@
+import heapq
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Sequence, Tuple, Type, Union
+
+from aiogram.methods import TelegramMethod
+from aiogram.types import Message
+
+COMPACT_TEXT_LIMIT = 64
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    history_depth: Optional[int] = None  # live messages per chat
+    sent_methods_depth: Optional[int] = None  # sent methods per method type
+    answers_depth: Optional[int] = None  # callback query answers, pending inline queries and their answers
+    compact_depth: int = 0  # compact records of evicted entries per chat or method type
+
+    def __post_init__(self) -> None:
+        for name in ('history_depth', 'sent_methods_depth', 'answers_depth'):
+            value = getattr(self, name)
+            if value is not None and value < 1:
+                raise ValueError(f'{name} must be positive')
+        if self.compact_depth < 0:
+            raise ValueError('compact_depth must be non-negative')
+
+
+class CompactMessage(NamedTuple):
+    chat_id: int
+    message_id: int
+    from_user_id: Optional[int]
+    date: datetime
+    text: Optional[str]
+    has_reply_markup: bool
+
+
+class CompactMethod(NamedTuple):
+    seq: int
+    method: str
+    chat_id: Union[int, str, None]
+    message_id: Optional[int]
+    text: Optional[str]
+
+
+def _truncate(text: Optional[str]) -> Optional[str]:
+    if text is None or len(text) <= COMPACT_TEXT_LIMIT:
+        return text
+    return text[:COMPACT_TEXT_LIMIT]
+
+
+def compact_message(message: Message) -> CompactMessage:
+    return CompactMessage(
+        chat_id=message.chat.id,
+        message_id=message.message_id,
+        from_user_id=None if message.from_user is None else message.from_user.id,
+        date=message.date,
+        text=_truncate(message.text),
+        has_reply_markup=message.reply_markup is not None,
+    )
+
+
+def compact_method(seq: int, method: TelegramMethod[Any]) -> CompactMethod:
+    return CompactMethod(
+        seq=seq,
+        method=type(method).__name__,
+        chat_id=getattr(method, 'chat_id', None),
+        message_id=getattr(method, 'message_id', None),
+        text=_truncate(getattr(method, 'text', None)),
+    )
+
+
+class EvictedError(KeyError):
+    def __init__(self, description: str, compact: Optional[Any] = None):
+        super().__init__(description)
+        self.compact = compact
+
+
+class MethodLog:
+    def __init__(self, depth: Optional[int] = None, compact_depth: int = 0):
+        self._depth = depth
+        self._compact_depth = compact_depth
+        self._seq = 0
+        self._methods: List[TelegramMethod[Any]] = []
+        self._by_type: Dict[Type[TelegramMethod[Any]], Deque[Tuple[int, TelegramMethod[Any]]]] = {}
+        self._evicted: Dict[Type[TelegramMethod[Any]], Deque[CompactMethod]] = {}
+
+    def append(self, method: TelegramMethod[Any]) -> None:
+        self._seq += 1
+        if self._depth is None:
+            self._methods.append(method)
+            return
+
+        method_type = type(method)
+        try:
+            retained = self._by_type[method_type]
+        except KeyError:
+            retained = self._by_type[method_type] = deque()
+        if len(retained) == self._depth:
+            seq, evicted = retained.popleft()
+            if self._compact_depth:
+                self._evicted.setdefault(method_type, deque(maxlen=self._compact_depth)).append(
+                    compact_method(seq, evicted),
+                )
+        retained.append((self._seq, method))
+
+    @property
+    def methods(self) -> Sequence[TelegramMethod[Any]]:
+        if self._depth is None:
+            return self._methods
+        return [method for _, method in heapq.merge(*self._by_type.values(), key=lambda item: item[0])]
+
+    @property
+    def evicted(self) -> Sequence[CompactMethod]:
+        return list(heapq.merge(*self._evicted.values(), key=lambda record: record.seq))
+
+    @property
+    def total_count(self) -> int:
+        return self._seq
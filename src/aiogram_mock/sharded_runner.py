@@ -0,0 +1,150 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, List, NamedTuple, Sequence
+
+from aiogram.types import User
+
+from aiogram_mock.facade_factory import BotAndDispatcherFactory
+from aiogram_mock.load_driver import LoadDriver, LoadScenario
+from aiogram_mock.mocked_session import MockedSession
+from aiogram_mock.tg_control import TgControl
+from aiogram_mock.tg_state import TgState
+
+
+class ScenarioCase(NamedTuple):
+    user: User
+    scenario: LoadScenario  # must be picklable, e.g. a module level coroutine function
+
+
+@dataclass(frozen=True)
+class ShardReport:
+    shard: int
+    chats: int
+    steps: int
+    updates: int
+    elapsed: float
+    errors: Sequence[str]  # exceptions are formatted, they may be not picklable
+
+    @property
+    def updates_per_second(self) -> float:
+        if self.elapsed == 0:
+            return 0.0
+        return self.updates / self.elapsed
+
+
+@dataclass(frozen=True)
+class ShardedReport:
+    shards: Sequence[ShardReport]
+    elapsed: float  # wall time of the whole run
+
+    @property
+    def chats(self) -> int:
+        return sum(shard.chats for shard in self.shards)
+
+    @property
+    def steps(self) -> int:
+        return sum(shard.steps for shard in self.shards)
+
+    @property
+    def updates(self) -> int:
+        return sum(shard.updates for shard in self.shards)
+
+    @property
+    def errors(self) -> Sequence[str]:
+        return [error for shard in self.shards for error in shard.errors]
+
+    @property
+    def updates_per_second(self) -> float:
+        if self.elapsed == 0:
+            return 0.0
+        return self.updates / self.elapsed
+
+
+async def _run_shard_async(
+    factory: BotAndDispatcherFactory,
+    shard: int,
+    cases: Sequence[ScenarioCase],
+    concurrency: int,
+) -> ShardReport:
+    bot, dispatcher = factory()
+    tg_state = TgState([])
+    # the bot belongs to this process, so its session is replaced without restoring
+    bot.session = MockedSession(
+        tg_state,
+        User(id=bot.id, first_name='Test', last_name='bot', username='test_bot', is_bot=True),
+    )
+    driver = LoadDriver(TgControl(dispatcher=dispatcher, bot=bot, tg_state=tg_state), concurrency=concurrency)
+    for case in cases:
+        driver.schedule_scenario(case.user, case.scenario)
+    report = await driver.run()
+    return ShardReport(
+        shard=shard,
+        chats=report.chats,
+        steps=report.steps,
+        updates=report.updates,
+        elapsed=report.elapsed,
+        errors=[f'{type(e).__name__}: {e}' for e in report.errors],
+    )
+
+
+def _run_shard(
+    factory: BotAndDispatcherFactory,
+    shard: int,
+    cases: Sequence[ScenarioCase],
+    concurrency: int,
+) -> ShardReport:
+    return asyncio.run(_run_shard_async(factory, shard, cases, concurrency))
+
+
+class ShardedRunner:
+    def __init__(
+        self,
+        factory: BotAndDispatcherFactory,
+        executor: Executor,
+        shards: int,
+        concurrency: int = 100,
+    ):
+        if shards < 1:
+            raise ValueError('shards must be positive')
+        if concurrency < 1:
+            raise ValueError('concurrency must be positive')
+
+        self._factory = factory
+        self._executor = executor
+        self._shards = shards
+        self._concurrency = concurrency
+
+    def shard_of(self, user: User) -> int:
+        # scenarios of one chat stay in one shard, so they are executed in order by a single TgState
+        return user.id % self._shards
+
+    def _split(self, cases: Iterable[ScenarioCase]) -> List[List[ScenarioCase]]:
+        shard_cases: List[List[ScenarioCase]] = [[] for _ in range(self._shards)]
+        for case in cases:
+            shard_cases[self.shard_of(case.user)].append(case)
+        return shard_cases
+
+    async def iter_shards(self, cases: Iterable[ScenarioCase]) -> AsyncIterator[ShardReport]:
+        # reports are yielded as shards finish, more shards than processes give a smoother stream
+        loop = asyncio.get_running_loop()
+        futures = [
+            loop.run_in_executor(self._executor, _run_shard, self._factory, shard, shard_cases, self._concurrency)
+            for shard, shard_cases in enumerate(self._split(cases))
+            if shard_cases
+        ]
+        try:
+            for future in asyncio.as_completed(futures):
+                yield await future
+        finally:
+            for pending in futures:
+                pending.cancel()
+
+    async def run(self, cases: Iterable[ScenarioCase]) -> ShardedReport:
+        started_at = time.perf_counter()
+        shards = [shard async for shard in self.iter_shards(cases)]
+        return ShardedReport(
+            shards=sorted(shards, key=lambda shard: shard.shard),
+            elapsed=time.perf_counter() - started_at,
+        )
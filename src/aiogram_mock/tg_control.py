@@ -1,14 +1,35 @@
-import itertools
-from datetime import datetime
-from typing import Callable, Optional, Sequence, Union
+import copy
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional, Sequence, Type, TypeVar
 
-from aiogram import Bot, Dispatcher, MagicFilter
+from aiogram import Bot, Dispatcher
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.base import DEFAULT_DESTINY, BaseStorage, StorageKey
-from aiogram.methods import AnswerCallbackQuery
-from aiogram.types import CallbackQuery, Chat, Contact, InlineKeyboardButton, Message, Update, User
+from aiogram.fsm.storage.memory import MemoryStorage, MemoryStorageRecord
+from aiogram.methods import AnswerCallbackQuery, AnswerInlineQuery
+from aiogram.types import CallbackQuery, Chat, Contact, InlineQuery, Message, Update, User
 
+from aiogram_mock.button_index import ButtonSelectorLike, compile_selector
+from aiogram_mock.message_index import MessageQuery
 from aiogram_mock.tg_state import TgState, UserState
+from aiogram_mock.transport import FeedTransport, UpdateTransport, UpdateTransportFactory
+
+TransportT = TypeVar('TransportT', bound=UpdateTransport)
+
+
+@dataclass(frozen=True)
+class TgControlSnapshot:
+    tg_state: TgState
+    storage_records: Mapping[StorageKey, MemoryStorageRecord]
+
+
+def _copy_storage_records(
+    records: Mapping[StorageKey, MemoryStorageRecord],
+) -> Dict[StorageKey, MemoryStorageRecord]:
+    return {
+        key: MemoryStorageRecord(data=copy.deepcopy(record.data), state=record.state)
+        for key, record in records.items()
+    }
 
 
 class TgControl:
@@ -17,23 +38,54 @@ class TgControl:
         dispatcher: Dispatcher,
         bot: Bot,
         tg_state: TgState,
+        transport_factory: UpdateTransportFactory = FeedTransport,
     ):
         self._dispatcher = dispatcher
         self._bot = bot
         self._tg_state = tg_state
+        self._transport = transport_factory(dispatcher, tg_state)
+
+    def _memory_storage(self) -> MemoryStorage:
+        storage = self.storage
+        if not isinstance(storage, MemoryStorage):
+            raise TypeError(f'Snapshots are supported only for MemoryStorage, got {type(storage)}')
+        return storage
+
+    def snapshot(self) -> TgControlSnapshot:
+        return TgControlSnapshot(
+            tg_state=self._tg_state.fork(),
+            storage_records=_copy_storage_records(self._memory_storage().storage),
+        )
+
+    def restore(self, snapshot: TgControlSnapshot) -> None:
+        storage = self._memory_storage()
+        self._tg_state.restore(snapshot.tg_state)
+        storage.storage.clear()
+        storage.storage.update(_copy_storage_records(snapshot.storage_records))
 
     def messages(self, chat_id: int) -> Sequence[Message]:
         return self._tg_state.chat_history(chat_id)
 
     def last_message(self, chat_id: int) -> Message:
-        return self._tg_state.chat_history(chat_id)[-1]
+        return self._tg_state.chat_history(chat_id).last
+
+    def find_messages(self, query: MessageQuery, chat_id: Optional[int] = None) -> Sequence[Message]:
+        return self._tg_state.find_messages(query, chat_id=chat_id)
+
+    def find_last_message(self, query: MessageQuery, chat_id: int) -> Optional[Message]:
+        return self._tg_state.find_last_message(query, chat_id=chat_id)
 
     def user_state(self, *, chat_id: int, user_id: int) -> UserState:
         return self._tg_state.get_user_state(chat_id=chat_id, user_id=user_id)
 
+    async def deliver_update(self, update: Update) -> None:
+        # the bot can answer only registered inline queries, also replayed or delivered directly
+        if update.inline_query is not None:
+            self._tg_state.add_inline_query(update.inline_query)
+        await self._transport.deliver(self._bot, update)
+
     async def _send_message(self, message: Message) -> None:
-        await self._dispatcher.feed_update(
-            self._bot,
+        await self.deliver_update(
             Update(
                 update_id=self._tg_state.increment_update_id(),
                 message=self._tg_state.add_message(message),
@@ -42,9 +94,9 @@ class TgControl:
 
     async def send(self, from_user: User, chat: Chat, text: str) -> None:
         await self._send_message(
-            Message(
-                message_id=self._tg_state.next_message_id(chat.id),
-                date=datetime.utcnow(),
+            self._tg_state.message_factory.create(
+                message_id=self._tg_state.allocate_message_id(chat.id),
+                date=self._tg_state.clock.now(),
                 from_user=from_user,
                 chat=chat,
                 text=text,
@@ -53,9 +105,9 @@ class TgControl:
 
     async def send_contact(self, from_user: User, chat: Chat, contact: Contact) -> None:
         await self._send_message(
-            Message(
-                message_id=self._tg_state.next_message_id(chat.id),
-                date=datetime.utcnow(),
+            self._tg_state.message_factory.create(
+                message_id=self._tg_state.allocate_message_id(chat.id),
+                date=self._tg_state.clock.now(),
                 from_user=from_user,
                 chat=chat,
                 contact=contact,
@@ -64,17 +116,15 @@ class TgControl:
 
     async def click(
         self,
-        selector: Union[Callable[[InlineKeyboardButton], bool], MagicFilter],
+        selector: ButtonSelectorLike,
         message: Message,
         user: User,
     ) -> AnswerCallbackQuery:
-        if message.reply_markup is None:
+        button_index = self._tg_state.button_index(message)
+        if button_index is None:
             raise ValueError('Message has no inline keyboard')
-        if isinstance(selector, MagicFilter):
-            selector = selector.resolve
 
-        buttons = itertools.chain.from_iterable(message.reply_markup.inline_keyboard)
-        selected_buttons = [button for button in buttons if selector(button)]
+        selected_buttons = compile_selector(selector).select(button_index)
         if len(selected_buttons) == 0:
             raise ValueError('selector skip all buttons')
         if len(selected_buttons) > 1:
@@ -82,8 +132,7 @@ class TgControl:
         button = selected_buttons[0]
 
         callback_query_id = self._tg_state.next_callback_query_id()
-        await self._dispatcher.feed_update(
-            self._bot,
+        await self.deliver_update(
             Update(
                 update_id=self._tg_state.increment_update_id(),
                 callback_query=CallbackQuery(
@@ -97,16 +146,62 @@ class TgControl:
         )
         return self._tg_state.get_answer_callback_query(callback_query_id)
 
+    async def inline_query(
+        self,
+        user: User,
+        query: str,
+        offset: str = '',
+        chat_type: Optional[str] = None,
+    ) -> AnswerInlineQuery:
+        # like Telegram, cached results are returned without sending the query to the bot
+        cached_answer = self._tg_state.get_cached_answer_inline_query(user.id, query, offset)
+        if cached_answer is not None:
+            return cached_answer
+
+        inline_query_id = self._tg_state.next_inline_query_id()
+        inline_query = InlineQuery(
+            id=inline_query_id,
+            from_user=user,
+            query=query,
+            offset=offset,
+            chat_type=chat_type,
+        )
+        try:
+            await self.deliver_update(
+                Update(
+                    update_id=self._tg_state.increment_update_id(),
+                    inline_query=inline_query,
+                ),
+            )
+            return self._tg_state.get_answer_inline_query(inline_query_id)
+        finally:
+            # the query is not kept if the bot has not answered it
+            self._tg_state.discard_inline_query(inline_query_id)
+
     @property
     def bot(self) -> Bot:
         return self._bot
 
+    @property
+    def tg_state(self) -> TgState:
+        return self._tg_state
+
+    @property
+    def transport(self) -> UpdateTransport:
+        return self._transport
+
+    def typed_transport(self, transport_type: Type[TransportT]) -> TransportT:
+        # transports have their own controls, like PollingTransport.polling, they are reached with the expected type
+        if not isinstance(self._transport, transport_type):
+            raise TypeError(f'Transport is {type(self._transport)}, not {transport_type}')
+        return self._transport
+
     @property
     def storage(self) -> BaseStorage:
         return self._dispatcher.storage
 
 
-class PrivateChatTgControl:
+class ChatMemberTgControl:
     def __init__(self, tg_control: TgControl, chat: Chat, user: User):
         self._tg_control = tg_control
         self._chat = chat
@@ -114,8 +209,13 @@ class PrivateChatTgControl:
         self._validate()
 
     def _validate(self) -> None:
-        if self._chat.id != self._user.id:
-            raise ValueError('chat.id and user.id must be equal')
+        pass
+
+    def snapshot(self) -> TgControlSnapshot:
+        return self._tg_control.snapshot()
+
+    def restore(self, snapshot: TgControlSnapshot) -> None:
+        self._tg_control.restore(snapshot)
 
     def state(self, destiny: str = DEFAULT_DESTINY) -> FSMContext:
         return FSMContext(
@@ -137,6 +237,12 @@ class PrivateChatTgControl:
     def last_message(self) -> Message:
         return self._tg_control.last_message(self._chat.id)
 
+    def find_messages(self, query: MessageQuery) -> Sequence[Message]:
+        return self._tg_control.find_messages(query, chat_id=self._chat.id)
+
+    def find_last_message(self, query: MessageQuery) -> Optional[Message]:
+        return self._tg_control.find_last_message(query, chat_id=self._chat.id)
+
     @property
     def user_state(self) -> UserState:
         return self._tg_control.user_state(chat_id=self._chat.id, user_id=self._user.id)
@@ -145,6 +251,13 @@ class PrivateChatTgControl:
     def bot(self) -> Bot:
         return self._tg_control.bot
 
+    @property
+    def tg_control(self) -> TgControl:
+        return self._tg_control
+
+    def typed_transport(self, transport_type: Type[TransportT]) -> TransportT:
+        return self._tg_control.typed_transport(transport_type)
+
     @property
     def user(self) -> User:
         return self._user
@@ -169,9 +282,91 @@ class PrivateChatTgControl:
 
     async def click(
         self,
-        selector: Union[Callable[[InlineKeyboardButton], bool], MagicFilter],
+        selector: ButtonSelectorLike,
         message: Optional[Message] = None,
     ) -> AnswerCallbackQuery:
         if message is None:
             message = self.last_message
         return await self._tg_control.click(selector, message, self._user)
+
+    async def inline_query(self, query: str, offset: str = '') -> AnswerInlineQuery:
+        # query is typed in this chat, Bot API calls the private chat with the bot 'sender'
+        chat_type = 'sender' if self._chat.id == self._user.id else self._chat.type
+        return await self._tg_control.inline_query(self._user, query, offset, chat_type=chat_type)
+
+
+class PrivateChatTgControl(ChatMemberTgControl):
+    def _validate(self) -> None:
+        if self._chat.id != self._user.id:
+            raise ValueError('chat.id and user.id must be equal')
+
+
+class GroupChatTgControl:
+    def __init__(self, tg_control: TgControl, chat: Chat):
+        self._tg_control = tg_control
+        self._chat = chat
+        self._validate()
+
+    def _validate(self) -> None:
+        if self._chat.type not in ('group', 'supergroup'):
+            raise ValueError('chat.type must be group or supergroup')
+
+    def member(self, user: User) -> ChatMemberTgControl:
+        return ChatMemberTgControl(tg_control=self._tg_control, chat=self._chat, user=user)
+
+    def snapshot(self) -> TgControlSnapshot:
+        return self._tg_control.snapshot()
+
+    def restore(self, snapshot: TgControlSnapshot) -> None:
+        self._tg_control.restore(snapshot)
+
+    def state(self, user: User, destiny: str = DEFAULT_DESTINY) -> FSMContext:
+        return self.member(user).state(destiny)
+
+    @property
+    def messages(self) -> Sequence[Message]:
+        return self._tg_control.messages(self._chat.id)
+
+    @property
+    def last_message(self) -> Message:
+        return self._tg_control.last_message(self._chat.id)
+
+    def find_messages(self, query: MessageQuery) -> Sequence[Message]:
+        return self._tg_control.find_messages(query, chat_id=self._chat.id)
+
+    def find_last_message(self, query: MessageQuery) -> Optional[Message]:
+        return self._tg_control.find_last_message(query, chat_id=self._chat.id)
+
+    def user_state(self, user: User) -> UserState:
+        return self._tg_control.user_state(chat_id=self._chat.id, user_id=user.id)
+
+    @property
+    def bot(self) -> Bot:
+        return self._tg_control.bot
+
+    @property
+    def tg_control(self) -> TgControl:
+        return self._tg_control
+
+    def typed_transport(self, transport_type: Type[TransportT]) -> TransportT:
+        return self._tg_control.typed_transport(transport_type)
+
+    @property
+    def chat(self) -> Chat:
+        return self._chat
+
+    async def send(self, user: User, text: str) -> None:
+        await self._tg_control.send(from_user=user, chat=self._chat, text=text)
+
+    async def send_contact(self, user: User, contact: Contact) -> None:
+        await self._tg_control.send_contact(from_user=user, chat=self._chat, contact=contact)
+
+    async def click(
+        self,
+        user: User,
+        selector: ButtonSelectorLike,
+        message: Optional[Message] = None,
+    ) -> AnswerCallbackQuery:
+        if message is None:
+            message = self.last_message
+        return await self._tg_control.click(selector, message, user)
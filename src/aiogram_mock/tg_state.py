@@ -1,20 +1,25 @@
+import copy
+import heapq
 import itertools
 from collections import defaultdict
-from dataclasses import dataclass, replace
-from typing import DefaultDict, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+from dataclasses import dataclass, fields, replace
+from datetime import datetime, timedelta
+from typing import Any, DefaultDict, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple, Union
 from uuid import uuid4
 
-from aiogram.methods import AnswerCallbackQuery
-from aiogram.types import (
-    UNSET,
-    Chat,
-    Document,
-    ForceReply,
-    InlineKeyboardMarkup,
-    InputFile,
-    Message,
-    ReplyKeyboardMarkup,
-)
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import AnswerCallbackQuery, AnswerInlineQuery, GetFile
+from aiogram.types import UNSET, Chat, Document, File, ForceReply, InlineQuery, InputFile, Message, ReplyKeyboardMarkup
+
+from aiogram_mock.button_index import ButtonIndex
+from aiogram_mock.chat_history import ChatHistory
+from aiogram_mock.clock import Clock, SystemClock
+from aiogram_mock.content_store import ContentInfo, ContentStore
+from aiogram_mock.memory_stats import StructureStats, deep_size
+from aiogram_mock.message_factory import MessageFactory
+from aiogram_mock.message_index import MessageQuery
+from aiogram_mock.retention import EvictedError, RetentionPolicy
+from aiogram_mock.update_queue import UpdateQueue
 
 
 @dataclass(frozen=True)
@@ -22,75 +27,254 @@ class UserState:
     reply_markup: Union[ReplyKeyboardMarkup, ForceReply, None] = None
 
 
+USER_STATE_FIELDS = tuple(field.name for field in fields(UserState))
+
+FILE_PATH_PREFIX = 'files/'
+
+DEFAULT_INLINE_CACHE_TIME = 300  # seconds, like in Bot API
+
+InlineCacheKey = Tuple[str, str, Optional[int]]  # query, offset and user id of personal results
+
+
+@dataclass
+class InlineCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+
+class ChatUserStates:
+    def __init__(self) -> None:
+        # chat-wide updates only bump versions of changed fields, selective states are resolved against them lazily
+        self._version = 0
+        self._chat_state = UserState()
+        self._chat_field_versions: Dict[str, int] = {}
+        self._selective: Dict[int, Tuple[UserState, int]] = {}
+
+    def copy(self) -> 'ChatUserStates':
+        states = copy.copy(self)
+        states._chat_field_versions = dict(self._chat_field_versions)
+        states._selective = dict(self._selective)
+        return states
+
+    def __len__(self) -> int:
+        return len(self._selective)
+
+    @property
+    def chat_state(self) -> UserState:
+        return self._chat_state
+
+    def get(self, user_id: int) -> Optional[UserState]:
+        try:
+            state, version = self._selective[user_id]
+        except KeyError:
+            return None
+
+        replace_data = {
+            name: getattr(self._chat_state, name)
+            for name, field_version in self._chat_field_versions.items()
+            if field_version > version
+        }
+        if replace_data:
+            return replace(state, **replace_data)
+        return state
+
+    def update_chat(self, replace_data: Mapping[str, Any]) -> None:
+        self._version += 1
+        self._chat_state = replace(self._chat_state, **replace_data)
+        for name in replace_data:
+            self._chat_field_versions[name] = self._version
+        if all(name in replace_data for name in USER_STATE_FIELDS):
+            # every selective state is shadowed by the chat-wide one now
+            self._selective = {}
+
+    def update_selective(self, users_ids: Iterable[int], replace_data: Mapping[str, Any]) -> None:
+        self._version += 1
+        for user_id in users_ids:
+            # users without a selective state see the chat state, so their state starts from it
+            state = self.get(user_id)
+            self._selective[user_id] = (
+                replace(self._chat_state if state is None else state, **replace_data),
+                self._version,
+            )
+
+
 class TgState:
-    def __init__(self, chats: Iterable[Chat]):
+    def __init__(
+        self,
+        chats: Iterable[Chat],
+        content_store: Optional[ContentStore] = None,
+        clock: Optional[Clock] = None,
+        retention: RetentionPolicy = RetentionPolicy(),
+        message_factory: Optional[MessageFactory] = None,
+    ):
+        self._clock = SystemClock() if clock is None else clock
+        self._retention = retention
+        self._message_factory = MessageFactory() if message_factory is None else message_factory
         self._chats = {chat.id: chat for chat in chats}
-        self._histories: Dict[int, List[Optional[Message]]] = {chat.id: [] for chat in chats}
-        self._message_dict: Dict[Tuple[int, int], Message] = {}
+        self._histories: Dict[int, ChatHistory] = {chat.id: self._create_history() for chat in chats}
         self._last_update_id: int = 0
+        self._update_queue = UpdateQueue()
         self._last_callback_query_id: int = 0
         self._answers: Dict[str, AnswerCallbackQuery] = {}
-
-        self._chat_user_state: Dict[int, UserState] = {chat.id: UserState() for chat in chats}
-        self._selective_user_state: Dict[int, Dict[int, UserState]] = {}
-
-        self._content_to_unique_id: Dict[bytes, str] = {}
+        self._answers_evicted_up_to = 0
+        self._last_inline_query_id: int = 0
+        self._inline_queries: Dict[str, InlineQuery] = {}
+        self._inline_answers: Dict[str, AnswerInlineQuery] = {}
+        self._inline_cache: Dict[InlineCacheKey, Tuple[AnswerInlineQuery, datetime]] = {}
+        self._inline_cache_expiry: List[Tuple[datetime, int, InlineCacheKey]] = []  # heap
+        self._inline_cache_seq = 0
+        self._inline_cache_stats = InlineCacheStats()
+
+        self._user_states: Dict[int, ChatUserStates] = {chat.id: ChatUserStates() for chat in chats}
+
+        self._content_store = ContentStore() if content_store is None else content_store
+        self._digest_to_unique_id: Dict[str, str] = {}
+        self._unique_id_to_content: Dict[str, ContentInfo] = {}
         self._user_id_to_unique_id_to_local_id: DefaultDict[int, Dict[str, str]] = defaultdict(dict)
         self._user_id_to_local_id_to_unique_id: DefaultDict[int, Dict[str, str]] = defaultdict(dict)
 
+    def fork(self) -> 'TgState':
+        forked = copy.copy(self)
+        forked._update_queue = UpdateQueue()
+        forked.restore(self)
+        return forked
+
+    def restore(self, snapshot: 'TgState') -> None:
+        # histories are shared copy-on-write and the content store is content-addressed,
+        # the rest of the state is small enough to be copied
+        self._chats = dict(snapshot._chats)
+        self._histories = {chat_id: history.fork() for chat_id, history in snapshot._histories.items()}
+        # update ids are not rewound, a running poller has already confirmed them by its offset
+        self._last_update_id = max(self._last_update_id, snapshot._last_update_id)
+        self._update_queue.restore(snapshot._update_queue)
+        self._last_callback_query_id = snapshot._last_callback_query_id
+        self._answers = dict(snapshot._answers)
+        self._answers_evicted_up_to = snapshot._answers_evicted_up_to
+        self._last_inline_query_id = snapshot._last_inline_query_id
+        self._inline_queries = dict(snapshot._inline_queries)
+        self._inline_answers = dict(snapshot._inline_answers)
+        self._inline_cache = dict(snapshot._inline_cache)
+        self._inline_cache_expiry = list(snapshot._inline_cache_expiry)
+        self._inline_cache_seq = snapshot._inline_cache_seq
+        self._inline_cache_stats = replace(snapshot._inline_cache_stats)
+
+        self._user_states = {chat_id: states.copy() for chat_id, states in snapshot._user_states.items()}
+
+        self._content_store = snapshot._content_store
+        self._digest_to_unique_id = dict(snapshot._digest_to_unique_id)
+        self._unique_id_to_content = dict(snapshot._unique_id_to_content)
+        self._user_id_to_unique_id_to_local_id = defaultdict(
+            dict,
+            {user_id: dict(mapping) for user_id, mapping in snapshot._user_id_to_unique_id_to_local_id.items()},
+        )
+        self._user_id_to_local_id_to_unique_id = defaultdict(
+            dict,
+            {user_id: dict(mapping) for user_id, mapping in snapshot._user_id_to_local_id_to_unique_id.items()},
+        )
+
+    @property
+    def clock(self) -> Clock:
+        return self._clock
+
+    @property
+    def retention(self) -> RetentionPolicy:
+        return self._retention
+
+    @property
+    def message_factory(self) -> MessageFactory:
+        return self._message_factory
+
     @property
     def chats(self) -> Mapping[int, Chat]:
         return self._chats
 
-    def chat_history(self, chat_id: int) -> Sequence[Message]:
-        return [message for message in self._histories[chat_id] if message is not None]
+    def _create_history(self, history: Iterable[Message] = ()) -> ChatHistory:
+        return ChatHistory(
+            history,
+            max_depth=self._retention.history_depth,
+            compact_depth=self._retention.compact_depth,
+        )
+
+    def chat_history(self, chat_id: int) -> ChatHistory:
+        return self._histories[chat_id]
+
+    def find_messages(self, query: MessageQuery, chat_id: Optional[int] = None) -> List[Message]:
+        if chat_id is not None:
+            return self._histories[chat_id].find(query)
+        return list(itertools.chain.from_iterable(history.find(query) for history in self._histories.values()))
+
+    def find_last_message(self, query: MessageQuery, chat_id: int) -> Optional[Message]:
+        return self._histories[chat_id].find_last(query)
 
     def add_chat(self, chat: Chat, history: Iterable[Message] = ()) -> None:
         if chat.id in self._chats:
             raise ValueError('chat.id duplication')
 
         self._chats[chat.id] = chat
-        self._histories[chat.id] = list(history)
-        self._chat_user_state[chat.id] = UserState()
+        self._histories[chat.id] = self._create_history(history)
+        self._user_states[chat.id] = ChatUserStates()
 
     def next_message_id(self, chat_id: int) -> int:
-        return len(self._histories[chat_id])
+        return self._histories[chat_id].next_message_id
 
-    def _validate_message(self, message: Message) -> None:
-        if isinstance(message.reply_markup, InlineKeyboardMarkup):
-            buttons = itertools.chain.from_iterable(message.reply_markup.inline_keyboard)
-            for button in buttons:
-                if button.callback_data is not None and len(button.callback_data) > 64:
+    def allocate_message_id(self, chat_id: int) -> int:
+        return self._histories[chat_id].allocate_message_id()
+
+    def _validate_message(self, message: Message) -> Optional[ButtonIndex]:
+        button_index = ButtonIndex.from_message(message)
+        if button_index is not None:
+            for callback_data in button_index.callback_data:
+                if len(callback_data) > 64:
+                    button = button_index.with_callback_data(callback_data)[0]
                     raise ValueError(f'callback_data of {button} has more than 64 chars')
+        return button_index
 
     def add_message(self, message: Message) -> Message:
-        if (message.chat.id, message.message_id) in self._message_dict:
+        history = self._histories[message.chat.id]
+        if history.has_message_id(message.message_id):
             raise ValueError('(message.chat.id, message.message_id) duplication')
 
-        self._validate_message(message)
-        self._histories[message.chat.id].append(message)
-        self._message_dict[(message.chat.id, message.message_id)] = message
+        button_index = self._validate_message(message)
+        history.append(message, button_index)
         return message
 
+    def button_index(self, message: Message) -> Optional[ButtonIndex]:
+        history = self._histories.get(message.chat.id)
+        if (
+            history is not None
+            and history.has_message_id(message.message_id)
+            and history.get(message.message_id) is message
+        ):
+            return history.button_index(message.message_id)
+        # message is not a part of the state, e.g. it is an outdated copy
+        return ButtonIndex.from_message(message)
+
     def get_message(self, chat_id: int, message_id: int) -> Message:
-        return self._message_dict[(chat_id, message_id)]
+        return self._histories[chat_id].get(message_id)
 
     def replace_message(self, new_message: Message) -> None:
-        if (new_message.chat.id, new_message.message_id) not in self._message_dict:
+        history = self._histories[new_message.chat.id]
+        if not history.has_message_id(new_message.message_id):
             raise KeyError('(message.chat.id, message.message_id) not exists')
 
-        self._validate_message(new_message)
-        self._histories[new_message.chat.id][new_message.message_id] = new_message
-        self._message_dict[(new_message.chat.id, new_message.message_id)] = new_message
+        button_index = self._validate_message(new_message)
+        history.replace(new_message, button_index)
 
     def delete_message(self, chat_id: int, message_id: int) -> None:
-        self._histories[chat_id][message_id] = None
-        del self._message_dict[(chat_id, message_id)]
+        self._histories[chat_id].delete(message_id)
+
+    @property
+    def last_update_id(self) -> int:
+        return self._last_update_id
 
     def increment_update_id(self) -> int:
         self._last_update_id += 1
         return self._last_update_id
 
+    @property
+    def update_queue(self) -> UpdateQueue:
+        return self._update_queue
+
     def next_callback_query_id(self) -> str:
         self._last_callback_query_id += 1
         return str(self._last_callback_query_id)
@@ -99,17 +283,101 @@ class TgState:
         if answer.callback_query_id in self._answers:
             raise ValueError('callback_query_id duplication')
         self._answers[answer.callback_query_id] = answer
+        if self._retention.answers_depth is not None and len(self._answers) > self._retention.answers_depth:
+            evicted_id = next(iter(self._answers))
+            del self._answers[evicted_id]
+            if evicted_id.isdigit():
+                self._answers_evicted_up_to = max(self._answers_evicted_up_to, int(evicted_id))
 
     def get_answer_callback_query(self, callback_query_id: str) -> AnswerCallbackQuery:
-        return self._answers[callback_query_id]
-
-    def get_user_state(self, *, chat_id: int, user_id: int) -> UserState:
         try:
-            return self._selective_user_state.get(chat_id, {})[user_id]
+            return self._answers[callback_query_id]
         except KeyError:
-            pass
+            if callback_query_id.isdigit() and int(callback_query_id) <= self._answers_evicted_up_to:
+                raise EvictedError(
+                    f'answer to callback query {callback_query_id} was evicted by retention policy',
+                ) from None
+            raise
+
+    def next_inline_query_id(self) -> str:
+        self._last_inline_query_id += 1
+        return str(self._last_inline_query_id)
+
+    def add_inline_query(self, inline_query: InlineQuery) -> None:
+        # query is kept until it is answered, the answer is cached for the query.
+        # Queries delivered without waiting for the answer may stay unanswered, the oldest of them are dropped
+        self._inline_queries[inline_query.id] = inline_query
+        if self._retention.answers_depth is not None and len(self._inline_queries) > self._retention.answers_depth:
+            del self._inline_queries[next(iter(self._inline_queries))]
+
+    def discard_inline_query(self, inline_query_id: str) -> None:
+        self._inline_queries.pop(inline_query_id, None)
+
+    def add_answer_inline_query(self, answer: AnswerInlineQuery) -> None:
+        if answer.inline_query_id in self._inline_answers:
+            raise ValueError('inline_query_id duplication')
+        inline_query = self._inline_queries.pop(answer.inline_query_id, None)
+        if inline_query is None:
+            # queries are discarded when TgControl stops waiting for the answer, like after the timeout of Telegram
+            raise TelegramBadRequest(
+                method=answer,
+                message='Bad Request: query is too old and response timeout expired or query ID is invalid',
+            )
+        self._inline_answers[answer.inline_query_id] = answer
+        if self._retention.answers_depth is not None and len(self._inline_answers) > self._retention.answers_depth:
+            del self._inline_answers[next(iter(self._inline_answers))]
+
+        cache_time = DEFAULT_INLINE_CACHE_TIME if answer.cache_time is None else answer.cache_time
+        if cache_time > 0:
+            now = self._clock.now()
+            key = (inline_query.query, inline_query.offset, inline_query.from_user.id if answer.is_personal else None)
+            expires_at = now + timedelta(seconds=cache_time)
+            self._inline_cache[key] = (answer, expires_at)
+            self._inline_cache_seq += 1
+            heapq.heappush(self._inline_cache_expiry, (expires_at, self._inline_cache_seq, key))
+            self._prune_inline_cache(now)
+
+    def _prune_inline_cache(self, now: datetime) -> None:
+        # expired entries are removed first, then the ones expiring soonest while the cache exceeds answers_depth.
+        # Heap items of overwritten or already removed entries are skipped
+        depth = self._retention.answers_depth
+        while self._inline_cache_expiry:
+            expires_at, _, key = self._inline_cache_expiry[0]
+            if expires_at > now and (depth is None or len(self._inline_cache) <= depth):
+                break
+            heapq.heappop(self._inline_cache_expiry)
+            cached = self._inline_cache.get(key)
+            if cached is not None and cached[1] == expires_at:
+                del self._inline_cache[key]
+
+    def get_answer_inline_query(self, inline_query_id: str) -> AnswerInlineQuery:
+        return self._inline_answers[inline_query_id]
+
+    def get_cached_answer_inline_query(self, user_id: int, query: str, offset: str) -> Optional[AnswerInlineQuery]:
+        # personal results of the user take precedence over results shared by all users
+        now = self._clock.now()
+        for key in ((query, offset, user_id), (query, offset, None)):
+            cached = self._inline_cache.get(key)
+            if cached is None:
+                continue
+            answer, expires_at = cached
+            if now < expires_at:
+                self._inline_cache_stats.hits += 1
+                return answer
+            del self._inline_cache[key]
+        self._inline_cache_stats.misses += 1
+        return None
 
-        return self._chat_user_state[chat_id]
+    @property
+    def inline_cache_stats(self) -> InlineCacheStats:
+        return self._inline_cache_stats
+
+    def get_user_state(self, *, chat_id: int, user_id: int) -> UserState:
+        states = self._user_states[chat_id]
+        user_state = states.get(user_id)
+        if user_state is None:
+            return states.chat_state
+        return user_state
 
     def update_chat_user_state(
         self,
@@ -120,12 +388,7 @@ class TgState:
         if reply_markup != UNSET:
             replace_data['reply_markup'] = reply_markup
 
-        if chat_id in self._selective_user_state:
-            self._selective_user_state[chat_id] = {
-                user_id: replace(user_state, **replace_data)
-                for user_id, user_state in self._selective_user_state[chat_id].items()
-            }
-        self._chat_user_state[chat_id] = replace(self._chat_user_state[chat_id], **replace_data)
+        self._user_states[chat_id].update_chat(replace_data)
 
     def update_selective_user_state(
         self,
@@ -137,9 +400,7 @@ class TgState:
         if reply_markup != UNSET:
             replace_data['reply_markup'] = reply_markup
 
-        chat_dict = self._selective_user_state[chat_id]
-        for user_id in users_ids:
-            chat_dict[user_id] = replace(chat_dict.get(user_id, UserState()), **replace_data)
+        self._user_states[chat_id].update_selective(users_ids, replace_data)
 
     def _generate_file_unique_id(self) -> str:
         return str(uuid4())
@@ -147,18 +408,12 @@ class TgState:
     def _generate_file_local_id(self, user_id: int) -> str:
         return f'{user_id}-{str(uuid4())}'
 
-    async def _read_content(self, input_file: InputFile) -> bytes:
-        parts = []
-        async for chunk in input_file:
-            parts.append(chunk)
-        return b''.join(parts)
-
-    def _get_or_create_file_unique_id(self, content: bytes) -> str:
-        if content in self._content_to_unique_id:
-            return self._content_to_unique_id[content]
+    def _get_or_create_file_unique_id(self, digest: str) -> str:
+        if digest in self._digest_to_unique_id:
+            return self._digest_to_unique_id[digest]
 
         unique_id = self._generate_file_unique_id()
-        self._content_to_unique_id[content] = unique_id
+        self._digest_to_unique_id[digest] = unique_id
         return unique_id
 
     def _get_or_create_file_local_id(self, user_id: int, unique_id: str) -> str:
@@ -175,17 +430,91 @@ class TgState:
     async def load_file(self, user_id: int, input_file: Union[InputFile, str]) -> Document:
         if isinstance(input_file, str):
             unique_id = self._user_id_to_local_id_to_unique_id[user_id][input_file]
+            content_info = self._unique_id_to_content.get(unique_id)
             return Document(
                 file_id=input_file,
                 file_unique_id=unique_id,
+                file_size=None if content_info is None else content_info.size,
                 # need to save file_name
             )
 
-        content = await self._read_content(input_file)
-        unique_id = self._get_or_create_file_unique_id(content)
+        content_info = await self._content_store.put(input_file)
+        unique_id = self._get_or_create_file_unique_id(content_info.digest)
+        self._unique_id_to_content[unique_id] = content_info
         local_id = self._get_or_create_file_local_id(user_id, unique_id)
         return Document(
             file_id=local_id,
             file_unique_id=unique_id,
             file_name=input_file.filename,
+            file_size=content_info.size,
         )
+
+    def get_file(self, user_id: int, method: GetFile) -> File:
+        file_id = method.file_id
+        unique_id = self._user_id_to_local_id_to_unique_id[user_id][file_id]
+        content_info = self._unique_id_to_content.get(unique_id)
+        # file_path promises that the file can be downloaded, default ContentStore keeps only digests
+        if content_info is None or content_info.digest not in self._content_store:
+            raise TelegramBadRequest(
+                method=method,
+                message=f'Bad Request: content of file {file_id} is not retained, '
+                f'create TgState with ContentStore(max_memory_size=...) or ContentStore(spill_dir=...)',
+            )
+        return File(
+            file_id=file_id,
+            file_unique_id=unique_id,
+            file_size=content_info.size,
+            file_path=f'{FILE_PATH_PREFIX}{unique_id}',
+        )
+
+    def iter_file_content(self, file_path: str, chunk_size: int) -> Iterator[memoryview]:
+        if not file_path.startswith(FILE_PATH_PREFIX):
+            raise KeyError(f'Unknown file_path {file_path}')
+        content_info = self._unique_id_to_content[file_path[len(FILE_PATH_PREFIX):]]
+        return self._content_store.iter_chunks(content_info.digest, chunk_size)
+
+    def memory_stats(self) -> Dict[str, StructureStats]:
+        # objects shared between structures, e.g. users and chats of messages, are counted once by the first of them
+        seen: Set[int] = set()
+        return {
+            'histories': StructureStats(
+                sum(len(history) for history in self._histories.values()),
+                deep_size(self._histories, seen),
+            ),
+            'user_states': StructureStats(
+                sum(len(states) for states in self._user_states.values()),
+                deep_size(self._user_states, seen),
+            ),
+            'answers': StructureStats(len(self._answers), deep_size(self._answers, seen)),
+            'inline_queries': StructureStats(len(self._inline_queries), deep_size(self._inline_queries, seen)),
+            'inline_answers': StructureStats(len(self._inline_answers), deep_size(self._inline_answers, seen)),
+            'inline_cache': StructureStats(
+                len(self._inline_cache),
+                deep_size(self._inline_cache, seen) + deep_size(self._inline_cache_expiry, seen),
+            ),
+            'update_queue': StructureStats(len(self._update_queue), deep_size(self._update_queue, seen)),
+            'file_unique_ids': StructureStats(
+                len(self._digest_to_unique_id),
+                deep_size(self._digest_to_unique_id, seen),
+            ),
+            'file_contents': StructureStats(
+                len(self._unique_id_to_content),
+                deep_size(self._unique_id_to_content, seen),
+            ),
+            'file_local_ids': StructureStats(
+                sum(len(mapping) for mapping in self._user_id_to_local_id_to_unique_id.values()),
+                deep_size(self._user_id_to_unique_id_to_local_id, seen)
+                + deep_size(self._user_id_to_local_id_to_unique_id, seen),
+            ),
+            'content_store': self._content_store.memory_stats(),
+        }
+
+    def chat_memory_stats(self) -> Dict[int, StructureStats]:
+        seen: Set[int] = set()
+        return {
+            chat_id: StructureStats(
+                len(history),
+                deep_size(history, seen) + deep_size(self._user_states[chat_id], seen),
+            )
+            for chat_id, history in self._histories.items()
+        }
@@ -0,0 +1,205 @@
+import argparse
+import gzip
+import itertools
+import json
+import sys
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from enum import Enum
+from pathlib import Path
+from types import TracebackType
+from typing import (
+    IO,
+    AbstractSet,
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Type,
+    Union,
+    cast,
+)
+
+from aiogram.methods import TelegramMethod
+from aiogram.types import UNSET, InputFile, Update
+from pydantic import BaseModel
+
+from aiogram_mock.instrumentation import Instrumentation, RequestContext, UpdateContext
+
+# values that differ between two runs of the same scenario
+DEFAULT_IGNORED_FIELDS = frozenset(('date', 'edit_date', 'forward_date', 'file_id', 'file_unique_id', 'file_path'))
+
+_current_update_seq: ContextVar[Optional[int]] = ContextVar('aiogram_mock_current_update_seq', default=None)
+
+
+def _open(path: Union[str, Path], mode: str) -> IO[str]:
+    if str(path).endswith('.gz'):
+        return cast(IO[str], gzip.open(path, mode + 't', encoding='utf-8'))
+    return open(path, mode, encoding='utf-8')
+
+
+def to_jsonable(value: Any) -> Any:
+    # mirrors the Bot API json: aliases are used, unset and None fields are omitted
+    if isinstance(value, BaseModel):
+        return {
+            field.alias: to_jsonable(item)
+            for name, field in value.__fields__.items()
+            if (item := getattr(value, name)) is not None and item is not UNSET
+        }
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items() if item is not None and item is not UNSET}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, datetime):
+        # clocks of the mock return naive UTC datetimes, timestamp() would treat them as local time
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+    if isinstance(value, InputFile):
+        return {'filename': value.filename}
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+class TranscriptRecorder:
+    def __init__(self, path: Union[str, Path]):
+        self._file = _open(path, 'w')
+        self._seq = 0
+
+    def _write(self, event: Dict[str, Any]) -> int:
+        self._seq += 1
+        event['seq'] = self._seq
+        self._file.write(json.dumps(event, ensure_ascii=False, separators=(',', ':')))
+        self._file.write('\n')
+        return self._seq
+
+    def record_update(self, update: Update) -> int:
+        return self._write({'event': 'update', 'update': to_jsonable(update)})
+
+    def record_request(
+        self,
+        method: TelegramMethod[Any],
+        result: Any = None,
+        exception: Optional[BaseException] = None,
+        update_seq: Optional[int] = None,
+    ) -> int:
+        event: Dict[str, Any] = {
+            'event': 'request',
+            'update': update_seq,
+            'method': type(method).__name__,
+            'params': to_jsonable(method),
+        }
+        if exception is None:
+            event['result'] = to_jsonable(result)
+        else:
+            event['error'] = f'{type(exception).__name__}: {exception}'
+        return self._write(event)
+
+    @asynccontextmanager
+    async def _update_hook(self, context: UpdateContext) -> AsyncIterator[None]:
+        token = _current_update_seq.set(self.record_update(context.update))
+        try:
+            yield
+        finally:
+            _current_update_seq.reset(token)
+
+    @asynccontextmanager
+    async def _request_hook(self, context: RequestContext) -> AsyncIterator[None]:
+        try:
+            yield
+        finally:
+            self.record_request(context.method, context.result, context.exception, _current_update_seq.get())
+
+    def attach(self, instrumentation: Instrumentation) -> None:
+        # requests are linked to the update that caused them by its seq
+        instrumentation.add_update_hook(self._update_hook)
+        instrumentation.add_request_hook(self._request_hook)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> 'TranscriptRecorder':
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+def iter_transcript(path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    with _open(path, 'r') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def strip_fields(value: Any, ignored_fields: AbstractSet[str]) -> Any:
+    if isinstance(value, dict):
+        return {key: strip_fields(item, ignored_fields) for key, item in value.items() if key not in ignored_fields}
+    if isinstance(value, list):
+        return [strip_fields(item, ignored_fields) for item in value]
+    return value
+
+
+class TranscriptDifference(NamedTuple):
+    event_number: int
+    left: Optional[Dict[str, Any]]
+    right: Optional[Dict[str, Any]]
+
+
+def diff_transcripts(
+    left_path: Union[str, Path],
+    right_path: Union[str, Path],
+    ignored_fields: AbstractSet[str] = DEFAULT_IGNORED_FIELDS,
+) -> Iterator[TranscriptDifference]:
+    # both transcripts are read in lockstep, so memory usage does not depend on their size.
+    # Events are not resynchronized, after an extra or a missing event every later event is reported as a difference
+    pairs = itertools.zip_longest(iter_transcript(left_path), iter_transcript(right_path))
+    for event_number, (left, right) in enumerate(pairs):
+        if left is not None:
+            left = strip_fields(left, ignored_fields)
+        if right is not None:
+            right = strip_fields(right, ignored_fields)
+        if left != right:
+            yield TranscriptDifference(event_number, left, right)
+
+
+def main(argv: Sequence[str]) -> int:
+    parser = argparse.ArgumentParser(description='Compare two transcripts recorded by TranscriptRecorder')
+    parser.add_argument('left')
+    parser.add_argument('right')
+    parser.add_argument(
+        '-i', '--ignore', action='append', default=[],
+        help='additional field that is ignored at any depth',
+    )
+    parser.add_argument('-n', '--max-differences', type=int, default=10, help='number of differences to print')
+    parser.add_argument('--no-default-ignores', action='store_true', help=f'compare {sorted(DEFAULT_IGNORED_FIELDS)}')
+    args = parser.parse_args(argv)
+
+    ignored_fields = set(args.ignore)
+    if not args.no_default_ignores:
+        ignored_fields |= DEFAULT_IGNORED_FIELDS
+
+    differences = 0
+    for difference in diff_transcripts(args.left, args.right, ignored_fields):
+        differences += 1
+        if differences <= args.max_differences:
+            print(f'event #{difference.event_number}:')
+            print(f'  - {json.dumps(difference.left, ensure_ascii=False)}')
+            print(f'  + {json.dumps(difference.right, ensure_ascii=False)}')
+    if differences > args.max_differences:
+        print(f'... {differences - args.max_differences} more differences')
+    return 1 if differences else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
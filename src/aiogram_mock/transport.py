@@ -0,0 +1,106 @@
+import asyncio
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict
+
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from aiogram_mock.tg_state import TgState
+
+
+class UpdateTransport(ABC):
+    @abstractmethod
+    async def deliver(self, bot: Bot, update: Update) -> None:
+        ...
+
+
+UpdateTransportFactory = Callable[[Dispatcher, TgState], UpdateTransport]
+
+
+class FeedTransport(UpdateTransport):
+    def __init__(self, dispatcher: Dispatcher, tg_state: TgState):
+        self._dispatcher = dispatcher
+
+    async def deliver(self, bot: Bot, update: Update) -> None:
+        await self._dispatcher.feed_update(bot, update)
+
+
+class _ProcessedUpdatesMiddleware(BaseMiddleware):
+    def __init__(self, transport: 'PollingTransport'):
+        self._transport = transport
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            result = await handler(event, data)
+        except Exception as e:
+            if isinstance(event, Update):
+                self._transport._resolve(event.update_id, e)
+            raise
+        if isinstance(event, Update):
+            self._transport._resolve(event.update_id, None)
+        return result
+
+
+class PollingTransport(UpdateTransport):
+    def __init__(self, dispatcher: Dispatcher, tg_state: TgState, wait_processed: bool = True):
+        self._dispatcher = dispatcher
+        self._tg_state = tg_state
+        self._wait_processed = wait_processed
+        self._middleware = _ProcessedUpdatesMiddleware(self)
+        self._pending: Dict[int, 'asyncio.Future[None]'] = {}
+        self._is_polling = False
+
+    def _resolve(self, update_id: int, exception: Any) -> None:
+        future = self._pending.pop(update_id, None)
+        if future is None or future.done():
+            return
+        if exception is None:
+            future.set_result(None)
+        else:
+            future.set_exception(exception)
+
+    async def deliver(self, bot: Bot, update: Update) -> None:
+        # updates are only enqueued, the dispatcher receives them through GetUpdates of its polling loop
+        if not self._is_polling:
+            self._tg_state.update_queue.put(update)
+            return
+
+        future = self._pending[update.update_id] = asyncio.get_running_loop().create_future()
+        self._tg_state.update_queue.put(update)
+        if self._wait_processed:
+            await future
+
+    async def join(self) -> None:
+        await asyncio.gather(*self._pending.values(), return_exceptions=True)
+
+    @asynccontextmanager
+    async def polling(self, bot: Bot, **kwargs: Any) -> AsyncIterator[None]:
+        # kwargs are passed to Dispatcher.start_polling, e.g. polling_timeout or handle_as_tasks
+        if self._is_polling:
+            raise RuntimeError('Polling is already started')
+
+        self._dispatcher.update.outer_middleware.register(self._middleware)
+        task = asyncio.ensure_future(
+            self._dispatcher.start_polling(bot, handle_signals=False, close_bot_session=False, **kwargs),
+        )
+        self._is_polling = True
+        try:
+            yield
+        finally:
+            self._is_polling = False
+            try:
+                await self._dispatcher.stop_polling()
+            except RuntimeError:  # polling has not started or has already failed
+                task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            self._dispatcher.update.outer_middleware.unregister(self._middleware)
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
@@ -0,0 +1,66 @@
+import asyncio
+import itertools
+from collections import deque
+from typing import Deque, List, Optional
+
+from aiogram.types import Update
+
+MAX_UPDATES_LIMIT = 100
+
+
+class UpdateQueue:
+    def __init__(self) -> None:
+        self._updates: Deque[Update] = deque()
+        self._not_empty: Optional[asyncio.Event] = None  # created lazily inside of running loop
+
+    def restore(self, snapshot: 'UpdateQueue') -> None:
+        # the queue object is kept, so a poller waiting on it receives the restored updates
+        self._updates = deque(snapshot._updates)
+        if self._updates and self._not_empty is not None:
+            self._not_empty.set()
+
+    def __len__(self) -> int:
+        return len(self._updates)
+
+    def put(self, update: Update) -> None:
+        if self._updates and update.update_id <= self._updates[-1].update_id:
+            raise ValueError('update_id must increase')
+
+        self._updates.append(update)
+        if self._not_empty is not None:
+            self._not_empty.set()
+
+    def _confirm(self, offset: int) -> None:
+        # like in Bot API, negative offset forgets everything except -offset last updates
+        if offset < 0:
+            while len(self._updates) > -offset:
+                self._updates.popleft()
+            return
+        while self._updates and self._updates[0].update_id < offset:
+            self._updates.popleft()
+
+    async def _wait(self, timeout: float) -> None:
+        if self._not_empty is None:
+            self._not_empty = asyncio.Event()
+        self._not_empty.clear()
+        try:
+            await asyncio.wait_for(self._not_empty.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def get_updates(
+        self,
+        offset: Optional[int] = None,
+        limit: Optional[int] = None,
+        timeout: Optional[int] = None,
+    ) -> List[Update]:
+        if limit is None:
+            limit = MAX_UPDATES_LIMIT
+        if not 1 <= limit <= MAX_UPDATES_LIMIT:
+            raise ValueError(f'limit must be in range [1, {MAX_UPDATES_LIMIT}]')
+
+        if offset is not None:
+            self._confirm(offset)
+        if not self._updates and timeout:
+            await self._wait(timeout)
+        return list(itertools.islice(self._updates, limit))
@@ -0,0 +1,105 @@
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.types import BufferedInputFile, InputFile, Update
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import BodyPartReader, ClientResponse, MultipartReader, web
+from aiohttp.test_utils import TestClient, TestServer
+
+from aiogram_mock.api_server import build_method, default_method_types
+from aiogram_mock.instrumentation import Histogram
+from aiogram_mock.tg_state import TgState
+from aiogram_mock.transcript import to_jsonable
+from aiogram_mock.transport import UpdateTransport
+
+WEBHOOK_PATH = '/webhook'
+
+
+class WebhookError(Exception):
+    def __init__(self, update_id: int, status: int, body: str):
+        super().__init__(f'Webhook responded to update {update_id} with status {status}: {body}')
+        self.update_id = update_id
+        self.status = status
+        self.body = body
+
+
+class WebhookTransport(UpdateTransport):
+    def __init__(self, dispatcher: Dispatcher, tg_state: TgState, handle_in_background: bool = False):
+        self._dispatcher = dispatcher
+        self._handle_in_background = handle_in_background
+        self._method_types = default_method_types()
+        self._client: Optional[TestClient] = None
+        self.latency = Histogram()
+
+    async def _read_inline_method(self, response: ClientResponse) -> Optional[TelegramMethod[Any]]:
+        # the bot can reply with one method in the webhook response, it is encoded as multipart form
+        if response.content_type != 'multipart/form-data':
+            return None
+
+        method_name: Optional[str] = None
+        fields: Dict[str, str] = {}
+        files: Dict[str, InputFile] = {}
+        reader = MultipartReader.from_response(response)
+        while True:
+            part = await reader.next()
+            if part is None:
+                break
+            if not isinstance(part, BodyPartReader) or part.name is None:
+                continue
+            content = await part.read()
+            if part.filename is not None:
+                files[part.name] = BufferedInputFile(bytes(content), filename=part.filename)
+            elif part.name == 'method':
+                method_name = content.decode()
+            else:
+                fields[part.name] = content.decode()
+
+        if method_name is None:
+            return None
+        try:
+            method_type = self._method_types[method_name.lower()]
+        except KeyError:
+            raise TypeError(f'Method mock for {method_name} is not implemented') from None
+        return build_method(method_type, fields, files)
+
+    async def deliver(self, bot: Bot, update: Update) -> None:
+        if self._client is None:
+            raise RuntimeError('Webhook server is not started')
+
+        # latency covers the whole webhook round trip and the request returned inline
+        started_at = time.perf_counter()
+        try:
+            async with self._client.post(WEBHOOK_PATH, data=json.dumps(to_jsonable(update))) as response:
+                if response.status != 200:
+                    raise WebhookError(update.update_id, response.status, await response.text())
+                method = await self._read_inline_method(response)
+            if method is not None:
+                await bot(method)
+        finally:
+            self.latency.record(time.perf_counter() - started_at)
+
+    @asynccontextmanager
+    async def serving(self, bot: Bot, **data: Any) -> AsyncIterator[None]:
+        # data is passed to handlers like kwargs of Dispatcher.feed_update
+        if self._client is not None:
+            raise RuntimeError('Webhook server is already started')
+
+        app = web.Application()
+        SimpleRequestHandler(
+            dispatcher=self._dispatcher,
+            bot=bot,
+            handle_in_background=self._handle_in_background,
+            **data,
+        ).register(app, path=WEBHOOK_PATH)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        self._client = client
+        try:
+            yield
+        finally:
+            self._client = None
+            await client.close()